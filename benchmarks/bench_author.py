@@ -0,0 +1,122 @@
+"""
+测量 preprocess/author.py 格式化文末信息的吞吐量（文件/秒），
+与旧版逐行 readlines、在列表头部插入下标并逐文件打印两次的实现对比，检查两者输出逐字节一致。
+同时测量只读取文件末尾来解析字段（read_trailing_metadata）的速度。
+
+标准输出重定向到 /dev/null 后计时，因此打印的开销只包含格式化和写入，不包含终端渲染。
+
+用法:
+    python benchmarks/bench_author.py --docs 20000 --workers 1 2 4
+"""
+import argparse
+import contextlib
+import filecmp
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import author
+from bench_clean import make_corpus
+
+
+def legacy_format_trailing_metadata(lines: List[str]) -> str:
+    """旧版实现：从后往前遍历所有行，用 insert(0, j) 记录元数据行的下标。"""
+    metadata_lines_indices = []
+    for j in range(len(lines) - 1, -1, -1):
+        line_content = lines[j].strip()
+        cleaned_line = line_content.strip('*- _')
+        if author.METADATA_PATTERN.match(cleaned_line):
+            metadata_lines_indices.insert(0, j)
+        elif line_content and not metadata_lines_indices:
+            break
+        elif not line_content and metadata_lines_indices:
+            metadata_lines_indices.insert(0, j)
+        elif line_content and metadata_lines_indices:
+            break
+    if metadata_lines_indices:
+        first_meta_index = metadata_lines_indices[0]
+        formatted_metadata = [f"> {line.strip().strip('*- ')}\n" for line in lines[first_meta_index:] if line.strip()]
+        return "".join(lines[:first_meta_index]).rstrip() + "\n\n---" + "".join(formatted_metadata)
+    return "".join(lines)
+
+
+def read_trailing_metadata(path: str, tail_bytes: int = author.TAIL_BYTES) -> Dict[str, str]:
+    """
+    只读取文件末尾的 tail_bytes 字节，解析文末元数据的结构化字段。
+    元数据块可能超出读取范围时，再读取整个文件。
+    """
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - tail_bytes - 1))
+        scanned = author._scan_tail(f.read(), tail_bytes)
+        if scanned is None:
+            f.seek(0)
+            text = author._decode(f.read())
+            first = author.split_trailing_metadata(text)
+        else:
+            _, text, first = scanned
+    if first is None:
+        return {}
+    return author.parse_metadata_fields(author._metadata_lines(text[first:]))
+
+
+def legacy_run(input_dir: str, output_dir: str):
+    """旧版的处理循环（不含增量清单）：readlines 读入，每个文件打印两次。"""
+    os.makedirs(output_dir, exist_ok=True)
+    files = [f for f in os.listdir(input_dir) if f.endswith('.md')]
+    for i, filename in enumerate(files):
+        print(f"[{i+1}/{len(files)}] 正在处理: {filename} ...")
+        with open(os.path.join(input_dir, filename), 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        final_content = legacy_format_trailing_metadata(lines)
+        output_path = os.path.join(output_dir, filename)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(final_content)
+        print(f"  -> 已保存至: {output_path}")
+
+
+def same_outputs(a: str, b: str) -> bool:
+    names = [f for f in os.listdir(a) if f.endswith('.md')]
+    _, mismatch, errors = filecmp.cmpfiles(a, b, names, shallow=False)
+    return not mismatch and not errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="测量 author.py 的吞吐量")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "add_main_title")
+        make_corpus(input_dir, args.docs)
+        devnull = open(os.devnull, 'w')
+
+        legacy_dir = os.path.join(tmp, "legacy")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            legacy_run(input_dir, legacy_dir)
+        elapsed = time.perf_counter() - start
+        print(f"旧版:           {elapsed:.2f}s，{args.docs / elapsed:,.0f} 文件/秒")
+
+        for workers in args.workers:
+            output_dir = os.path.join(tmp, f"final_{workers}")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                author.format_metadata_with_regex(input_dir, output_dir, workers=workers, quiet=True)
+            elapsed = time.perf_counter() - start
+            status = "一致" if same_outputs(legacy_dir, output_dir) else "不一致！"
+            print(f"workers={workers:<2}     {elapsed:.2f}s，{args.docs / elapsed:,.0f} 文件/秒，输出与旧版{status}")
+
+        names = sorted(os.listdir(input_dir))
+        start = time.perf_counter()
+        for filename in names:
+            read_trailing_metadata(os.path.join(input_dir, filename))
+        elapsed = time.perf_counter() - start
+        print(f"只读末尾解析字段: {elapsed:.2f}s，{len(names) / elapsed:,.0f} 文件/秒")
@@ -0,0 +1,154 @@
+"""
+测量元数据提取和按元数据过滤的检索。
+
+1. 单次遍历的 metadata.extract_metadata 与旧版逐个关键词重新分行扫描的实现对比，检查 authors 一致；
+2. 在模拟的文章（每篇若干块、随机的作者和来源）上建立 MetadataCatalog、VectorIndex 和 BM25Index，
+   比较按来源或作者过滤时“先查目录再只对候选打分”与“全量检索后再过滤”的延迟，
+   并检查两者返回的结果相同（后者取足够多的结果以保证过滤后仍有 k 个）。
+
+用法:
+    python benchmarks/bench_catalog.py --docs 5000 --chunks-per-doc 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+sys.path.insert(0, os.path.join(ROOT, "rag"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_bm25 import STREETS, make_corpus as make_texts
+from bench_clean import make_article
+from bm25 import BM25Index
+from catalog import MetadataCatalog
+from index import VectorIndex
+from metadata import extract_metadata
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+
+
+def legacy_extract_metadata(content):
+    """旧版 clean.py 的实现：每个关键词都重新分行扫描一遍全文。"""
+    metadata = {}
+    all_authors = []
+    for key in ["撰稿人", "投稿人", "信息来源"]:
+        search_key = f"{key}："
+        for line in content.splitlines():
+            if line.startswith(search_key):
+                authors_text = line.replace(search_key, "").strip()
+                all_authors.extend(author.strip() for author in authors_text.split('、'))
+    if all_authors:
+        metadata['authors'] = sorted(list(set(all_authors)))
+    return metadata
+
+
+def bench_extract(docs: int):
+    rng = random.Random(0)
+    articles = [make_article(rng, i) for i in range(docs)]
+    start = time.perf_counter()
+    legacy = [legacy_extract_metadata(a) for a in articles]
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    current = [extract_metadata(a) for a in articles]
+    current_time = time.perf_counter() - start
+    same = all(a.get('authors') == b.get('authors') for a, b in zip(legacy, current))
+    print(f"提取元数据：旧版 {legacy_time / docs * 1e6:.1f}µs/篇，"
+          f"单次遍历 {current_time / docs * 1e6:.1f}µs/篇（同时解析出全部字段），authors {'一致' if same else '不一致！'}")
+
+
+def percentile_ms(times, q):
+    return float(np.percentile(times, q)) * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="测量元数据提取和按元数据过滤的检索")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--chunks-per-doc", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    bench_extract(args.docs)
+
+    rng = random.Random(0)
+    np_rng = np.random.default_rng(0)
+    authors = [f"{rng.choice(SURNAMES)}{rng.choice('明华军芳丽强伟敏')}{i}" for i in range(200)]
+    n_chunks = args.docs * args.chunks_per_doc
+    texts = make_texts(n_chunks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = MetadataCatalog(os.path.join(tmp, "catalog.db"))
+        vector_index = VectorIndex(os.path.join(tmp, "vectors"), dim=args.dim)
+        bm25 = BM25Index()
+        start = time.perf_counter()
+        for i in range(args.docs):
+            metadata = {'source': rng.choice(STREETS),
+                        'writer': "、".join(rng.sample(authors, rng.randint(1, 2))),
+                        'date': f"{rng.randint(2018, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+            catalog.add_document(f"文章{i}", metadata, i * args.chunks_per_doc, args.chunks_per_doc)
+        catalog.commit()
+        print(f"目录写入 {args.docs} 篇：{time.perf_counter() - start:.2f}s")
+        vector_index.add_vectors(np_rng.standard_normal((n_chunks, args.dim)).astype(np.float32),
+                                 [{} for _ in range(n_chunks)])
+        bm25.add(texts)
+
+        filters = [("来源", {'source': street}) for street in STREETS] + \
+                  [("作者", {'author': author}) for author in authors[:20]]
+        for label in ("来源", "作者"):
+            filtered_times, post_times, lookup_times, keyword_filtered, keyword_post = [], [], [], [], []
+            plain_times, keyword_plain = [], []
+            mismatches = 0
+            selected = [f for f in filters if f[0] == label]
+            sizes = []
+            for q in range(args.queries):
+                _, condition = selected[q % len(selected)]
+                query = np_rng.standard_normal(args.dim).astype(np.float32)
+                keyword_query = texts[rng.randrange(n_chunks)][:12]
+
+                start = time.perf_counter()
+                allowed = catalog.chunk_ids(**condition)
+                lookup_times.append(time.perf_counter() - start)
+                sizes.append(len(allowed))
+
+                start = time.perf_counter()
+                _, ids = vector_index.search(query, args.k, allowed=allowed)
+                filtered_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                vector_index.search(query, args.k)
+                plain_times.append(time.perf_counter() - start)
+
+                # 全量检索后过滤：取出全部得分再筛选，保证过滤后仍有 k 个
+                start = time.perf_counter()
+                _, all_ids = vector_index.search(query, n_chunks)
+                post = all_ids[0][np.isin(all_ids[0], allowed)][:args.k]
+                post_times.append(time.perf_counter() - start)
+                mismatches += not np.array_equal(ids[0], post)
+
+                start = time.perf_counter()
+                hits = bm25.search(keyword_query, args.k, allowed=allowed)
+                keyword_filtered.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                bm25.search(keyword_query, args.k)
+                keyword_plain.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                everything = bm25.search(keyword_query, n_chunks)
+                allowed_set = set(allowed.tolist())
+                expected = [(doc, score) for doc, score in everything if doc in allowed_set][:args.k]
+                keyword_post.append(time.perf_counter() - start)
+                mismatches += [d for d, _ in hits] != [d for d, _ in expected]
+
+            print(f"按{label}过滤（候选块平均占 {np.mean(sizes) / n_chunks:.1%}）：目录查询 p50 {percentile_ms(lookup_times, 50):.2f}ms")
+            print(f"  向量检索  先过滤 p50 {percentile_ms(filtered_times, 50):.2f}ms，"
+                  f"后过滤 p50 {percentile_ms(post_times, 50):.2f}ms，不过滤 p50 {percentile_ms(plain_times, 50):.2f}ms")
+            print(f"  BM25 检索 先过滤 p50 {percentile_ms(keyword_filtered, 50):.2f}ms，"
+                  f"后过滤 p50 {percentile_ms(keyword_post, 50):.2f}ms，不过滤 p50 {percentile_ms(keyword_plain, 50):.2f}ms")
+            print(f"  结果不一致的查询：{mismatches}")
+        catalog.close()
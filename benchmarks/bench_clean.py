@@ -0,0 +1,125 @@
+"""
+测量 preprocess/clean.py 在不同进程数下的吞吐量，并检查多进程输出与串行输出逐字节一致。
+
+加上 --micro 时，改为在内存中逐篇对比 clean_content 与旧版多次整体替换的实现，
+报告每篇文章的平均耗时并检查两者输出一致。
+
+用法:
+    python benchmarks/bench_clean.py --docs 5000 --workers 1 2 4 8
+    python benchmarks/bench_clean.py --micro --docs 5000
+"""
+import argparse
+import filecmp
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+
+import clean
+
+LEGACY_TITLE_SETEXT_PATTERN = re.compile(r"^(.+)\n=+\n+", flags=re.MULTILINE)
+LEGACY_TITLE_H1_PATTERN = re.compile(r"^# .+\n+", flags=re.MULTILINE)
+LEGACY_PROMO_PATTERN = re.compile("|".join(map(re.escape, clean.DEFAULT_RULES.remove_phrases)))
+LEGACY_NEWLINE_PATTERN = re.compile(r'\n(\s*\n)+')
+
+PARAGRAPH = "为进一步做好公租房申请受理工作，长宁区房管局会同各街道开展政策宣传，**重点**解读申请条件与审核流程。"
+
+
+def make_article(rng: random.Random, i: int) -> str:
+    """生成一篇结构接近公众号导出文件的模拟文章。"""
+    paragraphs = [PARAGRAPH * rng.randint(1, 6) for _ in range(rng.randint(5, 40))]
+    promo = "拿起手机，搜索微信公众号“长宁房管”，住房相关政策，重点信息一手掌握，赶紧动动手指关注我们吧！"
+    return (
+        f"模拟文章{i}\n======\n\n![cover_image](https://example.com/{i}.jpg)\n\n"
+        + "\n\n\n".join(paragraphs)
+        + f"\n\n{promo}\n\n〓▼\n\n撰稿人：张三、李四\n\n信息来源：长宁房管\n\n[阅读原文](javascript:;)\n"
+    )
+
+
+def make_corpus(directory: str, docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(docs):
+        with open(os.path.join(directory, f"{i:06d}.md"), "w", encoding="utf-8") as f:
+            f.write(make_article(rng, i))
+
+
+def legacy_clean_content(content):
+    """旧版 clean_content：依次做标题正则、分行过滤、推广语替换、三次字符替换、合并换行和首尾去空白。"""
+    content = LEGACY_TITLE_SETEXT_PATTERN.sub("", content, 1)
+    content = LEGACY_TITLE_H1_PATTERN.sub("", content, 1)
+    if content.startswith("![cover_image]"):
+        pos = content.find('\n')
+        content = content[pos+1:] if pos != -1 else ""
+    lines = content.splitlines()
+    filtered_lines = [line for line in lines if "阅读原文" not in line]
+    content = "\n".join(filtered_lines)
+    content = LEGACY_PROMO_PATTERN.sub("", content)
+    content = content.replace('*', '')
+    content = content.replace('〓', '')
+    content = content.replace('▼', '')
+    content = LEGACY_NEWLINE_PATTERN.sub('\n', content)
+    content = content.lstrip()
+    content = content.rstrip()
+    return content
+
+
+def micro_benchmark(docs: int, repeat: int = 3):
+    """逐篇比较新旧 clean_content 的耗时，取多次运行中的最好成绩。"""
+    rng = random.Random(0)
+    articles = [make_article(rng, i) for i in range(docs)]
+    mismatches = sum(legacy_clean_content(a) != clean.clean_content(a) for a in articles)
+    print(f"{docs} 篇文章，平均 {sum(map(len, articles)) / docs:.0f} 字，输出不一致 {mismatches} 篇")
+
+    timings = {}
+    for name, function in (("旧版", legacy_clean_content), ("单次扫描", clean.clean_content)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for article in articles:
+                function(article)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"{name:<6s} {best / docs * 1e6:8.1f} 微秒/篇")
+    print(f"加速 {timings['旧版'] / timings['单次扫描']:.2f} 倍")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--micro", action="store_true", help="只对比新旧 clean_content 的单篇耗时")
+    args = parser.parse_args()
+
+    if args.micro:
+        micro_benchmark(args.docs)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "data")
+        make_corpus(input_dir, args.docs)
+
+        baseline_dir = None
+        for workers in args.workers:
+            output_dir = os.path.join(tmp, f"out_{workers}")
+            start = time.perf_counter()
+            clean.process_all_files_in_directory(input_dir, output_dir, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            status = ""
+            if baseline_dir is None:
+                baseline_dir = output_dir
+            else:
+                names = [n for n in os.listdir(baseline_dir) if n.endswith(".md")]
+                _, mismatch, errors = filecmp.cmpfiles(baseline_dir, output_dir, names, shallow=False)
+                status = "输出一致" if not mismatch and not errors else f"输出不一致: {mismatch + errors}"
+            print(f"workers={workers:<3d} {elapsed:7.2f} 秒  {args.docs / elapsed:9.0f} 篇/秒  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+对比下游读取清洗结果的两种方式：逐个打开 processed_data 中的 .md 文件，
+与顺序读取 clean.py 写出的分片 JSONL 语料；并测量按标题随机读取单篇文章的延迟。
+
+用法:
+    python benchmarks/bench_corpus.py --docs 5000
+    python benchmarks/bench_corpus.py --docs 5000 --compress
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+
+import clean
+from bench_clean import make_corpus
+from corpus import CorpusReader
+
+
+def read_markdown_files(directory: str) -> int:
+    total = 0
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.md'):
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                total += len(f.read())
+    return total
+
+
+def directory_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="对比逐文件读取与分片语料读取")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "data")
+        output_dir = os.path.join(tmp, "processed_data")
+        corpus_dir = os.path.join(tmp, "corpus")
+        make_corpus(input_dir, args.docs)
+        clean.process_all_files_in_directory(input_dir, output_dir, corpus_dir=corpus_dir, compress=args.compress)
+        print(f"语料 {directory_bytes(corpus_dir) / 1e6:.1f}MB（含原文），"
+              f"processed_data {directory_bytes(output_dir) / 1e6:.1f}MB")
+
+        start = time.perf_counter()
+        read_markdown_files(output_dir)
+        print(f"逐个读取 .md 文件：{time.perf_counter() - start:.3f}s")
+
+        start = time.perf_counter()
+        reader = CorpusReader(corpus_dir)
+        open_time = time.perf_counter() - start
+        start = time.perf_counter()
+        total = sum(len(record['cleaned_content']) for record in reader)
+        print(f"打开语料索引 {open_time * 1000:.1f}ms，顺序读取全部文章：{time.perf_counter() - start:.3f}s")
+
+        titles = random.Random(0).choices(reader.titles(), k=args.lookups)
+        start = time.perf_counter()
+        for title in titles:
+            reader.get(title)
+        print(f"按标题随机读取：{(time.perf_counter() - start) / len(titles) * 1e6:.1f} 微秒/篇")
+        reader.close()
@@ -0,0 +1,119 @@
+"""
+测量 rag/embedding_cache.py 在重建索引时节省的嵌入次数和时间。
+
+模拟接口延迟的嵌入模型：每次调用固定延迟 --call-latency 秒，每个文本再加 --text-latency 秒。
+依次测量：
+    1. 冷缓存建立前 N-1 天文章的索引；
+    2. 追加最后一天的文章后从头重建索引，只有新文章的块需要嵌入；
+    3. 调整 chunk_size 后重建索引，没有被重新切分的块仍然命中缓存；
+    4. float16 与 float32 缓存的大小，以及用缓存的向量建立的索引相对原始向量的 top-10 召回率。
+
+用法:
+    python benchmarks/bench_embedding_cache.py --days 10 --articles-per-day 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "rag"))
+sys.path.insert(0, os.path.join(ROOT, "split"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_split import make_article
+from embedding import HashingEmbedder
+from embedding_cache import EmbeddingCache
+from index import VectorIndex
+from mdsplit import MarkdownHeaderTextSplitter
+
+
+class SlowEmbedder:
+    """在 HashingEmbedder 上附加模拟的接口延迟，并记录嵌入的文本数。"""
+
+    def __init__(self, embedder, call_latency: float, text_latency: float):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.dim = embedder.dim
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.texts = 0
+
+    def embed(self, texts):
+        self.texts += len(texts)
+        time.sleep(self.call_latency + self.text_latency * len(texts))
+        return self.embedder.embed(texts)
+
+
+def build(path: str, articles, chunk_size: int, embedder, cache=None) -> VectorIndex:
+    splitter = MarkdownHeaderTextSplitter(chunk_size=chunk_size)
+    index = VectorIndex(path, dim=embedder.dim)
+    chunks = (chunk for i, text in enumerate(articles) for chunk in splitter.iter_split(text, {'title': f"文章{i}"}))
+    index.add(chunks, embedder, cache=cache)
+    return index
+
+
+def timed_build(label: str, tmp: str, articles, chunk_size: int, embedder, cache=None) -> VectorIndex:
+    embedder.texts = 0
+    start = time.perf_counter()
+    index = build(os.path.join(tmp, f"index-{label}"), articles, chunk_size, embedder, cache)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {len(index)} 个块，嵌入 {embedder.texts} 个，用时 {elapsed:.2f}s")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--articles-per-day", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--call-latency", type=float, default=0.05, help="模拟接口每次调用的延迟（秒）")
+    parser.add_argument("--text-latency", type=float, default=0.0005, help="模拟接口每个文本的延迟（秒）")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    articles = [make_article(rng, i) for i in range(args.days * args.articles_per_day)]
+    earlier = articles[:-args.articles_per_day]
+    embedder = SlowEmbedder(HashingEmbedder(args.dim), args.call_latency, args.text_latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timed_build("不使用缓存、全部文章", tmp, articles, args.chunk_size, embedder)
+        cache = EmbeddingCache(os.path.join(tmp, "cache-f16.sqlite"))
+        timed_build(f"冷缓存、前 {args.days - 1} 天", tmp, earlier, args.chunk_size, embedder, cache)
+        new_chunks = len(build(os.path.join(tmp, "last-day"), articles[len(earlier):], args.chunk_size,
+                               HashingEmbedder(args.dim)))
+        timed_build(f"追加 1 天（{new_chunks} 个新块）后重建", tmp, articles, args.chunk_size, embedder, cache)
+        timed_build(f"chunk_size 改为 {args.chunk_size * 2} 后重建", tmp, articles, args.chunk_size * 2,
+                    embedder, cache)
+        print(cache.report())
+        cache.close()
+
+        # 精度：同一批块分别经 float16、float32 缓存建立索引，与不经缓存的索引比较
+        plain = HashingEmbedder(args.dim)
+        reference = build(os.path.join(tmp, "reference"), articles, args.chunk_size, plain)
+        queries = plain.embed([reference.record(i)['content'][:20]
+                               for i in random.Random(1).sample(range(len(reference)), args.queries)])
+        _, expected = reference.search(queries, k=10)
+        for dtype in ("float16", "float32"):
+            path = os.path.join(tmp, f"cache-{dtype}.sqlite")
+            cache = EmbeddingCache(path, dtype=dtype)
+            index = build(os.path.join(tmp, f"precision-{dtype}"), articles, args.chunk_size, plain, cache)
+            cache.close()
+            _, ids = index.search(queries, k=10)
+            # 模拟语料中有大量得分相同的块，按原始向量的得分判断：不低于原始第 10 名得分的都算命中
+            vectors = np.asarray(reference.vectors)
+            overlap = np.mean([np.mean(vectors[found] @ q >= vectors[want[-1]] @ q - 1e-6)
+                               for found, want, q in zip(ids, expected, queries)])
+            error = np.abs(np.asarray(index.vectors) - np.asarray(reference.vectors)).max()
+            print(f"{dtype}: 缓存 {os.path.getsize(path) / 1024 / 1024:.1f}MB，"
+                  f"top-10 召回 {overlap:.1%}，分量最大误差 {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
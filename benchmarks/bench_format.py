@@ -0,0 +1,140 @@
+"""
+在本地伪造的 OpenAI 兼容接口上测量 preprocess/format.py 的吞吐量，无需联网。
+
+用法:
+    python benchmarks/bench_format.py --files 200 --latency 0.5 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# 模拟模型不守规矩时在输出末尾添加的评论
+FAKE_COMMENTARY = "\n\n以上是按照您的要求优化后的全文，我调整了标题层级并删除了网页残留内容，如需进一步修改请告诉我。"
+
+
+def make_fake_chat_handler(latency: float, error_rate: float, per_char_latency: float = 0.0,
+                           corrupt_rate: float = 0.0, fail_first: int = 0):
+    """
+    生成一个模拟 /chat/completions 的请求处理类：
+    每个请求延迟 latency 秒再加上每个输出字符 per_char_latency 秒，并以 error_rate 的概率返回 429 或 503。
+    正常时原样返回输入文本，但每千字以 corrupt_rate 的概率添加评论或丢掉后半部分，模拟模型改动了内容：
+    输出越长，出错的可能越大。
+    前 fail_first 个请求轮流返回 429 和 503，用于测试重试。处理类的 requests 属性记录收到的请求数。
+    """
+    lock = threading.Lock()
+
+    class FakeChatHandler(BaseHTTPRequestHandler):
+        requests = 0
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                n = FakeChatHandler.requests
+                FakeChatHandler.requests += 1
+            if n < fail_first:
+                self.send_response(429 if n % 2 == 0 else 503)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"error": {"message": "busy"}}')
+                return
+            text = body["messages"][-1]["content"]
+            if random.random() < 1 - (1 - corrupt_rate) ** (len(text) / 1000):
+                text = text + FAKE_COMMENTARY if random.random() < 0.5 else text[:len(text) // 2]
+            time.sleep(latency + per_char_latency * len(text))
+            if random.random() < error_rate:
+                self.send_response(random.choice([429, 503]))
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"error": {"message": "busy"}}')
+                return
+            payload = {
+                "id": "fake", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeChatHandler
+
+
+def start_fake_server(latency: float, error_rate: float, per_char_latency: float = 0.0,
+                      corrupt_rate: float = 0.0, fail_first: int = 0) -> ThreadingHTTPServer:
+    """在后台线程中启动模拟接口；server.RequestHandlerClass.requests 为收到的请求数。"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 make_fake_chat_handler(latency, error_rate, per_char_latency, corrupt_rate,
+                                                        fail_first))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟接口的单次延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="返回 429/503 的概率")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=50.0, help="每个 Key 的请求速率")
+    parser.add_argument("--keys", type=int, default=2, help="模拟的 API Key 数量")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.latency, args.error_rate)
+    os.environ["ZHIPUAI_API_KEY"] = ",".join(f"fake-key-{i}" for i in range(args.keys))
+    os.environ["ZHIPUAI_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    tmp_dir = tempfile.TemporaryDirectory()
+    tmp = tmp_dir.name
+    os.environ["FORMAT_CACHE_PATH"] = os.path.join(tmp, "llm_cache.sqlite")
+    sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+    import format as formatter
+    formatter.BASE_RETRY_DELAY = 0.05
+
+    with tmp_dir:
+        input_dir = os.path.join(tmp, "in")
+        output_dir = os.path.join(tmp, "out")
+        os.makedirs(input_dir)
+        for i in range(args.files):
+            with open(os.path.join(input_dir, f"{i:05d}.md"), "w", encoding="utf-8") as f:
+                f.write(f"# 文章 {i}\n\n正文内容。\n")
+
+        start = time.perf_counter()
+        asyncio.run(formatter.aprocess_directory(
+            input_dir, output_dir,
+            max_concurrency=args.concurrency,
+            requests_per_second=args.rps,
+        ))
+        elapsed = time.perf_counter() - start
+        written = len([f for f in os.listdir(output_dir) if f.endswith(".md")])
+
+        # 输出到新目录再跑一遍，所有请求都应命中响应缓存
+        start = time.perf_counter()
+        asyncio.run(formatter.aprocess_directory(input_dir, os.path.join(tmp, "out_cached")))
+        cached_elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    serial_estimate = args.files * args.latency
+    print(f"\n写出 {written}/{args.files} 个文件，耗时 {elapsed:.2f} 秒，"
+          f"串行预计 {serial_estimate:.1f} 秒，加速 {serial_estimate / elapsed:.1f}x")
+    print(f"命中缓存的重跑耗时 {cached_elapsed:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+比较三种语料存储方式的冷启动开销：逐个读取 .md 文件、分片 JSONL 语料（CorpusReader）、
+mmap 打包语料（PackedCorpus）。
+
+每种方式都在新的子进程中测量：打开语料的耗时、读到第一篇文章并分出第一块的耗时、
+分完全部文章的耗时，以及进程的峰值内存。同时检查三种方式分出的块完全一致。
+
+用法:
+    python benchmarks/bench_packed.py --docs 20000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+sys.path.insert(0, os.path.join(ROOT, "split"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from corpus import CorpusReader, CorpusWriter, PackedCorpus, pack_corpus
+from mdsplit import MarkdownHeaderTextSplitter
+
+MODES = ("markdown", "jsonl", "packed")
+
+
+def iter_markdown(directory: str, splitter):
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+            yield from splitter.iter_split(f.read(), {'title': filename[:-3]})
+
+
+def iter_jsonl(reader: CorpusReader, splitter):
+    for record in reader:
+        yield from splitter.iter_split(record['cleaned_content'], {'title': record['title']})
+
+
+def run_child(mode: str, path: str, chunk_size: int):
+    """在子进程中运行，结果以 JSON 输出到标准输出。"""
+    splitter = MarkdownHeaderTextSplitter(chunk_size=chunk_size)
+    start = time.perf_counter()
+    if mode == "markdown":
+        chunks = iter_markdown(path, splitter)
+    elif mode == "jsonl":
+        chunks = iter_jsonl(CorpusReader(path), splitter)
+    else:
+        chunks = PackedCorpus(path).iter_chunks(splitter)
+    opened = time.perf_counter() - start
+    checksum = 0
+    count = 0
+    first = None
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        checksum = (checksum * 31 + hash(chunk.content) + hash(chunk.metadata['title'])) & 0xFFFFFFFFFFFF
+        count += 1
+    total = time.perf_counter() - start
+    print(json.dumps({'open': opened, 'first': first, 'total': total, 'chunks': count,
+                      'checksum': checksum,
+                      'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def measure(mode: str, path: str, chunk_size: int) -> dict:
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    output = subprocess.run([sys.executable, __file__, "--child", mode, path, "--chunk-size", str(chunk_size)],
+                            check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="比较语料存储方式的冷启动开销")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.chunk_size)
+        sys.exit(0)
+
+    from bench_split import make_article
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        markdown_dir = os.path.join(tmp, "processed_data")
+        corpus_dir = os.path.join(tmp, "corpus")
+        packed_dir = os.path.join(tmp, "packed")
+        os.makedirs(markdown_dir)
+        writer = CorpusWriter(corpus_dir)
+        for i in range(args.docs):
+            title = f"{i:06d}"
+            text = make_article(rng, i)
+            with open(os.path.join(markdown_dir, title + ".md"), 'w', encoding='utf-8') as f:
+                f.write(text)
+            writer.add({'title': title, 'cleaned_content': text})
+        writer.close()
+        with CorpusReader(corpus_dir) as reader:
+            pack_corpus(reader, packed_dir)
+
+        paths = {"markdown": markdown_dir, "jsonl": corpus_dir, "packed": packed_dir}
+        results = {mode: measure(mode, paths[mode], args.chunk_size) for mode in MODES}
+        print(f"{args.docs} 篇文章，{results['packed']['chunks']} 个块")
+        print(f"{'方式':<10}{'打开':>10}{'首块':>10}{'全部分块':>10}{'峰值内存':>10}")
+        for mode in MODES:
+            r = results[mode]
+            print(f"{mode:<10}{r['open'] * 1e3:>9.2f}ms{r['first'] * 1e3:>9.2f}ms"
+                  f"{r['total']:>9.2f}s{r['rss_mb']:>8.1f}MB")
+        checksums = {r['checksum'] for r in results.values()}
+        print("三种方式分块结果一致" if len(checksums) == 1 else "警告：分块结果不一致！")
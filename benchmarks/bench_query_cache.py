@@ -0,0 +1,113 @@
+"""
+测量 rag/query_cache.py 在重复、相近主题上的命中率和节省的检索时间。
+
+从模拟语料中取若干主题，按 Zipf 分布反复提问，每次提问随机套用一种改写：
+原样、加问号或空格（规范化后与原主题相同，走精确缓存）、加“关于”等前后缀（走语义缓存）。
+比较不带缓存和带缓存的 IndexRetriever 的单次延迟，并检查语义命中返回的结果与重新检索的结果的重合度；
+最后向索引追加向量，确认缓存随索引版本自动失效。
+
+用法:
+    python benchmarks/bench_query_cache.py --chunks 100000 --queries 2000 --threshold 0.9 0.92 0.95
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "rag"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_bm25 import make_corpus as make_texts
+from bench_service import build_index
+from bm25 import BM25Index
+from embedding import HashingEmbedder
+from query_cache import normalize_query
+from service import CachedRetriever, IndexRetriever
+
+# 规范化后与原主题相同的改写
+EXACT_VARIANTS = ["{}", "{}？", " {} ", "{}?", "{}。"]
+# 语义相近的改写
+SEMANTIC_VARIANTS = ["关于{}", "{}的情况", "{}工作", "请写{}"]
+
+
+def make_queries(topics, n: int, semantic_ratio: float, seed: int = 0):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(topics))]
+    queries = []
+    for topic in rng.choices(topics, weights, k=n):
+        variants = SEMANTIC_VARIANTS if rng.random() < semantic_ratio else EXACT_VARIANTS
+        queries.append(rng.choice(variants).format(topic))
+    return queries
+
+
+def overlap(a, b) -> float:
+    ids_a = {r['metadata']['title'] for r in a}
+    ids_b = {r['metadata']['title'] for r in b}
+    return len(ids_a & ids_b) / max(1, len(ids_b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=200, help="不同主题的数量")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--semantic-ratio", type=float, default=0.3, help="使用相近改写的提问比例")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.95])
+    parser.add_argument("--hybrid", action="store_true", help="同时使用 BM25 做混合检索")
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        texts = make_texts(args.chunks)
+        index = build_index(os.path.join(tmp, "articles"), texts, embedder, "文章")
+        bm25 = None
+        if args.hybrid:
+            bm25 = BM25Index()
+            bm25.add(texts)
+        retriever = IndexRetriever(index, embedder, bm25)
+
+        rng = random.Random(1)
+        topics = list(dict.fromkeys(texts[rng.randrange(len(texts))][:12] for _ in range(args.topics)))
+        queries = make_queries(topics, args.queries, args.semantic_ratio)
+
+        # 缓存按规范化后的查询检索，作为对照的重新检索也用规范化后的查询
+        start = time.perf_counter()
+        fresh = [retriever(normalize_query(q)) for q in queries]
+        plain = time.perf_counter() - start
+        print(f"{len(queries)} 次提问，{len(topics)} 个主题，{args.chunks} 个块")
+        print(f"不带缓存：{plain / len(queries) * 1e3:.2f}ms/次")
+
+        for threshold in args.threshold:
+            cached = CachedRetriever(retriever, threshold=threshold)
+            start = time.perf_counter()
+            results = [cached(q) for q in queries]
+            elapsed = time.perf_counter() - start
+            stats = cached.cache.stats()
+            same = [overlap(r, f) for r, f in zip(results, fresh)]
+            # 与重新检索的结果不完全相同的，都来自语义命中
+            changed = [s for s in same if s < 1]
+            print(f"threshold={threshold}: {elapsed / len(queries) * 1e3:.2f}ms/次，"
+                  f"命中率 {stats['hit_rate']:.1%}（精确 {stats['exact_hits']}，语义 {stats['semantic_hits']}，"
+                  f"未命中 {stats['misses']}），节省 {stats['saved_seconds']:.2f}s")
+            print(f"  与重新检索的结果相比：平均重合 {np.mean(same):.1%}，不完全相同的 {len(changed)} 次"
+                  f"{f'（这些结果平均重合 {np.mean(changed):.1%}）' if changed else ''}")
+
+        distinct = len({normalize_query(q) for q in queries})
+        print(f"规范化后不同的查询 {distinct} 个，只用精确缓存的命中率上限 {1 - distinct / len(queries):.1%}")
+
+        cached = CachedRetriever(retriever)
+        cached(queries[0])
+        index.add_vectors(embedder.embed(["新加入的块"]), [{'content': "新加入的块", 'metadata': {'title': "新块"}}])
+        cached(queries[0])
+        stats = cached.cache.stats()
+        print(f"追加向量后：失效 {stats['invalidations']} 次，第二次查询{'未命中' if stats['misses'] == 2 else '命中！'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+在本地伪造的 OpenAI 兼容接口上比较 preprocess/format.py 整篇请求与分段模式处理长文章的耗时和重试开销，无需联网。
+
+模拟接口的延迟随输出字数线性增长，并且每千字以 --corrupt-rate 的概率给输出添加评论或丢掉后半部分。
+比较三种方式：
+    整篇：原有模式，不校验内容；
+    整篇+校验：整篇请求，校验未通过时重新请求整篇；
+    分段：按标题切分后并发请求各片段，只重新请求未通过校验的片段。
+
+用法:
+    python benchmarks/bench_sections.py --files 20 --chars 12000 --per-char-latency 0.0005 --corrupt-rate 0.03
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_clean import PARAGRAPH
+from bench_format import start_fake_server
+
+
+def make_long_article(rng: random.Random, i: int, chars: int) -> str:
+    """生成一篇约 chars 字、带二级和三级标题以及文末作者信息的长文章。"""
+    parts = [f"# 长篇报告{i}\n"]
+    length = 0
+    section = 0
+    while length < chars:
+        section += 1
+        parts.append(f"## 第{section}部分 工作进展\n")
+        for sub in range(rng.randint(1, 3)):
+            parts.append(f"### {section}.{sub + 1} 具体措施\n")
+            for j in range(rng.randint(2, 5)):
+                paragraph = f"第{section}-{sub}-{j}项：" + PARAGRAPH * rng.randint(1, 4)
+                parts.append(paragraph + "\n")
+                length += len(paragraph)
+    parts.append("---\n> 撰稿人：张三、李四\n> 信息来源：长宁房管\n")
+    return "\n".join(parts)
+
+
+def run(formatter, input_dir: str, output_dir: str, sections: bool, concurrency: int) -> float:
+    start = time.perf_counter()
+    # 只保留最后的统计行，不逐个打印保存的文件
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        asyncio.run(formatter.aprocess_directory(input_dir, output_dir, max_concurrency=concurrency,
+                                                 requests_per_second=1000.0, sections=sections))
+    elapsed = time.perf_counter() - start
+    for line in log.getvalue().splitlines():
+        if line.startswith(("共 ", "完成 ")):
+            print(f"    {line}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--chars", type=int, default=12000, help="每篇文章的大致字数")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟接口每个请求的固定延迟（秒）")
+    parser.add_argument("--per-char-latency", type=float, default=0.0005, help="模拟接口每个输出字符的延迟（秒）")
+    parser.add_argument("--corrupt-rate", type=float, default=0.03, help="模拟接口每千字改动内容的概率")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    random.seed(0)
+    server = start_fake_server(args.latency, 0.0, args.per_char_latency, args.corrupt_rate)
+    os.environ["ZHIPUAI_API_KEY"] = "fake-key"
+    os.environ["ZHIPUAI_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+    import format as formatter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "in")
+        os.makedirs(input_dir)
+        rng = random.Random(0)
+        for i in range(args.files):
+            with open(os.path.join(input_dir, f"{i:05d}.md"), "w", encoding="utf-8") as f:
+                f.write(make_long_article(rng, i, args.chars))
+        print(f"{args.files} 篇约 {args.chars} 字的文章，模拟接口 {args.latency * 1e3:.0f}ms + "
+              f"{args.per_char_latency * 1e3:.1f}ms/字，每千字改动内容的概率 {args.corrupt_rate:.0%}")
+
+        min_chars = formatter.SECTION_MIN_CHARS
+        for label, sections, whole in (("整篇", False, True), ("整篇+校验", True, True), ("分段", True, False)):
+            # 每种方式使用独立的响应缓存，互不命中
+            formatter.CACHE_PATH = os.path.join(tmp, f"cache-{label}.sqlite")
+            formatter.SECTION_MIN_CHARS = float("inf") if whole else min_chars
+            print(f"{label}:")
+            single = run(formatter, input_dir, os.path.join(tmp, f"single-{label}"), sections, args.concurrency) \
+                if args.files == 1 else None
+            if single is None:
+                # 先单独处理一篇，测量单篇文章的端到端延迟
+                single_dir = os.path.join(tmp, f"single-in-{label}")
+                os.makedirs(single_dir)
+                os.link(os.path.join(input_dir, "00000.md"), os.path.join(single_dir, "00000.md"))
+                single = run(formatter, single_dir, os.path.join(tmp, f"single-{label}"), sections,
+                             args.concurrency)
+                formatter.CACHE_PATH = os.path.join(tmp, f"cache-{label}-all.sqlite")
+                elapsed = run(formatter, input_dir, os.path.join(tmp, f"out-{label}"), sections, args.concurrency)
+                print(f"    单篇 {single:.2f}s，全部 {args.files} 篇 {elapsed:.2f}s")
+            else:
+                print(f"    单篇 {single:.2f}s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
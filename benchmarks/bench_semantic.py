@@ -0,0 +1,135 @@
+"""
+比较 split/semantic.py 的语义分块与 MarkdownHeaderTextSplitter 按标题和大小分块的吞吐量。
+
+语义分块使用离线的 HashingEmbedder，另外与逐句嵌入、逐对计算余弦相似度的朴素实现对比，
+统计嵌入模型的调用次数：换成远程嵌入接口时，调用次数基本决定了语义分块的耗时。
+最后用查表返回预先算好的向量的嵌入模型再测一次，得到嵌入以外的分块开销。
+
+用法:
+    python benchmarks/bench_semantic.py --docs 2000 --batch-size 1024
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "split"))
+sys.path.insert(0, os.path.join(ROOT, "rag"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_split import make_article
+from embedding import HashingEmbedder
+from mdsplit import MarkdownHeaderTextSplitter
+from semantic import SemanticSplitter
+
+
+class CountingEmbedder:
+    """记录嵌入模型的调用次数和嵌入的句子数。"""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return self.embedder.embed(texts)
+
+
+class PrecomputedEmbedder:
+    """查表返回预先算好的向量，用于测量嵌入以外的开销。"""
+
+    def __init__(self, embedder, texts):
+        self.dim = embedder.dim
+        texts = list(dict.fromkeys(texts))
+        self.vectors = dict(zip(texts, embedder.embed(texts)))
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return np.stack([self.vectors[text] for text in texts])
+
+
+class NaiveSemanticSplitter(SemanticSplitter):
+    """朴素实现：每个小节单独处理，逐句嵌入，逐对计算相邻句子的余弦相似度。"""
+
+    def _split_batch(self, documents, bounds):
+        results = []
+        for sections, section_bounds in zip(documents, bounds):
+            split_sections = []
+            for (section, _), b in zip(sections, section_bounds):
+                if len(b) - 1 < self.min_sentences:
+                    split_sections.append((section, [section]))
+                    continue
+                content = section.content
+                vectors = [self.embedder.embed([content[b[i]:b[i + 1]].strip()])[0] for i in range(len(b) - 1)]
+                distances = np.array([1.0 - float(np.dot(vectors[i], vectors[i + 1]))
+                                      for i in range(len(vectors) - 1)])
+                cuts = np.flatnonzero(distances > np.percentile(distances, self.breakpoint_percentile))
+                split_sections.append((section, self._make_chunks(section, b, cuts)))
+            results.append(split_sections)
+        return results
+
+
+def run(label: str, split, docs, embedder=None):
+    start = time.perf_counter()
+    chunks = split(docs)
+    elapsed = time.perf_counter() - start
+    megabytes = sum(len(doc.encode("utf-8")) for doc in docs) / 1024 / 1024
+    calls = f"，嵌入 {embedder.calls} 次共 {embedder.texts} 句" if embedder is not None else ""
+    print(f"{label}: {elapsed:.2f}s，{megabytes / elapsed:.2f} MB/s，{chunks} 块{calls}")
+    return elapsed
+
+
+def split_all(splitter, docs) -> int:
+    return sum(len(chunks) for sections in splitter.iter_split_documents((doc, None) for doc in docs)
+               for _, chunks in sections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--percentile", type=float, default=90.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    docs = [make_article(rng, i) for i in range(args.docs)]
+    print(f"{args.docs} 篇文章，共 {sum(map(len, docs))} 字")
+
+    header = MarkdownHeaderTextSplitter(chunk_size=args.chunk_size)
+    run(f"按标题和大小 chunk_size={args.chunk_size}", lambda d: sum(len(header.split_text(t)) for t in d), docs)
+
+    base = HashingEmbedder(args.dim)
+    implementations = (("批量嵌入、向量化相似度", SemanticSplitter), ("逐句嵌入、逐对相似度", NaiveSemanticSplitter))
+    for label, cls in implementations:
+        embedder = CountingEmbedder(base)
+        splitter = cls(embedder, breakpoint_percentile=args.percentile, chunk_size=args.chunk_size,
+                       batch_size=args.batch_size)
+        run(f"语义分块（{label}）", lambda d: split_all(splitter, d), docs, embedder)
+
+    # 收集所有句子，预先嵌入
+    splitter = SemanticSplitter(base)
+    sentences = [section.content[b[i]:b[i + 1]].strip()
+                 for doc in docs
+                 for section, _ in splitter._sections.iter_split_sections(doc)
+                 for b in [splitter._sentence_bounds(section.content)]
+                 for i in range(len(b) - 1)]
+    embedder = PrecomputedEmbedder(base, sentences)
+    for label, cls in implementations:
+        splitter = cls(embedder, breakpoint_percentile=args.percentile, chunk_size=args.chunk_size,
+                       batch_size=args.batch_size)
+        run(f"语义分块（{label}，向量已预先算好）", lambda d: split_all(splitter, d), docs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+在本地伪造的流式 OpenAI 兼容接口上测量 rag/service.py 的延迟，无需联网。
+
+模拟接口在 first_token_latency 秒后开始以 SSE 逐个返回 token，相邻 token 间隔 token_interval 秒。
+多个用户按泊松过程到达并同时请求，统计首个 token 延迟（TTFT）和各阶段耗时的 p50/p95；
+--slow-policy 让政策文件检索源变慢，用来验证超时的检索源被跳过而不拖慢首个 token。
+
+用法:
+    python benchmarks/bench_service.py --users 200 --rate 20 --chunks 50000
+    python benchmarks/bench_service.py --users 50 --slow-policy 2.0
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "rag"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_bm25 import make_corpus as make_texts
+from bm25 import BM25Index
+from embedding import HashingEmbedder
+from index import VectorIndex
+
+
+def make_fake_stream_handler(first_token_latency: float, token_interval: float, tokens: int):
+    """
+    生成一个模拟流式 /chat/completions 的请求处理类：
+    等待 first_token_latency 秒后返回第一个 token，之后每隔 token_interval 秒返回一个，共 tokens 个。
+    """
+    class FakeStreamHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            time.sleep(first_token_latency)
+            for i in range(tokens):
+                if i:
+                    time.sleep(token_interval)
+                payload = {
+                    "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": f"第{i}段"}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return FakeStreamHandler
+
+
+def _serve(port_queue, first_token_latency: float, token_interval: float, tokens: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 make_fake_stream_handler(first_token_latency, token_interval, tokens))
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_fake_server(first_token_latency: float, token_interval: float, tokens: int):
+    """
+    在子进程中启动模拟接口，返回 (进程, 端口)。
+    与被测服务不在同一进程，避免接口线程与客户端争用 GIL 而抬高测得的延迟。
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(port_queue, first_token_latency, token_interval, tokens),
+                                      daemon=True)
+    process.start()
+    return process, port_queue.get()
+
+
+def build_index(path: str, texts, embedder, prefix: str) -> VectorIndex:
+    index = VectorIndex(path, dim=embedder.dim)
+    batch = 4096
+    for start in range(0, len(texts), batch):
+        part = texts[start:start + batch]
+        index.add_vectors(embedder.embed(part),
+                          [{'content': t, 'metadata': {'title': f"{prefix}{start + i}"}} for i, t in enumerate(part)])
+    index.save()
+    return index
+
+
+async def run_users(service, topics, rate: float):
+    """按平均每秒 rate 个的泊松过程发起请求，返回每个请求的 (report, 是否成功)。"""
+    rng = random.Random(0)
+
+    async def user(delay: float, topic: str):
+        await asyncio.sleep(delay)
+        stream = service.draft(topic)
+        try:
+            async for _ in stream:
+                pass
+            return stream.report, True
+        except Exception:
+            return stream.report, False
+
+    delays = np.cumsum([rng.expovariate(rate) for _ in topics]) if rate > 0 else [0.0] * len(topics)
+    return await asyncio.gather(*(user(d, t) for d, t in zip(delays, topics)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="请求总数")
+    parser.add_argument("--rate", type=float, default=20.0, help="平均每秒到达的请求数，0 表示同时到达")
+    parser.add_argument("--chunks", type=int, default=100000, help="文章块索引的块数")
+    parser.add_argument("--policies", type=int, default=5000, help="政策文件库的块数")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="模拟接口返回第一个 token 前的延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="模拟接口相邻 token 的间隔（秒）")
+    parser.add_argument("--tokens", type=int, default=100, help="每个初稿的 token 数")
+    parser.add_argument("--retrieval-timeout", type=float, default=0.5)
+    parser.add_argument("--slow-policy", type=float, default=0.0, help="给政策文件检索附加的延迟（秒）")
+    args = parser.parse_args()
+
+    server, port = start_fake_server(args.first_token_latency, args.token_interval, args.tokens)
+    api_base = f"http://127.0.0.1:{port}/v1"
+    import service as draft_service
+
+    embedder = HashingEmbedder(args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        texts = make_texts(args.chunks)
+        articles = build_index(os.path.join(tmp, "articles"), texts, embedder, "文章")
+        articles.build_ivf()
+        bm25 = BM25Index()
+        bm25.add(texts)
+        policies = build_index(os.path.join(tmp, "policies"), make_texts(args.policies), embedder, "政策")
+        print(f"建立索引：{args.chunks} 个文章块，{args.policies} 个政策块，{time.perf_counter() - start:.1f}s")
+
+        policy_retriever = draft_service.IndexRetriever(policies, embedder)
+        if args.slow_policy > 0:
+            def slow_policy(query, retriever=policy_retriever):
+                time.sleep(args.slow_policy)
+                return retriever(query)
+            policy_retriever = slow_policy
+        retrievers = {
+            'articles': draft_service.IndexRetriever(articles, embedder, bm25, nprobe=8),
+            'policies': policy_retriever,
+        }
+        llm = draft_service.create_llm("fake-key", api_base)
+        service = draft_service.DraftService(retrievers, llm, retrieval_timeout=args.retrieval_timeout)
+
+        rng = random.Random(1)
+        topics = [texts[rng.randrange(len(texts))][:16] for _ in range(args.users)]
+        start = time.perf_counter()
+        results = asyncio.run(run_users(service, topics, args.rate))
+        elapsed = time.perf_counter() - start
+        service.close()
+        server.terminate()
+
+        ok = [report for report, success in results if success]
+        ttft = [report.first_token for report in ok if report.first_token is not None]
+        print(f"{args.users} 个请求（平均每秒到达 {args.rate:g} 个），成功 {len(ok)} 个，用时 {elapsed:.1f}s")
+        print(f"模拟接口：首个 token {args.first_token_latency * 1e3:.0f}ms，"
+              f"之后每 {args.token_interval * 1e3:.0f}ms 一个，共 {args.tokens} 个")
+        if ttft:
+            print(f"TTFT p50 {np.percentile(ttft, 50) * 1e3:.1f}ms，p95 {np.percentile(ttft, 95) * 1e3:.1f}ms，"
+                  f"去掉接口自身延迟后 p95 {(np.percentile(ttft, 95) - args.first_token_latency) * 1e3:.1f}ms")
+        print(service.latency.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+测量 split/mdsplit.py 中 MarkdownHeaderTextSplitter 的分块速度。
+
+会与旧版逐次重新拼接、回溯查找分割点的实现对比。文档中没有超出 chunk_size 的行时，
+旧版不会产生超长的块，检查两者的输出逐块一致；另外分别统计超出 chunk_size 的块数。
+
+加上 --memory 时，改为在模拟语料上测量保留全部块所需的内存，
+并与旧版每块各持一份正文副本和元数据字典的表示对比。
+
+用法:
+    python benchmarks/bench_split.py --sizes 1 2 4 --chunk-size 300
+    python benchmarks/bench_split.py --memory --docs 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "split"))
+
+from mdsplit import Chunk, MarkdownHeaderTextSplitter
+
+SENTENCES = [
+    "长宁区房管局持续推进旧住房成套改造工作，",
+    "今年以来共完成公租房申请受理一千余户。",
+    "各街道结合实际情况，细化政策宣传与入户走访。",
+    "Residents can check the progress online. ",
+    "相关负责人表示，下一步将进一步优化审核流程；",
+]
+
+
+@dataclass
+class LegacyChunk:
+    """旧版的块表示：每块各自持有正文字符串和元数据字典。"""
+    content: str = ''
+    metadata: dict = field(default_factory=dict)
+
+
+class LegacySplitter(MarkdownHeaderTextSplitter):
+    """旧版 _split_chunk_by_size：每次分割后重新拼接并用正则扫描整个窗口。"""
+
+    def _find_best_split_point(self, lines: List[str]) -> int:
+        if len(lines) <= 1:
+            return -1
+        for i in range(len(lines) - 2, 0, -1):
+            if not lines[i].strip() and lines[i+1].strip():
+                if i > 0 and lines[i-1].strip():
+                    return i + 1
+        return len(lines) - 1
+
+    def _split_chunk_by_size(self, chunk: Chunk, kinds=None, lengths=None) -> List[Chunk]:
+        # 旧版不使用分节时得到的行类别和长度贡献，自己逐行重新分析
+        sub_chunks = []
+        current_lines = []
+        current_non_code_len = 0
+        in_code = False
+        code_fence = None
+        for line in chunk.content.split('\n'):
+            stripped_line = line.strip()
+            is_entering_code = False
+            is_exiting_code = False
+            if not in_code:
+                if stripped_line.startswith("```") and stripped_line.count("```") == 1:
+                    is_entering_code = True; code_fence = "```"
+                elif stripped_line.startswith("~~~") and stripped_line.count("~~~") == 1:
+                    is_entering_code = True; code_fence = "~~~"
+            elif code_fence is not None and stripped_line.startswith(code_fence):
+                is_exiting_code = True
+            line_len_contribution = 0
+            if (not in_code and not is_entering_code) or is_exiting_code:
+                line_len_contribution = self._length_function(line) + 1
+            if (line_len_contribution > 0 and current_lines and
+                    current_non_code_len + line_len_contribution > self._chunk_size):
+                split_line_idx = self._find_best_split_point(current_lines)
+                if split_line_idx > 0:
+                    sub_chunks.append(Chunk(content="\n".join(current_lines[:split_line_idx]),
+                                            metadata=chunk.metadata.copy()))
+                    current_lines = current_lines[split_line_idx:] + [line]
+                    current_non_code_len = self._calculate_length_excluding_code("\n".join(current_lines))
+                else:
+                    sub_chunks.append(Chunk(content="\n".join(current_lines), metadata=chunk.metadata.copy()))
+                    current_lines = [line]
+                    current_non_code_len = line_len_contribution if not is_entering_code else 0
+            else:
+                current_lines.append(line)
+                current_non_code_len += line_len_contribution
+            if is_entering_code: in_code = True
+            elif is_exiting_code: in_code = False; code_fence = None
+        if current_lines:
+            sub_chunks.append(Chunk(content="\n".join(current_lines), metadata=chunk.metadata.copy()))
+        return sub_chunks or [chunk]
+
+
+def make_document(size_mb: float, seed: int = 0, sections: int = 4) -> str:
+    """生成约 size_mb MB 的Markdown文档，只有少数几个很长的标题小节。"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    total = 0
+    section = 0
+    while total < target:
+        if total >= section * target / sections:
+            section += 1
+            header = f"\n## 第{section}部分\n"
+            parts.append(header)
+            total += len(header.encode("utf-8"))
+        line = "".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.2:
+            line += "\n"
+        parts.append(line + "\n")
+        total += len(line.encode("utf-8")) + 1
+    return "# 长篇报告\n" + "".join(parts)
+
+
+def make_article(rng: random.Random, i: int) -> str:
+    """生成一篇带多级标题的普通长度文章。"""
+    parts = [f"# 文章{i}\n"]
+    for h2 in range(rng.randint(2, 5)):
+        parts.append(f"## 第{h2 + 1}部分 工作进展\n")
+        for h3 in range(rng.randint(0, 3)):
+            parts.append(f"### （{h3 + 1}）具体措施\n")
+            for _ in range(rng.randint(2, 6)):
+                parts.append("".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 5))) + "\n\n")
+    return "".join(parts)
+
+
+def measure_memory(docs: int, chunk_size: int):
+    """比较保留全部块时，当前表示与旧版表示各自占用的内存。"""
+    rng = random.Random(0)
+    corpus = [make_article(rng, i) for i in range(docs)]
+    splitter = MarkdownHeaderTextSplitter(chunk_size=chunk_size)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    chunks = [c for i, text in enumerate(corpus) for c in splitter.split_text(text, {"source": f"{i}.md"})]
+    compact = tracemalloc.get_traced_memory()[0] - base
+
+    base = tracemalloc.get_traced_memory()[0]
+    legacy = [LegacyChunk(content=c.content, metadata=c.metadata) for c in chunks]
+    legacy_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    corpus_mb = sum(len(t.encode("utf-8")) for t in corpus) / 1024 / 1024
+    print(f"{docs} 篇文章（{corpus_mb:.1f} MB），{len(chunks)} 块")
+    print(f"当前表示 {compact / 1024 / 1024:7.1f} MB  旧版表示 {legacy_bytes / 1024 / 1024:7.1f} MB"
+          f"  节省 {1 - compact / legacy_bytes:.0%}")
+    del legacy
+
+
+def count_oversized(splitter, chunks):
+    return sum(splitter._calculate_length_excluding_code(c.content) > splitter._chunk_size for c in chunks)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2])
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行旧版实现")
+    parser.add_argument("--memory", action="store_true", help="测量保留全部块所需的内存")
+    parser.add_argument("--docs", type=int, default=2000, help="内存测试的文章数")
+    args = parser.parse_args()
+
+    if args.memory:
+        measure_memory(args.docs, args.chunk_size)
+        return
+
+    for size in args.sizes:
+        text = make_document(size)
+        splitter = MarkdownHeaderTextSplitter(chunk_size=args.chunk_size)
+        chunks, elapsed = timed(lambda: splitter.split_text(text))
+        line = f"{size:5.1f} MB  当前实现 {elapsed:7.3f} 秒  {len(chunks)} 块"
+        if not args.skip_legacy:
+            legacy = LegacySplitter(chunk_size=args.chunk_size)
+            legacy_chunks, legacy_elapsed = timed(lambda: legacy.split_text(text))
+            line += f"  旧版 {legacy_elapsed:7.3f} 秒  加速 {legacy_elapsed / elapsed:6.1f}x"
+            if max(len(l) for l in text.split("\n")) + 1 <= args.chunk_size:
+                # 没有超长行时旧版的结果是正确的，两者应逐块一致
+                assert [(c.content, c.metadata) for c in chunks] == \
+                       [(c.content, c.metadata) for c in legacy_chunks], "输出与旧版不一致"
+            line += (f"  超出 chunk_size 的块: 当前 {count_oversized(splitter, chunks)}"
+                     f"，旧版 {count_oversized(splitter, legacy_chunks)}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+比较 split/mdsplit.py 按字符数和按 token 数计算块大小的效果，以及 TokenCounter 缓存和批量计数节省的分词次数。
+
+在模拟文章上建立离线词表（VocabTokenizer），然后：
+    1. 在中文、英文和数字表格小节交替的长文档上按字符数分块：chunk_size 取使平均 token 数与 token 上限相当的字符数，
+       统计实际 token 数超出上限（嵌入时被截断）的块和平均占用率；
+    2. 按 token 数分块：统计同样的指标；
+    3. 在普通文章上比较不缓存的 token 长度函数与 TokenCounter 的分块耗时和分词次数。
+
+用法:
+    python benchmarks/bench_token_length.py --docs 500 --max-tokens 256
+"""
+import argparse
+import collections
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "split"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_split import SENTENCES, make_article
+from mdsplit import MarkdownHeaderTextSplitter
+from token_length import TokenCounter, VocabTokenizer
+
+
+def make_mixed_document(seed: int, sections: int = 40, lines: int = 60) -> str:
+    """生成中文小节与英文、数字表格小节交替的长文档，不同小节每个 token 对应的字数相差很大。"""
+    rng = random.Random(seed)
+    chinese = [s for s in SENTENCES if not s.isascii()]
+    english = [s for s in SENTENCES if s.isascii()]
+    parts = ["# 长篇报告\n"]
+    for section in range(sections):
+        parts.append(f"\n## 第{section + 1}部分\n")
+        for _ in range(lines):
+            kind = section % 3
+            if kind == 0:
+                line = "".join(rng.choice(chinese) for _ in range(rng.randint(1, 4)))
+            elif kind == 1:
+                line = "".join(rng.choice(english) for _ in range(rng.randint(1, 4)))
+            else:
+                line = "| " + " | ".join(str(rng.randint(0, 99999)) for _ in range(6)) + " |"
+            parts.append(line + ("\n\n" if rng.random() < 0.2 else "\n"))
+    return "".join(parts)
+
+
+def build_vocab(docs, size: int) -> VocabTokenizer:
+    """
+    仿照常见 BPE 词表的粒度建立词表：中文取出现最多的 1～2 字片段，英文取带前导空格的整词，
+    数字和标点逐个字符成词。中文约 1.5 字一个 token，英文约 5 字一个 token，数字 1 字一个 token。
+    """
+    grams = collections.Counter()
+    for doc in docs:
+        grams.update(g for n in (1, 2) for i in range(len(doc) - n + 1)
+                     if not (g := doc[i:i + n]).isascii())
+        grams.update(re.findall(r" ?[A-Za-z]+", doc))
+    vocab = [chr(c) for c in range(32, 127)] + [g for g, _ in grams.most_common(size) if "\n" not in g]
+    return VocabTokenizer(vocab)
+
+
+class CountingTokenizer:
+    """记录分词次数和分词的字符数。"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.name = tokenizer.name
+        self.calls = 0
+        self.chars = 0
+
+    def encode(self, text):
+        self.calls += 1
+        self.chars += len(text)
+        return self.tokenizer.encode(text)
+
+    def count_batch(self, texts):
+        return [len(self.encode(text)) for text in texts]
+
+
+def measure_fill(splitter, docs, tokenizer, max_tokens: int):
+    """只统计被细分的小节中除最后一块以外的子块，未超出上限的小节和小节的剩余部分本来就填不满。"""
+    counts = np.array([len(tokenizer.encode(chunk.content))
+                       for doc in docs
+                       for _, chunks in splitter.iter_split_sections(doc)
+                       for chunk in chunks[:-1]])
+    return len(counts), (counts > max_tokens).mean(), np.minimum(counts, max_tokens).mean() / max_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--long-docs", type=int, default=4, help="中英文和表格混合的长文档篇数")
+    parser.add_argument("--vocab", type=int, default=5000, help="词表大小")
+    parser.add_argument("--max-tokens", type=int, default=256, help="嵌入模型的最大输入 token 数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    docs = [make_article(rng, i) for i in range(args.docs)]
+    long_docs = [make_mixed_document(seed) for seed in range(args.long_docs)]
+    tokenizer = build_vocab(docs[:100] + long_docs[:1], args.vocab)
+    chars_per_token = sum(map(len, long_docs)) / sum(len(tokenizer.encode(doc)) for doc in long_docs)
+    char_size = int(args.max_tokens * chars_per_token)
+    print(f"词表 {len(tokenizer.vocab)} 个 token，长文档平均每个 token {chars_per_token:.2f} 字")
+
+    for label, splitter in (
+            (f"按字符数 chunk_size={char_size}", MarkdownHeaderTextSplitter(chunk_size=char_size)),
+            (f"按 token 数 chunk_size={args.max_tokens}",
+             MarkdownHeaderTextSplitter.from_tokenizer(tokenizer, args.max_tokens))):
+        chunks, truncated, fill = measure_fill(splitter, long_docs, tokenizer, args.max_tokens)
+        print(f"{label}: {chunks} 个细分的子块，超出上限被截断 {truncated:.1%}，平均占用上限的 {fill:.1%}")
+
+    for label, make_length in (
+            ("不缓存", lambda counting: lambda text: len(counting.encode(text))),
+            ("TokenCounter", lambda counting: TokenCounter(counting))):
+        counting = CountingTokenizer(tokenizer)
+        splitter = MarkdownHeaderTextSplitter(chunk_size=args.max_tokens, length_function=make_length(counting))
+        start = time.perf_counter()
+        for doc in docs:
+            splitter.split_text(doc)
+        elapsed = time.perf_counter() - start
+        print(f"{args.docs} 篇文章 {label}: 分块 {elapsed:.2f}s，分词 {counting.calls} 次共 {counting.chars} 字")
+
+
+if __name__ == "__main__":
+    main()
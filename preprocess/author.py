@@ -1,87 +1,225 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import re
 import sys
+from typing import Dict, List, Optional, Tuple
 
-def format_metadata_with_regex(input_dir: str, output_dir: str):
+from manifest import Manifest
+from metadata import KEYWORDS, parse_metadata_fields
+
+# 处理逻辑变化时递增，使增量清单中的旧记录失效
+STAGE_VERSION = 2
+
+# 正则表达式，匹配常见的元数据行
+# 关键词: 来源, 撰稿, 作者, 编辑, 摄影, 校对等
+# `\s*` 匹配任意空白符, `[:：]` 匹配中英文冒号
+METADATA_PATTERN = re.compile(rf"^\s*[\*\-]?\s*({'|'.join(KEYWORDS)})\s*[:：].*$")
+# 各输出文件的文末字段，保存在输出目录中
+METADATA_FILE = "trailing_metadata.json"
+# 查找元数据块时只解码文件末尾的这么多字节，元数据块更长时再处理整个文件
+TAIL_BYTES = 4096
+
+
+def split_trailing_metadata(content: str) -> Optional[int]:
+    """
+    从文末向前逐行扫描，查找末尾连续的元数据行（中间可以夹有空行）。
+    只访问元数据块及其上方的一行，不会把全文拆成行列表。
+
+    Returns:
+        元数据块第一行在 content 中的起始位置；没有元数据时返回 None。
+    """
+    if not content:
+        return None
+    first = None
+    # 与 readlines() 一样，结尾的换行符属于最后一行
+    stop = len(content) - 1 if content.endswith('\n') else len(content)
+    while True:
+        start = content.rfind('\n', 0, stop) + 1
+        line_content = content[start:stop].strip()
+        # 先净化，再匹配
+        if METADATA_PATTERN.match(line_content.strip('*- _')):
+            first = start
+        elif line_content:
+            # 遇到实体行：元数据块已经结束，或者文末根本没有元数据
+            break
+        elif first is not None:
+            # 已经找到元数据后的空行，也认为是元数据块的一部分
+            first = start
+        if start == 0:
+            break
+        stop = start - 1
+    return first
+
+
+def _metadata_lines(block: str) -> List[str]:
+    return [line.strip().strip('*- ') for line in block.split('\n') if line.strip()]
+
+
+def _format_block(block: str) -> Tuple[str, Dict[str, str]]:
+    """把元数据块格式化为接在正文后面的 `---` 和引用行，并解析字段。"""
+    lines = _metadata_lines(block)
+    return "\n\n---" + "".join(f"> {line}\n" for line in lines), parse_metadata_fields(lines)
+
+
+def extract_trailing_metadata(content: str) -> Tuple[str, Dict[str, str]]:
+    """
+    查找文末连续的元数据行，将其格式化为 `---` 之后的引用块，并解析出结构化字段。
+
+    Args:
+        content (str): Markdown 全文。
+
+    Returns:
+        (格式化后的全文, 字段)；没有找到元数据时全文原样返回，字段为空。
+    """
+    first = split_trailing_metadata(content)
+    if first is None:
+        return content, {}
+    formatted, fields = _format_block(content[first:])
+    return content[:first].rstrip() + formatted, fields
+
+
+def _decode(data: bytes) -> str:
+    """按文本模式读取的方式解码：\\r\\n 和单独的 \\r 都转换为 \\n。"""
+    text = data.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _scan_tail(data: bytes, tail_bytes: int) -> Optional[Tuple[int, str, Optional[int]]]:
+    """
+    只解码 data 末尾不超过 tail_bytes 字节的整行，在其中查找元数据块。
+
+    Returns:
+        (解码部分在 data 中的起始字节, 解码出的文本, 元数据块在文本中的起始位置或 None)；
+        元数据块可能延伸到解码部分之外时返回 None，需要处理整个 data。
+    """
+    offset = 0
+    if len(data) > tail_bytes:
+        newline = data.find(b'\n', len(data) - tail_bytes - 1)
+        if newline == -1:
+            return None
+        offset = newline + 1
+    text = _decode(data[offset:])
+    first = split_trailing_metadata(text)
+    if offset and (first == 0 or not text.strip()):
+        return None
+    return offset, text, first
+
+
+def _process_file(args) -> Tuple[str, str, str, Dict[str, str]]:
     """
-    使用正则表达式查找并格式化文件末尾的元数据（如来源、作者）。
+    在子进程中处理一个文件并写出结果，只把哈希和字段传回主进程。
+
+    正文的字节原样复制，只解码文件末尾用来查找元数据块；
+    含有 \\r 的文件需要转换换行符，才整篇解码处理。
+    """
+    input_dir, output_dir, filename = args
+    with open(os.path.join(input_dir, filename), 'rb') as f:
+        data = f.read()
+    input_hash = hashlib.sha1(data).hexdigest()
+    scanned = None if b'\r' in data else _scan_tail(data, TAIL_BYTES)
+    if scanned is None:
+        final_content, fields = extract_trailing_metadata(_decode(data))
+        output = final_content.encode('utf-8')
+    else:
+        offset, text, first = scanned
+        if first is None:
+            output, fields = data, {}
+        else:
+            formatted, fields = _format_block(text[first:])
+            # 元数据块上方的实体行也在解码的部分中，rstrip 不会越过它
+            output = data[:offset] + (text[:first].rstrip() + formatted).encode('utf-8')
+    with open(os.path.join(output_dir, filename), 'wb') as f:
+        f.write(output)
+    output_hash = input_hash if output is data else hashlib.sha1(output).hexdigest()
+    return filename, input_hash, output_hash, fields
+
+
+def _load_fields(output_dir: str) -> Dict[str, Dict[str, str]]:
+    path = os.path.join(output_dir, METADATA_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_fields(output_dir: str, fields: Dict[str, Dict[str, str]]):
+    path = os.path.join(output_dir, METADATA_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        # json.dumps 一次性编码走 C 实现，json.dump 逐段编码要慢得多
+        f.write(json.dumps(fields, ensure_ascii=False, sort_keys=True))
+    os.replace(path + '.tmp', path)
+
+
+def format_metadata_with_regex(input_dir: str, output_dir: str, workers: int = 1,
+                               chunk_size: int = 256, quiet: bool = False):
+    """
+    使用正则表达式查找并格式化文件末尾的元数据（如来源、作者），
+    并把每个文件的结构化字段写入输出目录中的 trailing_metadata.json。
+    只处理新增或内容变化的文件，并删除源文件已不存在的输出。
 
     Args:
         input_dir (str): 输入目录的路径。
         output_dir (str): 输出目录的路径。
+        workers (int): 进程数，1 表示在当前进程内串行处理。
+        chunk_size (int): 每次派发给子进程的文件数。
+        quiet (bool): 不逐个打印文件，只打印汇总。
     """
     if not os.path.isdir(input_dir):
         print(f"错误: 输入目录 '{input_dir}' 不存在。", file=sys.stderr)
         return
 
     os.makedirs(output_dir, exist_ok=True)
-    print(f"源目录:      {input_dir}")
-    print(f"目标目录:  {output_dir}")
+    files = sorted(f for f in os.listdir(input_dir) if f.endswith('.md'))
+    total_files = len(files)
+    if not quiet:
+        print(f"源目录:      {input_dir}")
+        print(f"目标目录:  {output_dir}")
+        print(f"共找到 {total_files} 个文件待处理。")
 
-    # 正则表达式，匹配常见的元数据行
-    # 关键词: 来源, 撰稿, 作者, 编辑, 摄影, 校对等
-    # `\s*` 匹配任意空白符, `[:：]` 匹配中英文冒号
-    METADATA_PATTERN = re.compile(r"^\s*[\*\-]?\s*(资料来源|信息来源|来源|撰稿人|撰稿|作者|编辑|摄影|校对|投稿人)\s*[:：].*$")
+    manifest = Manifest(output_dir, "author", STAGE_VERSION)
+    all_fields = _load_fields(output_dir)
+    for filename in manifest.remove_stale(files):
+        all_fields.pop(filename, None)
+        if not quiet:
+            print(f"源文件 '{filename}' 已删除，移除对应输出。")
 
-    files = [f for f in os.listdir(input_dir) if f.endswith('.md')]
-    total_files = len(files)
-    print(f"共找到 {total_files} 个文件待处理。")
-
-    for i, filename in enumerate(files):
-        input_path = os.path.join(input_dir, filename)
-        output_path = os.path.join(output_dir, filename)
-
-        print(f"[{i+1}/{total_files}] 正在处理: {filename} ...")
-
-        if os.path.exists(output_path):
-            print("  -> 文件已存在，跳过。")
-            continue
-
-        with open(input_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        metadata_lines_indices = []
-        # 从后往前遍历，查找末尾连续的元数据行
-        for j in range(len(lines) - 1, -1, -1):
-            line_content = lines[j].strip()
-            # 先净化，再匹配
-            cleaned_line = line_content.strip('*- _')
-            if METADATA_PATTERN.match(cleaned_line):
-                metadata_lines_indices.insert(0, j)
-            # 如果遇到了非元数据行，且不是空行，就停止查找
-            elif line_content and not metadata_lines_indices:
-                break # 已经不在末尾的元数据块了
-            elif not line_content and metadata_lines_indices:
-                # 如果是空行，且已经找到了元数据，也认为是元数据块的一部分
-                 metadata_lines_indices.insert(0, j)
-            elif line_content and metadata_lines_indices:
-                # 如果是实体行，且已经找到了元数据，说明元数据块结束
-                break
-
-
-        if metadata_lines_indices:
-            # 分离正文和元数据
-            first_meta_index = metadata_lines_indices[0]
-            content_lines = lines[:first_meta_index]
-            metadata_lines = lines[first_meta_index:]
-
-            # 格式化元数据
-            formatted_metadata = [f"> {line.strip().strip('*- ')}\n" for line in metadata_lines if line.strip()]
-            
-            # 重新组合内容
-            final_content = "".join(content_lines).rstrip() + "\n\n---" + "".join(formatted_metadata)
-        else:
-            # 没有找到元数据，内容保持不变
-            final_content = "".join(lines)
+    pending = [f for f in files if not manifest.is_fresh(f, os.path.join(input_dir, f))]
+    tasks = [(input_dir, output_dir, filename) for filename in pending]
+    if workers > 1 and len(tasks) > chunk_size:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(_process_file, tasks, chunksize=chunk_size)
+    else:
+        pool = None
+        results = map(_process_file, tasks)
+
+    try:
+        for i, (filename, input_hash, output_hash, fields) in enumerate(results):
+            manifest.record_hashes(filename, os.path.join(input_dir, filename), input_hash, output_hash)
+            all_fields[filename] = fields
+            if not quiet:
+                print(f"[{i + 1}/{len(tasks)}] 已处理: {filename}")
+    finally:
+        if pool is not None:
+            pool.terminate()
+        manifest.save()
+        _save_fields(output_dir, all_fields)
+    print(f"处理了 {len(tasks)} 个文件，{total_files - len(tasks)} 个未变化已跳过。")
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(final_content)
-        print(f"  -> 已保存至: {output_path}")
 
 if __name__ == '__main__':
-    source_directory = "add_main_title"
-    destination_directory = "final_data" # 使用新的输出目录
-    
+    parser = argparse.ArgumentParser(description="格式化文末的来源、作者等信息，并提取为结构化字段。")
+    parser.add_argument("--input", default="add_main_title", help="输入目录")
+    parser.add_argument("--output", default="final_data", help="输出目录")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数")
+    parser.add_argument("--chunk-size", type=int, default=256, help="每块派发的文件数")
+    parser.add_argument("--quiet", action="store_true", help="只打印汇总信息")
+    args = parser.parse_args()
+
     print("开始使用正则表达式格式化文末信息...")
-    format_metadata_with_regex(source_directory, destination_directory)
-    print("\n所有文件处理完毕。")
\ No newline at end of file
+    format_metadata_with_regex(args.input, args.output, args.workers, args.chunk_size, args.quiet)
+    print("\n所有文件处理完毕。")
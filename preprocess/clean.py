@@ -1,101 +1,273 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import re
 
+from corpus import CorpusReader, CorpusWriter, open_corpus, pack_corpus
+from manifest import Manifest
+from metadata import extract_metadata
+
 # For performance, pre-compile regexes that are used in a loop
 TITLE_SETEXT_PATTERN = re.compile(r"^(.+)\n=+\n+", flags=re.MULTILINE)
 TITLE_H1_PATTERN = re.compile(r"^# .+\n+", flags=re.MULTILINE)
-PROMO_PATTERN = re.compile("|".join(map(re.escape, [
-    "拿起手机，搜索微信公众号“长宁房管”，住房相关政策，重点信息一手掌握，赶紧动动手指关注我们吧！",
-    "拿起手机，搜索微信公众号“长宁房管”，住房保障重要政策，重点信息一手掌握，赶紧动动手指关注我们吧！",
-    "房友们，点上方蓝色**“长宁房管”**关注我们，点文末**“在看”、“赞”**提高阅读优先权，及时了解住房相关政策，掌握一手重点信息。快来关注我们吧！",
-    "[长宁房管](javascript:void\(0\);)",
-    "[阅读原文](javascript:;)",
-    "**扫描二维码 下载查看**",
-    "修改于",
-    "点击照片查看更多"
-])))
-NEWLINE_PATTERN = re.compile(r'\n(\s*\n)+')
-
-
-def extract_metadata(content):
-    metadata = {}
-    all_authors = []
-    author_keys = ["撰稿人", "投稿人", "信息来源"]
-
-    for key in author_keys:
-        search_key = f"{key}："
-        for line in content.splitlines():
-            if line.startswith(search_key):
-                authors_text = line.replace(search_key, "").strip()
-                authors = [author.strip() for author in authors_text.split('、')]
-                all_authors.extend(authors)
-    
-    if all_authors:
-        # Remove duplicates and store
-        metadata['authors'] = sorted(list(set(all_authors)))
-        
-    return metadata
-
-def clean_content(content):
+# 清洗规则配置，可通过环境变量指定其他文件
+CLEAN_RULES_PATH = os.getenv("CLEAN_RULES_PATH",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "clean_rules.json"))
+# 清洗逻辑变化时递增，使增量清单中的旧记录失效
+STAGE_VERSION = 2
+
+
+# str.splitlines() 除 '\n' 外还会在这些字符处分行
+OTHER_LINE_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+class CleanRules:
+    """
+    clean_content 使用的删除规则，从 JSON 配置文件加载：
+        drop_lines_containing: 含有其中任一字符串的行整行删除；
+        remove_phrases: 删除的推广语等固定短语；
+        remove_chars: 删除的单个字符。
+
+    全部规则在 apply 中作用于整篇文本：先用 C 实现的子串查找判断每个短语是否出现，
+    只把出现了的短语编译进一个组合正则做一次替换（多数文章一个都没有），再删除字符，
+    最后分行一次，去掉只剩空白的行。Python 的正则引擎对多分支的组合模式要逐个位置尝试，
+    比逐个子串查找慢得多，因此不把所有规则硬塞进同一个正则。
+
+    Args:
+        drop_lines_containing (List[str]): 整行删除的标记。
+        remove_phrases (List[str]): 删除的短语，按顺序匹配。
+        remove_chars (str): 删除的字符，在短语之后删除，因此含有这些字符的短语仍能整体匹配。
+    """
+
+    def __init__(self, drop_lines_containing, remove_phrases, remove_chars):
+        self.drop_lines_containing = tuple(drop_lines_containing)
+        self.remove_phrases = tuple(remove_phrases)
+        self.remove_chars = remove_chars
+        # 出现的短语组合到编译好的正则的缓存
+        self._patterns = {}
+        # 规则的摘要，规则变化时使增量清单中的旧记录失效
+        config = json.dumps([self.drop_lines_containing, self.remove_phrases, remove_chars], ensure_ascii=False)
+        self.digest = hashlib.sha1(config.encode('utf-8')).hexdigest()[:8]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config.get("drop_lines_containing", []),
+                   config.get("remove_phrases", []),
+                   config.get("remove_chars", ""))
+
+    def _phrase_pattern(self, present):
+        pattern = self._patterns.get(present)
+        if pattern is None:
+            # 保持配置中的顺序，与包含全部短语的组合正则匹配结果相同
+            pattern = re.compile("|".join(re.escape(phrase) for phrase in present))
+            self._patterns[present] = pattern
+        return pattern
+
+    def _drop_marked_lines(self, text):
+        """删除含有标记的行（连同行尾换行符）。text 中只能以 '\n' 分行。"""
+        for marker in self.drop_lines_containing:
+            pos = text.find(marker)
+            while pos != -1:
+                start = text.rfind('\n', 0, pos) + 1
+                end = text.find('\n', pos)
+                text = text[:start] + text[end + 1:] if end != -1 else text[:start]
+                pos = text.find(marker, start)
+        return text
+
+    def apply(self, text):
+        """
+        删除标记行、短语和字符，去掉空白行并去除首尾空白。
+        结果与先 splitlines() 过滤标记行、再依次替换短语和字符、合并连续换行、最后 strip() 相同。
+        """
+        if any(char in text for char in OTHER_LINE_BREAKS):
+            text = "\n".join(text.splitlines())
+        text = self._drop_marked_lines(text)
+
+        present = tuple(phrase for phrase in self.remove_phrases if phrase in text)
+        if present:
+            text = self._phrase_pattern(present).sub("", text)
+        for char in self.remove_chars:
+            text = text.replace(char, "")
+
+        lines = [line for line in text.split("\n") if line and not line.isspace()]
+        if not lines:
+            return ""
+        lines[0] = lines[0].lstrip()
+        lines[-1] = lines[-1].rstrip()
+        return "\n".join(lines)
+
+
+DEFAULT_RULES = CleanRules.load(CLEAN_RULES_PATH)
+
+
+def clean_content(content, rules=DEFAULT_RULES):
     # Remove title (these patterns are anchored to the start of lines)
     # We run them with count=1 to only remove the first occurrence found.
-    content = TITLE_SETEXT_PATTERN.sub("", content, 1)
-    content = TITLE_H1_PATTERN.sub("", content, 1)
+    # 先用子串查找排除不可能匹配的情况，避免正则扫描全文
+    if "\n=" in content:
+        content = TITLE_SETEXT_PATTERN.sub("", content, 1)
+    if content.startswith("# ") or "\n# " in content:
+        content = TITLE_H1_PATTERN.sub("", content, 1)
 
     # Remove markdown image links efficiently if at the start of the content
     if content.startswith("![cover_image]"):
         pos = content.find('\n')
         content = content[pos+1:] if pos != -1 else ""
 
-    # Remove any line containing "阅读原文"
-    lines = content.splitlines()
-    filtered_lines = [line for line in lines if "阅读原文" not in line]
-    content = "\n".join(filtered_lines)
-
-    # Remove all occurrences of promotional sentences
-    content = PROMO_PATTERN.sub("", content)
-
-    # Remove all asterisks
-    content = content.replace('*', '')
-    content = content.replace('〓', '')
-    content = content.replace('▼', '')
-
-    # Collapse multiple newlines into one
-    content = NEWLINE_PATTERN.sub('\n', content)
-
-    # Remove any leading whitespace/blank lines that may have been left by replacements
-    content = content.lstrip()
-    content = content.rstrip()
-    
-    return content
+    # 删除"阅读原文"等标记所在的行、推广语和 *、〓、▼ 等字符，合并连续换行并去除首尾空白
+    return rules.apply(content)
 
-def process_all_files_in_directory(input_dir, processed_dir):
-    for filename in os.listdir(input_dir):
-        input_file_path = os.path.join(input_dir, filename)
-        processed_md_path = os.path.join(processed_dir, filename)
+def process_file(input_dir, filename, processed_dir, keep_record=False):
+    """
+    清洗单个文件并写出结果，返回 (文件名, 输入哈希, 输出哈希, 结构化数据)。
+    清洗后内容过短时不写输出，并删除上一次的输出，输出哈希为 None。
 
-        with open(input_file_path, 'r', encoding='utf-8') as f:
-            raw_content = f.read()
+    该函数在子进程中执行，只把哈希传回主进程；keep_record 为 True（需要写语料）时
+    才同时返回结构化数据，否则为 None，避免把原文和正文经进程间通信再传一遍。
+    """
+    with open(os.path.join(input_dir, filename), 'rb') as f:
+        data = f.read()
+    input_hash = hashlib.sha1(data).hexdigest()
+    # 与以文本模式读取相同，统一换行符
+    raw_content = data.decode('utf-8')
+    if '\r' in raw_content:
+        raw_content = raw_content.replace('\r\n', '\n').replace('\r', '\n')
 
-        metadata = extract_metadata(raw_content)
-        cleaned_content = clean_content(raw_content)
+    cleaned_content = clean_content(raw_content)
+    processed_md_path = os.path.join(processed_dir, filename)
 
-        if len(cleaned_content) < 100:
-            continue
+    if len(cleaned_content) < 100:
+        # 修改后变得过短的文章，删除上一次的输出
+        if os.path.exists(processed_md_path):
+            os.remove(processed_md_path)
+        return filename, input_hash, None, None
 
-        # Write the cleaned markdown file
-        with open(processed_md_path, 'w', encoding='utf-8') as f:
-            f.write(cleaned_content)
+    output = cleaned_content.encode('utf-8')
+    with open(processed_md_path, 'wb') as f:
+        f.write(output)
+    output_hash = hashlib.sha1(output).hexdigest()
 
+    structured_data = None
+    if keep_record:
         structured_data = {
             'file_name': filename,
             'title': filename.replace('.md', ''),
             'cleaned_content': cleaned_content,
             'raw_content': raw_content,
-            **metadata
+            **extract_metadata(raw_content)
         }
+    return filename, input_hash, output_hash, structured_data
+
+def _process_file_args(args):
+    return process_file(*args)
+
+def _copy_record(previous, writer, title):
+    """把未变化的文章从旧语料复制到新语料；压缩方式相同时直接复制原始字节。"""
+    if previous.compression == ('zstd' if writer.compress else None):
+        writer.add_raw(title, previous.get_raw(title))
+    else:
+        writer.add(previous.get(title))
+
+def process_all_files_in_directory(input_dir, processed_dir, workers=1, chunk_size=64,
+                                   corpus_dir=None, compress=False):
+    """
+    清洗 input_dir 中的所有文件并写入 processed_dir。
+
+    workers 大于 1 时使用进程池，文件按 chunk_size 分块派发给子进程，
+    子进程自己写出清洗结果并计算哈希，主进程只更新清单和语料，输出与单进程逐字节一致。
+    增量清单记录每个文件的输入哈希，只处理新增或变化的文件，并删除源文件已不存在的输出；
+    每处理完一块就原子地保存清单，中断后重新运行会跳过已完成的文件。
+
+    指定 corpus_dir 时，同时把每篇文章的结构化数据写成分片的 JSONL 语料（见 corpus.py）。
+    未变化的文章从上一次的语料中原样复制，不重新清洗。
+
+    Args:
+        input_dir: 原始文件目录。
+        processed_dir: 清洗结果的输出目录。
+        workers: 进程数，1 表示在当前进程内串行处理。
+        chunk_size: 每次派发给子进程、以及每次保存进度的文件数。
+        corpus_dir: 可选，结构化语料的输出目录。
+        compress: 是否用 zstd 压缩语料。
+    """
+    os.makedirs(processed_dir, exist_ok=True)
+    manifest = Manifest(processed_dir, "clean", f"{STAGE_VERSION}-{DEFAULT_RULES.digest}")
+    input_filenames = sorted(os.listdir(input_dir))
+    manifest.remove_stale(input_filenames)
+
+    previous = open_corpus(corpus_dir) if corpus_dir else None
+    writer = CorpusWriter(corpus_dir, compress=compress) if corpus_dir else None
+
+    def needs_processing(filename):
+        if not manifest.is_fresh(filename, os.path.join(input_dir, filename)):
+            return True
+        # 启用语料后，上一次语料中没有的文章也要重新清洗，以便取得结构化数据
+        return writer is not None and manifest.entries[filename]['output_hash'] is not None \
+            and (previous is None or filename.replace('.md', '') not in previous)
+
+    filenames = [f for f in input_filenames if needs_processing(f)]
+    tasks = [(input_dir, filename, processed_dir, writer is not None) for filename in filenames]
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        # 语料按文件名顺序写出，需要保持顺序；不写语料时哪个文件先处理完就先记录
+        imap = pool.imap if writer is not None else pool.imap_unordered
+        results = imap(_process_file_args, tasks, chunksize=chunk_size)
+    else:
+        pool = None
+        results = map(_process_file_args, tasks)
+
+    pending = set(filenames)
+    processed = 0
+    try:
+        for filename in input_filenames:
+            if filename not in pending:
+                # 未变化的文章只需复制到新语料
+                title = filename.replace('.md', '')
+                if writer is not None and previous is not None and title in previous:
+                    _copy_record(previous, writer, title)
+                continue
+
+            done, input_hash, output_hash, structured_data = next(results)
+            manifest.record_hashes(done, os.path.join(input_dir, done), input_hash, output_hash)
+            if structured_data is not None and writer is not None:
+                writer.add(structured_data)
+            processed += 1
+            if processed % chunk_size == 0:
+                manifest.save()
+        if writer is not None:
+            if previous is not None:
+                previous.close()
+                previous = None
+            writer.close()
+            writer = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if previous is not None:
+            previous.close()
+        if writer is not None:
+            writer.abort()
+        manifest.save()
 
 if __name__ == "__main__":
-    data_directory = "data"
-    processed_data_directory = "processed_data"
-    process_all_files_in_directory(data_directory, processed_data_directory)
+    parser = argparse.ArgumentParser(description="清洗公众号导出的Markdown文章。")
+    parser.add_argument("--input", default="data", help="原始文件目录")
+    parser.add_argument("--output", default="processed_data", help="清洗结果目录")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数")
+    parser.add_argument("--chunk-size", type=int, default=64, help="每块派发的文件数")
+    parser.add_argument("--corpus", default=None, help="可选，结构化语料（分片 JSONL）的输出目录")
+    parser.add_argument("--compress", action="store_true", help="用 zstd 压缩语料")
+    parser.add_argument("--pack", default=None, help="可选，把语料中的清洗正文打包成可 mmap 读取的目录，需要 --corpus")
+    args = parser.parse_args()
+    if args.pack and not args.corpus:
+        parser.error("--pack 需要同时指定 --corpus")
+    process_all_files_in_directory(args.input, args.output, args.workers, args.chunk_size,
+                                   args.corpus, args.compress)
+    if args.pack:
+        with CorpusReader(args.corpus) as reader:
+            count = pack_corpus(reader, args.pack)
+        print(f"已将 {count} 篇文章打包到 '{args.pack}'。")
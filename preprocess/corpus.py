@@ -0,0 +1,320 @@
+import io
+import json
+import mmap
+import os
+import shutil
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 只有写入或读取压缩语料时才需要
+    zstandard = None
+
+INDEX_FILE = "index.json"
+# 单个分片的大小上限（字节），超出后开始写下一个分片
+SHARD_BYTES = 64 * 1024 * 1024
+# 顺序读取时每次读入的字节数
+READ_BUFFER = 1024 * 1024
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("读写压缩语料需要安装 zstandard：pip install zstandard")
+
+
+class CorpusWriter:
+    """
+    把清洗后的文章写成分片的 JSONL 语料，每篇文章一行，同时生成按标题查找的偏移索引。
+
+    启用压缩时每条记录单独压缩为一个 zstd 帧，既可以按偏移单独解压某一篇，
+    也可以跨帧顺序解压整个分片。语料先写入临时目录，close 时再整体替换目标目录。
+
+    Args:
+        directory (str): 语料目录。
+        compress (bool): 是否用 zstd 压缩。
+        shard_bytes (int): 单个分片的大小上限。
+    """
+
+    def __init__(self, directory: str, compress: bool = False, shard_bytes: int = SHARD_BYTES):
+        if compress:
+            _require_zstd()
+        self.directory = directory
+        self.compress = compress
+        self.shard_bytes = shard_bytes
+        self.tmp_directory = directory + ".tmp"
+        if os.path.exists(self.tmp_directory):
+            shutil.rmtree(self.tmp_directory)
+        os.makedirs(self.tmp_directory)
+        self.shards: List[str] = []
+        self.records: List[Tuple[str, int, int, int]] = []
+        self._titles = set()
+        self._file = None
+        self._compressor = zstandard.ZstdCompressor() if compress else None
+
+    def _shard_file(self):
+        if self._file is None or self._file.tell() >= self.shard_bytes:
+            if self._file is not None:
+                self._file.close()
+            name = f"part-{len(self.shards):05d}.jsonl" + (".zst" if self.compress else "")
+            self.shards.append(name)
+            self._file = open(os.path.join(self.tmp_directory, name), 'wb')
+        return self._file
+
+    def add(self, record: dict):
+        """写入一篇文章，record 中必须有 title 字段。"""
+        data = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self.add_raw(record['title'], data)
+
+    def add_raw(self, title: str, data: bytes):
+        """写入一条已编码（及压缩）好的记录，用于从旧语料原样复制未变化的文章。"""
+        if title in self._titles:
+            raise ValueError(f"语料中已有标题为 '{title}' 的文章。")
+        f = self._shard_file()
+        self.records.append((title, len(self.shards) - 1, f.tell(), len(data)))
+        self._titles.add(title)
+        f.write(data)
+
+    def close(self):
+        """写入索引，并用新语料替换旧语料。"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(os.path.join(self.tmp_directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'compression': 'zstd' if self.compress else None,
+                       'shards': self.shards,
+                       'records': self.records}, f, ensure_ascii=False)
+        old_directory = self.directory + ".old"
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old_directory)
+        os.replace(self.tmp_directory, self.directory)
+        if os.path.exists(old_directory):
+            shutil.rmtree(old_directory)
+
+    def abort(self):
+        """放弃写入，保留原有语料。"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        shutil.rmtree(self.tmp_directory, ignore_errors=True)
+
+
+class CorpusReader:
+    """
+    读取 CorpusWriter 写出的语料。
+
+    打开时只加载索引；get 按标题定位到分片中的偏移，一次 seek 读出并解码该篇文章。
+    迭代时按分片顺序以大块读取，适合批量处理。
+
+    Args:
+        directory (str): 语料目录。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.compression = index['compression']
+        if self.compression:
+            _require_zstd()
+        self.shards: List[str] = index['shards']
+        self.index: Dict[str, Tuple[int, int, int]] = {
+            title: (shard, offset, length) for title, shard, offset, length in index['records']}
+        self._files = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self.index
+
+    def titles(self) -> List[str]:
+        return list(self.index)
+
+    def get_raw(self, title: str) -> bytes:
+        """返回一条记录在分片中的原始字节（压缩语料中为一个 zstd 帧）。"""
+        shard, offset, length = self.index[title]
+        f = self._files.get(shard)
+        if f is None:
+            f = open(os.path.join(self.directory, self.shards[shard]), 'rb')
+            self._files[shard] = f
+        f.seek(offset)
+        return f.read(length)
+
+    def get(self, title: str) -> dict:
+        """按标题读取一篇文章。"""
+        data = self.get_raw(title)
+        if self.compression:
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return json.loads(data)
+
+    def __iter__(self) -> Iterator[dict]:
+        """按写入顺序逐篇读取全部文章。"""
+        for name in self.shards:
+            with open(os.path.join(self.directory, name), 'rb', buffering=READ_BUFFER) as raw:
+                if self.compression:
+                    stream = io.BufferedReader(
+                        zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True),
+                        buffer_size=READ_BUFFER)
+                else:
+                    stream = raw
+                for line in stream:
+                    yield json.loads(line)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self) -> "CorpusReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_corpus(directory: str) -> Optional[CorpusReader]:
+    """语料存在时打开，否则返回 None。"""
+    if os.path.exists(os.path.join(directory, INDEX_FILE)):
+        return CorpusReader(directory)
+    return None
+
+
+BLOB_FILE = "blob.bin"
+OFFSETS_FILE = "offsets.u64"
+TITLES_FILE = "titles.json"
+# PackedCorpus.iter_lines 每次解码的最大字节数
+LINE_BLOCK = 64 * 1024
+
+
+def pack_corpus(records: Iterable[dict], directory: str, field: str = "cleaned_content") -> int:
+    """
+    把文章打包成一个 UTF-8 大文件和一张偏移表，供 PackedCorpus 通过 mmap 读取，返回文章数。
+
+    Args:
+        records: 含有 title 和 field 字段的文章，例如 CorpusReader。
+        directory (str): 打包输出目录，先写入临时目录再整体替换。
+        field (str): 打包的正文字段。
+    """
+    tmp_directory = directory + ".tmp"
+    if os.path.exists(tmp_directory):
+        shutil.rmtree(tmp_directory)
+    os.makedirs(tmp_directory)
+    offsets = array('Q', [0])
+    titles = []
+    with open(os.path.join(tmp_directory, BLOB_FILE), 'wb', buffering=READ_BUFFER) as f:
+        for record in records:
+            data = record[field].encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+            titles.append(record['title'])
+    with open(os.path.join(tmp_directory, OFFSETS_FILE), 'wb') as f:
+        offsets.tofile(f)
+    with open(os.path.join(tmp_directory, TITLES_FILE), 'w', encoding='utf-8') as f:
+        json.dump(titles, f, ensure_ascii=False)
+
+    old_directory = directory + ".old"
+    if os.path.exists(directory):
+        os.replace(directory, old_directory)
+    os.replace(tmp_directory, directory)
+    if os.path.exists(old_directory):
+        shutil.rmtree(old_directory)
+    return len(titles)
+
+
+class PackedCorpus:
+    """
+    以 mmap 方式读取 pack_corpus 打包的语料。
+
+    打开时只映射文件、读取偏移表，不读取正文；view 返回文章字节的 memoryview，不复制数据；
+    iter_lines 逐行解码，配合 MarkdownHeaderTextSplitter.iter_split 分块时，
+    任何时候只有当前小节被解码成字符串，不会把整篇文章复制到内存中。
+
+    Args:
+        directory (str): 打包语料目录。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._offsets = array('Q')
+        with open(os.path.join(directory, OFFSETS_FILE), 'rb') as f:
+            self._offsets.frombytes(f.read())
+        with open(os.path.join(directory, TITLES_FILE), 'r', encoding='utf-8') as f:
+            self.titles: List[str] = json.load(f)
+        self._file = open(os.path.join(directory, BLOB_FILE), 'rb')
+        # 空文件无法映射
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self._offsets[-1] else b''
+        self._positions = None
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def position(self, title: str) -> int:
+        """标题对应的文章序号。第一次调用时才建立标题索引。"""
+        if self._positions is None:
+            self._positions = {title: i for i, title in enumerate(self.titles)}
+        return self._positions[title]
+
+    def span(self, i: int) -> Tuple[int, int]:
+        """第 i 篇文章在大文件中的字节区间 [start, end)。"""
+        return self._offsets[i], self._offsets[i + 1]
+
+    def view(self, i: int) -> memoryview:
+        """第 i 篇文章的 UTF-8 字节，零拷贝。"""
+        start, end = self.span(i)
+        return memoryview(self._mmap)[start:end]
+
+    def text(self, i: int) -> str:
+        """解码整篇文章。"""
+        start, end = self.span(i)
+        return self._mmap[start:end].decode('utf-8')
+
+    def iter_lines(self, i: int) -> Iterator[str]:
+        """
+        逐行解码第 i 篇文章，与文件对象一样保留行尾换行符。
+        每次只解码不超过 LINE_BLOCK 字节的整行，长文章不会被整篇复制。
+        """
+        start, end = self.span(i)
+        data = self._mmap
+        while start < end:
+            stop = end
+            if stop - start > LINE_BLOCK:
+                newline = data.rfind(b'\n', start, start + LINE_BLOCK)
+                if newline == -1:
+                    # 单行超过 LINE_BLOCK，取到该行结束
+                    newline = data.find(b'\n', start + LINE_BLOCK, end)
+                stop = end if newline == -1 else newline + 1
+            lines = data[start:stop].decode('utf-8').split('\n')
+            last = lines.pop()
+            for line in lines:
+                yield line + '\n'
+            if last:
+                yield last
+            start = stop
+
+    def iter_chunks(self, splitter, metadata: Optional[dict] = None) -> Iterator:
+        """
+        依次对每篇文章分块，块的元数据中带有文章标题。
+
+        Args:
+            splitter: MarkdownHeaderTextSplitter。
+            metadata: 附加到所有块上的基础元数据。
+        """
+        for i, title in enumerate(self.titles):
+            base = dict(metadata) if metadata else {}
+            base['title'] = title
+            yield from splitter.iter_split(self.iter_lines(i), base)
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "PackedCorpus":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
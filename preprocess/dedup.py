@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 字符 shingle 的长度
+SHINGLE_SIZE = 5
+# 签名长度，即分桶数
+NUM_BINS = 128
+# LSH 的分带数，每带 NUM_BINS // BANDS 行；16 x 8 时候选阈值约为 (1/16)^(1/8) ≈ 0.71
+BANDS = 16
+# 签名估计的 Jaccard 相似度达到该值才认为是近似重复
+THRESHOLD = 0.8
+# 同一个 LSH 桶中的文章数不超过该值时两两比较，否则只比较相邻的文章
+MAX_PAIRWISE_BUCKET = 50
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_EMPTY = np.iinfo(np.uint64).max
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """splitmix64 的最终混合步骤，让多项式哈希的各个比特分布均匀。"""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    返回去掉空白后的文本中所有长度为 k 的字符 shingle 的 64 位哈希（去重、升序）。
+    比 k 短的文本整体作为一个 shingle。
+    """
+    text = WHITESPACE_PATTERN.sub('', text)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    k = min(k, len(codes))
+    n = len(codes) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for j in range(k):
+            h = h * np.uint64(1000003) + codes[j:j + n]
+        return np.unique(_mix64(h))
+
+
+def minhash_signature(hashes: np.ndarray, num_bins: int = NUM_BINS) -> np.ndarray:
+    """
+    单次哈希的 MinHash（one permutation hashing）：按哈希值的高位把 shingle 分到 num_bins 个桶，
+    每个桶取最小值作为签名的一位。只需对 shingle 哈希一次，而不是做 num_bins 次置换。
+    空桶从右侧最近的非空桶循环借值（densification），使稀疏文本的签名仍可比较。
+
+    Args:
+        hashes: shingle_hashes 的结果，必须升序。
+        num_bins: 签名长度，必须是 2 的幂。
+    """
+    signature = np.full(num_bins, _EMPTY, dtype=np.uint64)
+    if len(hashes) == 0:
+        return signature
+    shift = np.uint64(64 - (num_bins.bit_length() - 1))
+    bins = hashes >> shift
+    # hashes 升序，因此每个桶第一次出现的位置就是桶内最小值
+    first = np.flatnonzero(np.diff(bins, prepend=np.uint64(num_bins)) != 0)
+    signature[bins[first].astype(np.int64)] = hashes[first]
+    empty = signature == _EMPTY
+    if empty.any():
+        filled = np.flatnonzero(~empty)
+        nearest = filled[np.searchsorted(filled, np.arange(num_bins)) % len(filled)]
+        signature = signature[nearest]
+    return signature
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int = BANDS) -> np.ndarray:
+    """
+    LSH 分带：签名切成 bands 段，任意一段完全相同的两篇文章成为候选对。
+    返回形状为 (m, 2) 的候选对数组（i < j，已去重）。
+    """
+    n, num_bins = signatures.shape
+    rows = num_bins // bands
+    pairs = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, inverse, counts = np.unique(keys.view(np.dtype((np.void, rows * 8))).ravel(),
+                                       return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        shared = counts[inverse] > 1
+        if not shared.any():
+            continue
+        members = np.flatnonzero(shared)
+        order = np.argsort(inverse[members], kind='stable')
+        members = members[order]
+        bucket_of = inverse[members]
+        starts = np.flatnonzero(np.diff(bucket_of, prepend=-1))
+        ends = np.append(starts[1:], len(members))
+        # 相邻成员总是候选对；小桶再补上其余的两两组合
+        pairs.append(np.stack([members[:-1], members[1:]], axis=1)[bucket_of[:-1] == bucket_of[1:]])
+        for start, end in zip(starts, ends):
+            if 2 < end - start <= MAX_PAIRWISE_BUCKET:
+                bucket = members[start:end]
+                i, j = np.triu_indices(len(bucket), k=2)
+                pairs.append(np.stack([bucket[i], bucket[j]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.concatenate(pairs).astype(np.int64)
+    pairs.sort(axis=1)
+    keys = np.unique(pairs[:, 0] * n + pairs[:, 1])
+    return np.stack([keys // n, keys % n], axis=1)
+
+
+def _canonical(members: List[int], texts: List[str]) -> int:
+    """簇的代表：正文最长的一篇，长度相同时取下标最小的。"""
+    return max(members, key=lambda i: (len(texts[i]), -i))
+
+
+def _split_by_canonical(members: List[int], texts: List[str], signatures: np.ndarray, threshold: float,
+                        similarities: Dict[Tuple[int, int], float]) -> List[List[int]]:
+    """
+    把并查集得到的连通分量拆成簇，使簇内每篇文章与代表的估计相似度都达到阈值。
+
+    并查集的连通关系是传递的：A≈B、B≈C 时 A 与 C 可能相差很远。这里取剩余文章中最长的一篇作为代表，
+    与它的估计相似度达到阈值的文章归入它的簇，其余文章继续按同样的方法分组。
+    """
+    clusters = []
+    remaining = sorted(members)
+    while len(remaining) > 1:
+        canonical = _canonical(remaining, texts)
+        others = [i for i in remaining if i != canonical]
+        estimates = (signatures[others] == signatures[canonical]).mean(axis=1).tolist()
+        duplicates = []
+        rest = []
+        for i, estimate in zip(others, estimates):
+            if estimate >= threshold:
+                similarities[(min(i, canonical), max(i, canonical))] = estimate
+                duplicates.append(i)
+            else:
+                rest.append(i)
+        if duplicates:
+            clusters.append(sorted(duplicates + [canonical]))
+        remaining = rest
+    return clusters
+
+
+def find_duplicates(texts: List[str], threshold: float = THRESHOLD,
+                    bands: int = BANDS) -> Tuple[List[List[int]], Dict[Tuple[int, int], float]]:
+    """
+    在一组文本中查找近似重复。
+
+    去掉空白后为空的文本没有 shingle，签名全部相同，不参与比较。
+    簇内每篇文章与代表（正文最长的一篇）的估计相似度都达到阈值，见 _split_by_canonical。
+
+    Args:
+        texts: 文章正文。
+        threshold: 签名估计的 Jaccard 相似度阈值。
+        bands: LSH 分带数，必须整除 NUM_BINS。
+
+    Returns:
+        (clusters, similarities)：clusters 是含两篇及以上文章的簇（文章下标升序），
+        similarities 是通过校验的候选对以及簇内文章与代表 (i, j) 的估计相似度。
+    """
+    shingles = [shingle_hashes(text) for text in texts]
+    indices = np.array([i for i, hashes in enumerate(shingles) if len(hashes)], dtype=np.int64)
+    signatures = np.stack([minhash_signature(shingles[i]) for i in indices]) \
+        if len(indices) else np.zeros((0, NUM_BINS), dtype=np.uint64)
+    pairs = indices[candidate_pairs(signatures, bands)]
+    # 签名按原文的下标存放，空文本的一行不会被用到
+    full = np.zeros((len(texts), NUM_BINS), dtype=np.uint64)
+    full[indices] = signatures
+    signatures = full
+    similarities = {}
+    union_find = UnionFind(len(texts))
+    for start in range(0, len(pairs), 65536):
+        block = pairs[start:start + 65536]
+        estimates = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1)
+        for (i, j), estimate in zip(block[estimates >= threshold].tolist(), estimates[estimates >= threshold].tolist()):
+            similarities[(i, j)] = estimate
+            union_find.union(i, j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(union_find.find(i), []).append(i)
+    clusters = []
+    for members in groups.values():
+        if len(members) > 1:
+            clusters.extend(_split_by_canonical(members, texts, signatures, threshold, similarities))
+    clusters.sort()
+    return clusters, similarities
+
+
+def build_report(names: List[str], texts: List[str], clusters: List[List[int]],
+                 similarities: Dict[Tuple[int, int], float], threshold: float) -> dict:
+    """生成聚类报告：每个簇保留正文最长的一篇作为代表，其余列为重复。"""
+    report_clusters = []
+    for members in clusters:
+        canonical = _canonical(members, texts)
+        duplicates = []
+        for i in members:
+            if i == canonical:
+                continue
+            pair = (min(i, canonical), max(i, canonical))
+            duplicates.append({'file_name': names[i], 'similarity': similarities.get(pair)})
+        report_clusters.append({'canonical': names[canonical], 'duplicates': duplicates})
+    report_clusters.sort(key=lambda cluster: cluster['canonical'])
+    return {
+        'threshold': threshold,
+        'num_documents': len(names),
+        'num_clusters': len(report_clusters),
+        'num_duplicates': sum(len(cluster['duplicates']) for cluster in report_clusters),
+        'clusters': report_clusters,
+    }
+
+
+def dedup_directory(input_dir: str, report_path: str, output_dir: Optional[str] = None,
+                    threshold: float = THRESHOLD, bands: int = BANDS) -> Optional[dict]:
+    """
+    检测 input_dir（clean.py 的输出目录）中的近似重复文章，写出聚类报告。
+
+    Args:
+        input_dir (str): 清洗后的Markdown文件所在目录。
+        report_path (str): 聚类报告（JSON）的输出路径。
+        output_dir (str): 可选，把每个簇的代表文章和不重复的文章复制到该目录。
+        threshold (float): 估计的 Jaccard 相似度阈值。
+        bands (int): LSH 分带数。
+    """
+    if not os.path.isdir(input_dir):
+        print(f"错误: 输入目录 '{input_dir}' 不存在。", file=sys.stderr)
+        return None
+
+    names = sorted(f for f in os.listdir(input_dir) if f.endswith('.md'))
+    texts = []
+    for filename in names:
+        with open(os.path.join(input_dir, filename), 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+
+    clusters, similarities = find_duplicates(texts, threshold, bands)
+    report = build_report(names, texts, clusters, similarities, threshold)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"共 {len(names)} 篇文章，发现 {report['num_clusters']} 组近似重复，"
+          f"可去除 {report['num_duplicates']} 篇。报告已写入 '{report_path}'。")
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        removed = {d['file_name'] for cluster in report['clusters'] for d in cluster['duplicates']}
+        for filename in names:
+            if filename not in removed:
+                shutil.copyfile(os.path.join(input_dir, filename), os.path.join(output_dir, filename))
+        print(f"已将 {len(names) - len(removed)} 篇文章复制到 '{output_dir}'。")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用 MinHash/LSH 检测近似重复的文章。")
+    parser.add_argument("--input", default="processed_data", help="清洗结果目录")
+    parser.add_argument("--report", default="dedup_report.json", help="聚类报告路径")
+    parser.add_argument("--output", default=None, help="可选，去重后的文章目录")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Jaccard 相似度阈值")
+    parser.add_argument("--bands", type=int, default=BANDS, help="LSH 分带数")
+    args = parser.parse_args()
+
+    dedup_directory(args.input, args.report, args.output, args.threshold, args.bands)
@@ -1,8 +1,23 @@
+import asyncio
+import difflib
 import os
+import random
+import re
 import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import openai
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from manifest import Manifest
+from response_cache import ResponseCache, make_cache_key
+
+# 分段模式按标题切分文章，复用 split/mdsplit.py 中的切分器
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "split"))
+from mdsplit import MarkdownHeaderTextSplitter
+
 # --- 系统指令 (Prompt) ---
 SYSTEM_PROMPT = """
 你是一位专业的文章结构分析师和Markdown格式化专家。你的任务是接收一篇已经经过初步处理的Markdown文章，并对其进行最终的结构优化和内容清理。
@@ -22,53 +37,363 @@ SYSTEM_PROMPT = """
 4.  **纯净输出**：你的回答必须是且仅是优化后的Markdown全文，不要包含任何额外的解释、评论或前言。
 """
 
+# 分段模式下，发送给模型的是长文章按标题切出的一个片段
+SECTION_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+5.  **片段处理**：你收到的是一篇长文章按标题切出的一个连续片段，它会和前后的片段按顺序拼接回全文。
+    *   只处理这个片段本身，不要补充主标题、引言、过渡语或总结。
+"""
+
+# 输出未通过内容校验、重新请求时附加在指令末尾的提醒
+RETRY_NOTE = """
+注意：上一次的输出改动、删减了原文文字，或添加了原文没有的内容。除调整标题和删除网页残留指令外，其余文字必须逐字保留。
+"""
+
+MODEL_NAME = "glm-4"
+TEMPERATURE = 0.1 # 使用更低的温度，让模型严格遵循指令
+
+# 响应缓存：相同的指令、模型、温度和输入文本只会请求一次
+CACHE_PATH = os.getenv("FORMAT_CACHE_PATH", "llm_cache.sqlite")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# 指令或处理逻辑变化时递增，使增量清单中的旧记录失效
+STAGE_VERSION = 1
+
+# --- 分段模式配置 ---
+SECTION_MIN_CHARS = 3000     # 不超过该字数的文章整篇请求，不切分
+SECTION_TARGET_CHARS = 2000  # 相邻小节合并到不超过该字数再请求，减少请求数
+SECTION_MAX_ATTEMPTS = 3     # 每个片段最多请求的次数（含首次），都未通过校验时保留原文
+MIN_PRESERVED_RATIO = 0.95   # 输出至少要保留原文这一比例的文字
+MAX_ADDED_RATIO = 0.02       # 输出中原文没有的文字（不含标题）不能超过这一比例
+ALIGN_MAX_CELLS = 4_000_000  # 对不上的句子逐字对齐时两段文字长度之积的上限，超出时视为对不上
+
+# --- 并发与限流配置 ---
+MAX_CONCURRENCY = 8          # 同时在途的请求数上限
+REQUESTS_PER_SECOND = 2.0    # 每个 API Key 的平均请求速率
+MAX_RETRIES = 5              # 遇到 429/5xx 时的最大重试次数
+BASE_RETRY_DELAY = 1.0       # 指数退避的初始等待秒数
+MAX_RETRY_DELAY = 60.0       # 单次退避等待的上限
+
+# 多个 API Key 可用逗号分隔，异步模式下会轮流分配请求
+API_KEYS = [k.strip() for k in os.getenv("ZHIPUAI_API_KEY", "").split(",") if k.strip()]
+# 可指向本地的 OpenAI 兼容服务，用于离线测试吞吐量
+API_BASE = os.getenv("ZHIPUAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
+
 # --- LLM 初始化 ---
-llm = ChatOpenAI(
-    temperature=0.1, # 使用更低的温度，让模型严格遵循指令
-    model="glm-4",
-    openai_api_key=os.getenv("ZHIPUAI_API_KEY"),
-    openai_api_base="https://open.bigmodel.cn/api/paas/v4/"
-)
+def create_llm(api_key: Optional[str]) -> ChatOpenAI:
+    """
+    为指定的 API Key 创建模型客户端。
+    重试由本模块统一控制，因此关闭客户端自带的重试。
+    """
+    return ChatOpenAI(
+        temperature=TEMPERATURE,
+        model=MODEL_NAME,
+        openai_api_key=api_key,
+        openai_api_base=API_BASE,
+        max_retries=0,
+    )
+
+llm = create_llm(API_KEYS[0] if API_KEYS else None)
+
+def build_chain(model: ChatOpenAI, system_prompt: str = SYSTEM_PROMPT):
+    """
+    组装系统指令与模型，得到可调用的处理链。
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", "{text_input}")
+    ])
+    return prompt | model
+
+def build_chains(model: ChatOpenAI) -> Dict[str, object]:
+    """
+    为整篇、片段以及它们重新请求时使用的各个系统指令分别组装处理链，以系统指令为键。
+    """
+    prompts = [SYSTEM_PROMPT, SECTION_SYSTEM_PROMPT]
+    return {prompt: build_chain(model, prompt) for prompt in prompts + [p + RETRY_NOTE for p in prompts]}
+
+class TokenBucket:
+    """
+    令牌桶限流器：按固定速率补充令牌，每次请求消耗一个令牌。
+
+    Args:
+        rate (float): 每秒补充的令牌数。
+        capacity (float): 桶容量，即允许的瞬时突发请求数。
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def cache_key_for(content: str, system_prompt: str = SYSTEM_PROMPT) -> str:
+    return make_cache_key(system_prompt, MODEL_NAME, TEMPERATURE, content)
+
+def split_sections(content: str, target_chars: Optional[int] = None) -> List[str]:
+    """
+    按标题把文章切成若干个连续片段，所有片段按顺序拼接后与原文完全相同。
+    超长的小节按段落继续切分；相邻的小片段合并，使每个片段不超过 target_chars 字
+    （单个段落本身超长时除外）。不超过 SECTION_MIN_CHARS 字的文章不切分。
+    """
+    target_chars = target_chars or SECTION_TARGET_CHARS
+    if len(content) <= SECTION_MIN_CHARS:
+        return [content]
+    splitter = MarkdownHeaderTextSplitter(chunk_size=target_chars)
+    # 只在行首切开，超长单行被切分器硬切出的位置不作为片段边界
+    boundaries = [start for start, _ in (chunk.span for chunk in splitter.iter_split(content))
+                  if 0 < start and content[start - 1] == "\n"]
+    sections = []
+    section_start = 0
+    for start, end in zip(boundaries, boundaries[1:] + [len(content)]):
+        if start > section_start and end - section_start > target_chars:
+            sections.append(content[section_start:start])
+            section_start = start
+    sections.append(content[section_start:])
+    return sections
+
+def join_sections(sections: List[str]) -> str:
+    """
+    把各片段的格式化结果按顺序拼接，片段之间空一行。
+    """
+    return "\n\n".join(section.strip("\n") for section in sections if section.strip()) + "\n"
+
+# 校验内容时忽略的标题行和只有粗体文字的行：模型可以调整、新增标题
+TITLE_LINE_PATTERN = re.compile(r"^[ \t]*(?:#{1,6}(?:[ \t].*)?|\*\*[^*\n]+\*\*[ \t]*)$", re.MULTILINE)
+# 校验内容时忽略的空白和 Markdown 标记
+MARKUP_PATTERN = re.compile(r"[\s#*>`_|~\-]+")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？；!?;])")
+
+def _content_units(text: str) -> List[str]:
+    """
+    去掉标题行、空白和 Markdown 标记后按句末标点切成句子，模型拆分段落、调整标题不会改变这些句子。
+    """
+    text = MARKUP_PATTERN.sub("", TITLE_LINE_PATTERN.sub("", text))
+    return [unit for unit in SENTENCE_END_PATTERN.split(text) if unit]
+
+def content_preservation(original: str, formatted: str) -> Tuple[float, float]:
+    """
+    比较格式化前后的文字内容，返回 (保留比例, 新增比例)：原文中在输出里按顺序对得上的文字占原文的比例，
+    以及输出中原文没有的文字占输出的比例。忽略标题行、空白和 Markdown 标记。
 
-def clean_markdown_file(file_path: str, llm_chain) -> str:
+    先以句子为单位做序列对齐，只对对不上的句子区间再逐字对齐，因此长文章也很快。
+    逐字对齐的规模超过 ALIGN_MAX_CELLS 的区间按对不上计算，宁可多重试也不放过大段改写。
+    """
+    a = _content_units(original)
+    b = _content_units(formatted)
+    matched = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            matched += sum(len(unit) for unit in a[i1:i2])
+        elif tag == "replace":
+            # 句子数相同时多半是逐句改了几个字，逐句对齐；否则把整个区间逐字对齐
+            pairs = zip(a[i1:i2], b[j1:j2]) if i2 - i1 == j2 - j1 else \
+                [("".join(a[i1:i2]), "".join(b[j1:j2]))]
+            for left, right in pairs:
+                if len(left) * len(right) <= ALIGN_MAX_CELLS:
+                    blocks = difflib.SequenceMatcher(None, left, right, autojunk=False).get_matching_blocks()
+                    matched += sum(block.size for block in blocks)
+    total_a = sum(len(unit) for unit in a)
+    total_b = sum(len(unit) for unit in b)
+    preserved = matched / total_a if total_a else 1.0
+    added = (total_b - matched) / total_b if total_b else 0.0
+    return preserved, added
+
+def validate_section(original: str, formatted: str) -> bool:
+    """
+    检查格式化结果是否保留了原文内容：没有明显删减，也没有添加评论等原文没有的文字。
+    """
+    preserved, added = content_preservation(original, formatted)
+    return preserved >= MIN_PRESERVED_RATIO and added <= MAX_ADDED_RATIO
+
+def clean_markdown_file(file_path: str, llm_chain, cache: Optional[ResponseCache] = None) -> str:
     """
     使用大语言模型清理并结构化单个Markdown文件。
+    传入 cache 时，先按内容哈希查找缓存，命中则不再请求模型。
     """
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
+    key = cache_key_for(content)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     response = llm_chain.invoke({"text_input": content})
+    if cache is not None:
+        cache.put(key, response.content)
     return response.content
 
-def process_directory(input_dir: str, output_dir: str):
+def is_retryable_error(error: Exception) -> bool:
     """
-    处理指定目录下的所有Markdown文件，并保存到输出目录。
-    会跳过输出目录中已存在的同名文件。
+    判断请求错误是否值得重试：限流(429)、服务端错误(5xx)以及网络超时/连接失败。
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or 500 <= status_code < 600
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+async def ainvoke_with_retry(llm_chain, bucket: TokenBucket, content: str,
+                             max_retries: int = MAX_RETRIES) -> str:
+    """
+    在限流器的约束下异步调用模型，遇到可重试错误时按指数退避（带随机抖动）重试。
+    """
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        try:
+            response = await llm_chain.ainvoke({"text_input": content})
+            return response.content
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, BASE_RETRY_DELAY))
+
+async def aclean_markdown_file(file_path: str, llm_chain, bucket: TokenBucket,
+                               cache: Optional[ResponseCache] = None,
+                               in_flight: Optional[dict] = None) -> str:
+    """
+    异步版本的 clean_markdown_file，带限流与重试。
+    in_flight 记录正在请求中的缓存键，内容相同的文件会等待同一个请求的结果。
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    key = cache_key_for(content)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    result = await _request_once(key, in_flight if in_flight is not None else {},
+                                 lambda: ainvoke_with_retry(llm_chain, bucket, content))
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+async def _request_once(key: str, in_flight: dict, request) -> str:
+    """
+    同一缓存键同时只发出一个请求，其余调用者等待它的结果。
+    """
+    if key in in_flight:
+        return await asyncio.shield(in_flight[key])
+    task = asyncio.ensure_future(request())
+    in_flight[key] = task
+    try:
+        return await task
+    finally:
+        del in_flight[key]
+
+async def aformat_section(section: str, chains: Dict[str, object], bucket: TokenBucket,
+                          semaphore: asyncio.Semaphore, cache: Optional[ResponseCache], in_flight: dict,
+                          stats: Dict[str, int], whole: bool = False) -> str:
+    """
+    格式化一个片段并校验内容，未通过时在指令末尾附上提醒重新请求，最多请求 SECTION_MAX_ATTEMPTS 次，
+    都未通过则保留原文。只有通过校验的结果写入响应缓存。
+
+    Args:
+        section (str): 片段原文。
+        chains (Dict[str, object]): build_chains 得到的处理链。
+        semaphore (asyncio.Semaphore): 限制同时在途的请求数。
+        stats (Dict[str, int]): 累加请求数、重新请求数和字数等统计。
+        whole (bool): 片段是否为整篇文章，是则使用整篇文章的系统指令。
+    """
+    prompt = SYSTEM_PROMPT if whole else SECTION_SYSTEM_PROMPT
+    for attempt in range(SECTION_MAX_ATTEMPTS):
+        system_prompt = prompt if attempt == 0 else prompt + RETRY_NOTE
+        key = cache_key_for(section, system_prompt)
+        result = cache.get(key) if cache is not None else None
+        if result is None:
+            async with semaphore:
+                result = await _request_once(key, in_flight,
+                                             lambda: ainvoke_with_retry(chains[system_prompt], bucket, section))
+            stats["requests"] += 1
+            stats["requested_chars"] += len(section)
+            if attempt:
+                stats["retries"] += 1
+                stats["retried_chars"] += len(section)
+            if validate_section(section, result):
+                if cache is not None:
+                    cache.put(key, result)
+                return result
+        elif validate_section(section, result):
+            return result
+    stats["fallbacks"] += 1
+    return section
+
+async def aformat_article_sections(content: str, workers: List[Tuple[Dict[str, object], TokenBucket]],
+                                   semaphore: asyncio.Semaphore, cache: Optional[ResponseCache],
+                                   in_flight: dict, stats: Dict[str, int], offset: int = 0) -> str:
+    """
+    分段模式：按标题切分文章，各片段并发请求模型、分别校验，再按顺序拼接。
+    只有未通过校验的片段会重新请求。片段轮流分配给各个 API Key，从第 offset 个开始。
+    """
+    sections = split_sections(content)
+    whole = len(sections) == 1
+    stats["sections"] += len(sections)
+    results = await asyncio.gather(*(
+        aformat_section(section, *workers[(offset + i) % len(workers)], semaphore, cache, in_flight, stats, whole)
+        for i, section in enumerate(sections)))
+    return results[0] if whole else join_sections(results)
+
+def list_files_to_process(input_dir: str, output_dir: str, manifest: Manifest) -> Optional[List[str]]:
+    """
+    根据增量清单列出需要处理的Markdown文件：新增的、或内容自上次处理后变化的文件。
+    源文件已删除的输出会被移除。输入目录不存在时返回 None。
     """
     if not os.path.isdir(input_dir):
         print(f"错误: 输入目录 '{input_dir}' 不存在。", file=sys.stderr)
-        return
+        return None
 
     os.makedirs(output_dir, exist_ok=True)
     print(f"源目录:      {input_dir}")
     print(f"目标目录:  {output_dir}")
 
-    files_in_input = {f for f in os.listdir(input_dir) if f.endswith('.md')}
-    files_in_output = {f for f in os.listdir(output_dir) if f.endswith('.md')}
-    
-    files_to_process = sorted(list(files_in_input - files_in_output))
-    
+    files_in_input = sorted(f for f in os.listdir(input_dir) if f.endswith('.md'))
+    for filename in manifest.remove_stale(files_in_input):
+        print(f"源文件 '{filename}' 已删除，移除对应输出。")
+
+    files_to_process = []
+    for filename in files_in_input:
+        input_path = os.path.join(input_dir, filename)
+        output_path = os.path.join(output_dir, filename)
+        if filename not in manifest.entries and os.path.exists(output_path):
+            # 引入清单之前生成的输出没有记录，视为已处理，避免重新请求模型
+            with open(output_path, 'r', encoding='utf-8') as f:
+                manifest.record(filename, input_path, f.read())
+            continue
+        if not manifest.is_fresh(filename, input_path):
+            files_to_process.append(filename)
+    manifest.save()
+
+    if files_to_process:
+        print(f"共找到 {len(files_in_input)} 个文件，其中 {len(files_to_process)} 个是新增或变化的文件，准备处理。")
+    return files_to_process
+
+def process_directory(input_dir: str, output_dir: str):
+    """
+    处理指定目录下的所有Markdown文件，并保存到输出目录。
+    只处理新增或内容变化的文件。
+    """
+    manifest = Manifest(output_dir, "format", STAGE_VERSION)
+    files_to_process = list_files_to_process(input_dir, output_dir, manifest)
+    if files_to_process is None:
+        return
     if not files_to_process:
         print("所有文件均已处理，无需操作。")
         return
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        ("user", "{text_input}")
-    ])
-    chain = prompt | llm
+
+    chain = build_chain(llm)
+    cache = ResponseCache(CACHE_PATH, CACHE_MAX_BYTES)
 
     total_to_process = len(files_to_process)
-    print(f"共找到 {len(files_in_input)} 个文件，其中 {total_to_process} 个是新文件，准备处理。")
 
     for i, filename in enumerate(files_to_process):
         input_path = os.path.join(input_dir, filename)
@@ -77,20 +402,113 @@ def process_directory(input_dir: str, output_dir: str):
         print(f"[{i+1}/{total_to_process}] 正在清理: {filename} ...")
         
         try:
-            cleaned_content = clean_markdown_file(input_path, chain)
+            cleaned_content = clean_markdown_file(input_path, chain, cache)
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(cleaned_content)
+            manifest.record(filename, input_path, cleaned_content)
             print(f"  -> 已保存至: {output_path}")
         except Exception as e:
             print(f"  -> 处理文件 '{filename}' 时出错: {e}", file=sys.stderr)
 
+    manifest.save()
+    print(cache.report())
+    cache.close()
+
+async def aprocess_directory(input_dir: str, output_dir: str,
+                             max_concurrency: int = MAX_CONCURRENCY,
+                             requests_per_second: float = REQUESTS_PER_SECOND,
+                             api_keys: Optional[List[str]] = None,
+                             sections: bool = False):
+    """
+    process_directory 的并发版本：多个文件同时请求模型，
+    每个 API Key 各自使用一个令牌桶限流，遇到 429/5xx 时指数退避重试。
+    同样只处理新增或内容变化的文件。
+
+    分段模式下，长文章按标题切成片段并发请求，每个片段的结果都经过内容校验，
+    只重新请求未通过的片段，见 aformat_article_sections。
+
+    Args:
+        input_dir (str): 输入目录的路径。
+        output_dir (str): 输出目录的路径。
+        max_concurrency (int): 同时在途的请求数上限。
+        requests_per_second (float): 每个 API Key 的请求速率上限。
+        api_keys (List[str]): 使用的 API Key 列表，默认读取环境变量。
+        sections (bool): 是否使用分段模式。
+    """
+    manifest = Manifest(output_dir, "format", STAGE_VERSION)
+    files_to_process = list_files_to_process(input_dir, output_dir, manifest)
+    if files_to_process is None:
+        return
+    if not files_to_process:
+        print("所有文件均已处理，无需操作。")
+        return
+
+    keys = api_keys or API_KEYS
+    if not keys:
+        raise ValueError("没有可用的 API Key：请传入 api_keys 或设置环境变量 ZHIPUAI_API_KEY。")
+    # 每个 Key 一组处理链和一个令牌桶
+    workers = [(build_chains(create_llm(key)), TokenBucket(requests_per_second)) for key in keys]
+    cache = ResponseCache(CACHE_PATH, CACHE_MAX_BYTES)
+    in_flight = {}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # 分段模式下 semaphore 限制的是片段请求，另用一个信号量限制同时读入内存的文件数
+    file_slots = asyncio.Semaphore(max_concurrency)
+    stats = dict.fromkeys(("sections", "requests", "requested_chars", "retries", "retried_chars", "fallbacks"), 0)
+    total_to_process = len(files_to_process)
+    done = 0
+    failed = 0
+    start = time.monotonic()
+
+    async def handle(i: int, filename: str):
+        nonlocal done, failed
+        input_path = os.path.join(input_dir, filename)
+        output_path = os.path.join(output_dir, filename)
+        chains, bucket = workers[i % len(workers)]
+        async with (file_slots if sections else semaphore):
+            try:
+                if sections:
+                    with open(input_path, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                    cleaned_content = await aformat_article_sections(content, workers, semaphore, cache,
+                                                                     in_flight, stats, offset=i)
+                else:
+                    cleaned_content = await aclean_markdown_file(input_path, chains[SYSTEM_PROMPT], bucket,
+                                                                 cache, in_flight)
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(cleaned_content)
+                manifest.record(filename, input_path, cleaned_content)
+                done += 1
+                print(f"[{done}/{total_to_process}] 已保存至: {output_path}")
+            except Exception as e:
+                failed += 1
+                print(f"  -> 处理文件 '{filename}' 时出错: {e}", file=sys.stderr)
+
+    # 中途被中断（如 Ctrl-C）时也保存清单，已处理的文件下次不必重新请求
+    try:
+        await asyncio.gather(*(handle(i, f) for i, f in enumerate(files_to_process)))
+    finally:
+        manifest.save()
+        elapsed = time.monotonic() - start
+        print(f"完成 {done} 个，失败 {failed} 个，耗时 {elapsed:.1f} 秒"
+              f"（{done / elapsed if elapsed else 0:.2f} 篇/秒）。")
+        if sections:
+            print(f"共 {stats['sections']} 个片段，请求 {stats['requests']} 次（{stats['requested_chars']} 字），"
+                  f"其中未通过校验而重新请求 {stats['retries']} 次（{stats['retried_chars']} 字），"
+                  f"{stats['fallbacks']} 个片段保留原文。")
+        print(cache.report())
+        cache.close()
+
 if __name__ == '__main__':
-    if not os.getenv("ZHIPUAI_API_KEY"):
+    if not API_KEYS:
         print("错误：环境变量 ZHIPUAI_API_KEY 未设置。请先设置API Key。", file=sys.stderr)
     else:
         source_directory = "final_data"
         destination_directory = "untra_final_data"
         
         print("开始对所有文件进行最终的清理和结构优化...")
-        process_directory(source_directory, destination_directory)
+        if "--sync" in sys.argv:
+            process_directory(source_directory, destination_directory)
+        else:
+            asyncio.run(aprocess_directory(source_directory, destination_directory,
+                                           sections="--sections" in sys.argv))
         print("\n所有文件处理完毕。")
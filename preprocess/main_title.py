@@ -1,10 +1,31 @@
 import os
 import sys
 
+from manifest import Manifest
+
+# 处理逻辑变化时递增，使增量清单中的旧记录失效
+STAGE_VERSION = 1
+
+def has_main_title(content: str) -> bool:
+    return content.strip().startswith("# ")
+
+def add_main_title(content: str, title: str) -> str:
+    """
+    在内容前添加H1标题；内容已有H1标题时原样返回。
+
+    Args:
+        content (str): Markdown 正文。
+        title (str): 标题文本。
+    """
+    if has_main_title(content):
+        return content
+    # 格式化H1标题行
+    return f"# {title}\n\n" + content
+
 def process_and_save_files(input_dir: str, output_dir: str):
     """
     遍历输入目录中的.md文件，添加H1标题，并保存到输出目录。
-    原始文件不会被修改。
+    原始文件不会被修改。只处理新增或内容变化的文件，并删除源文件已不存在的输出。
 
     Args:
         input_dir (str): 包含原始markdown文件的目录。
@@ -12,46 +33,50 @@ def process_and_save_files(input_dir: str, output_dir: str):
     """
     # 检查输入目录是否存在
     if not os.path.isdir(input_dir):
-        print(f"错误: 输入目录 '{input_input_dir}' 不存在。", file=sys.stderr)
+        print(f"错误: 输入目录 '{input_dir}' 不存在。", file=sys.stderr)
         return
 
     # 创建输出目录（如果不存在）
     os.makedirs(output_dir, exist_ok=True)
     print(f"输出目录 '{output_dir}' 已准备就绪。")
 
+    manifest = Manifest(output_dir, "main_title", STAGE_VERSION)
+    md_files = [f for f in os.listdir(input_dir) if f.endswith(".md")]
+    for filename in manifest.remove_stale(md_files):
+        print(f"源文件 '{filename}' 已删除，移除对应输出。")
+
     # 遍历输入目录中的所有文件
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".md"):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            
-            # 从文件名中提取标题 (去掉.md后缀)
-            title = os.path.splitext(filename)[0]
+    for filename in md_files:
+        input_path = os.path.join(input_dir, filename)
+        output_path = os.path.join(output_dir, filename)
+
+        if manifest.is_fresh(filename, input_path):
+            continue
+        
+        # 从文件名中提取标题 (去掉.md后缀)
+        title = os.path.splitext(filename)[0]
+        
+        try:
+            # 读取原始文件内容
+            with open(input_path, 'r', encoding='utf-8') as f_in:
+                content = f_in.read()
             
-            # 格式化H1标题行
-            title_line = f"# {title}\n\n"
+            # 检查原始文件是否已有标题，避免重复添加
+            if has_main_title(content):
+                print(f"文件 '{filename}' 在源目录中已有标题，直接拷贝。")
+            new_content = add_main_title(content, title)
             
-            try:
-                # 读取原始文件内容
-                with open(input_path, 'r', encoding='utf-8') as f_in:
-                    content = f_in.read()
-                
-                # 准备新内容
-                # 检查原始文件是否已有标题，避免重复添加
-                if content.strip().startswith("# "):
-                    print(f"文件 '{filename}' 在源目录中已有标题，直接拷贝。")
-                    new_content = content
-                else:
-                    new_content = title_line + content
-                
-                # 写入新文件
-                with open(output_path, 'w', encoding='utf-8') as f_out:
-                    f_out.write(new_content)
+            # 写入新文件
+            with open(output_path, 'w', encoding='utf-8') as f_out:
+                f_out.write(new_content)
+            manifest.record(filename, input_path, new_content)
+
+            print(f"已处理文件 '{filename}' 并保存到 '{output_dir}'。")
 
-                print(f"已处理文件 '{filename}' 并保存到 '{output_dir}'。")
+        except Exception as e:
+            print(f"处理文件 '{filename}' 时出错: {e}", file=sys.stderr)
 
-            except Exception as e:
-                print(f"处理文件 '{filename}' 时出错: {e}", file=sys.stderr)
+    manifest.save()
 
 if __name__ == '__main__':
     source_directory = "format_data"
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+from typing import Iterable, List, Optional, Union
+
+# 清单文件名，保存在各阶段的输出目录中
+MANIFEST_FILE = ".manifest.json"
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class Manifest:
+    """
+    预处理各阶段共用的增量构建清单，记录每个文件的
+    输入哈希、阶段版本和输出哈希，只重新处理新增或变化的文件。
+
+    为了避免每次都读取全部输入，清单同时记录输入文件的大小和修改时间，
+    两者未变时直接认为内容未变。
+
+    Args:
+        output_dir (str): 阶段的输出目录，清单保存在其中。
+        stage (str): 阶段名称。
+        version (Union[str, int]): 阶段版本，可以是任意能写入 JSON 的值，通常为整数或字符串
+            （如 clean.py 把版本号和清洗规则的摘要拼成字符串）。处理逻辑变化时更新，会使所有记录失效。
+    """
+
+    def __init__(self, output_dir: str, stage: str, version: Union[str, int]):
+        self.output_dir = output_dir
+        self.stage = stage
+        self.version = version
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('stage') == stage:
+                self.entries = data['files']
+
+    def is_fresh(self, filename: str, input_path: str) -> bool:
+        """
+        判断文件是否无需重新处理：输入内容和阶段版本与记录一致，且输出仍然存在。
+        """
+        entry = self.entries.get(filename)
+        if entry is None or entry['stage_version'] != self.version:
+            return False
+        if entry['output_hash'] is not None and not os.path.exists(os.path.join(self.output_dir, filename)):
+            return False
+        stat = os.stat(input_path)
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+        if hash_file(input_path) != entry['input_hash']:
+            return False
+        # 内容未变，只是被重新写过，更新记录的文件状态
+        entry['size'] = stat.st_size
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def record(self, filename: str, input_path: str, output_text: Optional[str]):
+        """
+        记录一次处理结果。output_text 为 None 表示该文件没有输出（例如被过滤掉）。
+        """
+        self.record_hashes(filename, input_path, hash_file(input_path),
+                           hash_text(output_text) if output_text is not None else None)
+
+    def record_hashes(self, filename: str, input_path: str, input_hash: str, output_hash: Optional[str]):
+        """
+        与 record 相同，但使用已经算好的哈希，供在子进程中读写文件的阶段使用，避免主进程再读一遍输入。
+        """
+        stat = os.stat(input_path)
+        self.entries[filename] = {
+            'input_hash': input_hash,
+            'stage_version': self.version,
+            'output_hash': output_hash,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+
+    def remove_stale(self, input_filenames: Iterable[str]) -> List[str]:
+        """
+        删除源文件已不存在的记录及其输出文件，返回被删除的文件名。
+        """
+        existing = set(input_filenames)
+        removed = []
+        for filename in list(self.entries):
+            if filename in existing:
+                continue
+            output_path = os.path.join(self.output_dir, filename)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            del self.entries[filename]
+            removed.append(filename)
+        return removed
+
+    def save(self):
+        """原子地写入清单：先写临时文件，再整体替换，避免崩溃时留下半截文件。"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'stage': self.stage, 'files': self.entries}, ensure_ascii=False))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,92 @@
+import re
+from typing import Dict, List
+
+# 作者、来源等信息的关键词及对应的结构化字段名，较长的关键词排在前面，使正则优先匹配
+FIELD_NAMES = {
+    '资料来源': 'source', '信息来源': 'source', '来源': 'source',
+    '撰稿人': 'writer', '撰稿': 'writer',
+    '作者': 'author',
+    '编辑': 'editor',
+    '摄影': 'photographer',
+    '校对': 'proofreader',
+    '投稿人': 'contributor',
+}
+KEYWORDS = tuple(FIELD_NAMES)
+# 发布日期的关键词，解析为 YYYY-MM-DD 存入 date 字段
+DATE_KEYWORDS = ('发布时间', '发布日期', '日期')
+# 旧版 extract_metadata 收集到 authors 中的关键词：行首必须正好是关键词加全角冒号
+AUTHOR_PREFIXES = ("撰稿人：", "投稿人：", "信息来源：")
+
+# 在一行中查找每个关键词及其后的冒号，一行中可能有多个字段，如“编辑：甲 摄影：乙”
+FIELD_PATTERN = re.compile(rf"({'|'.join(KEYWORDS)})\s*[:：]\s*")
+# 以关键词开头（允许前面有空白和 *-_ 标记）的元数据行
+LINE_PATTERN = re.compile(rf"[\s*\-_]*({'|'.join(KEYWORDS + DATE_KEYWORDS)})\s*[:：]")
+DATE_PATTERN = re.compile(r"(\d{4})\s*[年./-]\s*(\d{1,2})\s*[月./-]\s*(\d{1,2})")
+
+
+def parse_metadata_fields(lines: List[str]) -> Dict[str, str]:
+    """
+    把元数据行解析为结构化字段，例如 {'source': '长宁房管', 'writer': '张三、李四'}。
+    同一字段出现多次时以“；”连接。
+
+    Args:
+        lines (List[str]): 去掉首尾空白和 `*- ` 标记的元数据行。
+    """
+    fields: Dict[str, str] = {}
+    for line in lines:
+        matches = list(FIELD_PATTERN.finditer(line))
+        for k, match in enumerate(matches):
+            end = matches[k + 1].start() if k + 1 < len(matches) else len(line)
+            value = line[match.end():end].strip()
+            if not value:
+                continue
+            name = FIELD_NAMES[match.group(1)]
+            fields[name] = f"{fields[name]}；{value}" if name in fields else value
+    return fields
+
+
+def extract_metadata(content: str) -> dict:
+    """
+    一次遍历全文，提取作者、来源、发布日期等信息。
+
+    返回的字典中：
+        authors: 以“撰稿人：”“投稿人：”“信息来源：”开头的行中以“、”分隔的名字（去重、排序），
+                 与旧版 clean.py 的结果相同；
+        source、writer、author、editor、photographer、proofreader、contributor:
+                 全文中元数据行解析出的字段，见 parse_metadata_fields；
+        date: 发布日期行中的第一个日期，格式为 YYYY-MM-DD。
+    没有的项不出现在字典中。
+
+    Args:
+        content (str): 文章原文。
+    """
+    metadata = {}
+    # 绝大多数行没有冒号，先用子串查找跳过
+    if '：' not in content and ':' not in content:
+        return metadata
+    authors = []
+    field_lines = []
+    date = None
+    for line in content.splitlines():
+        if '：' not in line and ':' not in line:
+            continue
+        if line.startswith(AUTHOR_PREFIXES):
+            search_key = line[:line.index('：') + 1]
+            authors.extend(author.strip() for author in line.replace(search_key, "").strip().split('、'))
+        match = LINE_PATTERN.match(line)
+        if match is None:
+            continue
+        if match.group(1) in DATE_KEYWORDS:
+            found = DATE_PATTERN.search(line, match.end())
+            if found and date is None:
+                year, month, day = found.groups()
+                date = f"{year}-{int(month):02d}-{int(day):02d}"
+        else:
+            field_lines.append(line.strip().strip('*- '))
+
+    if authors:
+        metadata['authors'] = sorted(set(authors))
+    metadata.update(parse_metadata_fields(field_lines))
+    if date is not None:
+        metadata['date'] = date
+    return metadata
@@ -0,0 +1,137 @@
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from author import extract_trailing_metadata
+from clean import clean_content
+from main_title import add_main_title
+from metadata import extract_metadata
+
+
+@dataclass
+class Document:
+    """在流水线各阶段之间传递的文章。"""
+    name: str  # 文件名（含 .md 后缀）
+    content: str
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def title(self) -> str:
+        return os.path.splitext(self.name)[0]
+
+
+# 每个阶段接收一篇文章，返回处理后的文章；返回 None 表示丢弃该文章
+Stage = Callable[[Document], Optional[Document]]
+
+
+def clean_stage(doc: Document) -> Optional[Document]:
+    """对应 clean.py：提取作者信息并清洗正文，丢弃过短的文章。"""
+    doc.metadata.update(extract_metadata(doc.content))
+    doc.content = clean_content(doc.content)
+    if len(doc.content) < 100:
+        return None
+    return doc
+
+
+def main_title_stage(doc: Document) -> Optional[Document]:
+    """对应 main_title.py：用文件名补上H1标题。"""
+    doc.content = add_main_title(doc.content, doc.title)
+    return doc
+
+
+def trailing_metadata_stage(doc: Document) -> Optional[Document]:
+    """对应 author.py：格式化文末的来源、作者等信息，并把解析出的字段加入元数据。"""
+    doc.content, fields = extract_trailing_metadata(doc.content)
+    doc.metadata.update(fields)
+    return doc
+
+
+DEFAULT_STAGES: List[Tuple[str, Stage]] = [
+    ("clean", clean_stage),
+    ("main_title", main_title_stage),
+    ("trailing_metadata", trailing_metadata_stage),
+]
+
+
+def read_documents(input_dir: str) -> Iterator[Document]:
+    """按文件名顺序逐篇读取目录中的Markdown文件。"""
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.endswith('.md'):
+            continue
+        with open(os.path.join(input_dir, filename), 'r', encoding='utf-8') as f:
+            yield Document(name=filename, content=f.read())
+
+
+def write_document(doc: Document, output_dir: str):
+    with open(os.path.join(output_dir, doc.name), 'w', encoding='utf-8') as f:
+        f.write(doc.content)
+
+
+class Pipeline:
+    """
+    将多个处理阶段串联成单次遍历的流水线，文章在内存中依次经过每个阶段。
+    只在最后以及配置了检查点的阶段之后写盘。
+
+    Args:
+        stages: (阶段名, 处理函数) 列表，按顺序执行。
+        checkpoints: 阶段名到输出目录的映射，该阶段完成后把结果写入对应目录。
+    """
+
+    def __init__(self, stages: List[Tuple[str, Stage]] = DEFAULT_STAGES,
+                 checkpoints: Optional[Dict[str, str]] = None):
+        self.stages = stages
+        self.checkpoints = checkpoints or {}
+        for directory in self.checkpoints.values():
+            os.makedirs(directory, exist_ok=True)
+
+    def process(self, doc: Document) -> Optional[Document]:
+        for name, stage in self.stages:
+            doc = stage(doc)
+            if doc is None:
+                return None
+            if name in self.checkpoints:
+                write_document(doc, self.checkpoints[name])
+        return doc
+
+    def run(self, documents: Iterable[Document]) -> Iterator[Document]:
+        for doc in documents:
+            doc = self.process(doc)
+            if doc is not None:
+                yield doc
+
+
+def run_pipeline(input_dir: str, output_dir: str, checkpoints: Optional[Dict[str, str]] = None):
+    """
+    读取 input_dir 中的原始文章，经清洗、补标题、格式化文末信息后写入 output_dir。
+
+    Args:
+        input_dir (str): 原始Markdown文件所在目录。
+        output_dir (str): 最终结果的输出目录。
+        checkpoints (dict): 可选，阶段名到中间结果输出目录的映射。
+    """
+    if not os.path.isdir(input_dir):
+        print(f"错误: 输入目录 '{input_dir}' 不存在。", file=sys.stderr)
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"源目录:      {input_dir}")
+    print(f"目标目录:  {output_dir}")
+
+    pipeline = Pipeline(checkpoints=checkpoints)
+    written = 0
+    for doc in pipeline.run(read_documents(input_dir)):
+        write_document(doc, output_dir)
+        written += 1
+    print(f"共写出 {written} 个文件。")
+
+
+if __name__ == '__main__':
+    source_directory = "data"
+    destination_directory = "final_data"
+    # 如需保留中间结果，可配置检查点，例如 {"clean": "processed_data"}
+    checkpoint_directories = {}
+
+    print("开始执行单次遍历的预处理流水线...")
+    run_pipeline(source_directory, destination_directory, checkpoint_directories)
+    print("\n所有文件处理完毕。")
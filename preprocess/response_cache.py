@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+
+def make_cache_key(system_prompt: str, model: str, temperature: float, text: str) -> str:
+    """
+    由系统指令、模型名、温度和输入文本计算内容寻址的缓存键。
+    """
+    payload = json.dumps([system_prompt, model, temperature, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于 SQLite 的大模型响应缓存，按内容哈希存取。
+    缓存总大小超过上限时，优先淘汰最久未使用的条目。
+
+    总字节数在打开时统计一次，之后随插入、替换和淘汰更新，写入时不再扫描全表；
+    因此同一个数据库同时只应由一个 ResponseCache 写入。
+    命中时只在内存中记下使用时间，到下次 put 或 close 时再批量写入，读取不提交事务。
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+        max_bytes (int): 缓存响应文本的总字节数上限，None 表示不限。
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = 512 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 命中但尚未写入数据库的使用时间
+        self._last_used: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._last_used[key] = time.time()
+        return row[0]
+
+    def _flush_last_used(self):
+        if self._last_used:
+            self._conn.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                   ((used, key) for key, used in self._last_used.items()))
+            self._last_used.clear()
+
+    def put(self, key: str, response: str):
+        # 先写入命中记录的使用时间，淘汰时才能按真实的使用顺序
+        self._flush_last_used()
+        size = len(response.encode('utf-8'))
+        replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, response, size, time.time()),
+        )
+        self._total_bytes += size - (replaced[0] if replaced is not None else 0)
+        self._evict()
+        self._conn.commit()
+
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        excess = self._total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        # 按最近使用时间从旧到新删除，直到总大小回到上限以内
+        freed = 0
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+        self._total_bytes -= freed
+
+    def report(self) -> str:
+        return f"缓存命中 {self.hits} 次，未命中 {self.misses} 次。"
+
+    def close(self):
+        self._flush_last_used()
+        self._conn.commit()
+        self._conn.close()
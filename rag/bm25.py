@@ -0,0 +1,474 @@
+import json
+import math
+import os
+import re
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 相邻两个汉字组成的二元组、孤立的单个汉字、英文单词和数字分别成词
+CJK = '一-鿿'
+BIGRAM_PATTERN = re.compile(f'(?=([{CJK}]{{2}}))')
+UNIGRAM_PATTERN = re.compile(f'(?<![{CJK}])[{CJK}](?![{CJK}])')
+WORD_PATTERN = re.compile(r'[a-z]+|\d+')
+
+# 全角字母、数字和标点转为半角
+FULLWIDTH_TABLE = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+
+MANIFEST_FILE = "bm25.json"
+
+# 倒排列表按块存储，每块记录最后一个文档编号，检索时可以整块跳过
+BLOCK_SIZE = 128
+# 候选文档数乘以该值不小于段内文档数时，用布尔掩码筛选倒排列表，否则只解码含有候选的块
+ALLOWED_MASK_RATIO = 16
+
+def tokenize(text: str) -> List[str]:
+    """
+    面向中文的分词：汉字序列切成相邻两字的二元组（孤立的单个汉字保留为一元组），
+    英文单词转为小写，数字整体成词。文号、街道名等专有名词因此可以精确匹配。
+    BM25 只关心词频，返回的词不保持原文顺序。
+    """
+    text = text.translate(FULLWIDTH_TABLE).lower()
+    return BIGRAM_PATTERN.findall(text) + UNIGRAM_PATTERN.findall(text) + WORD_PATTERN.findall(text)
+
+
+def _width_codes(max_values: np.ndarray) -> np.ndarray:
+    """能容纳各个最大值的最小无符号整数宽度：0 表示 1 字节，1 表示 2 字节，2 表示 4 字节。"""
+    return (max_values >= 1 << 8).astype(np.uint8) + (max_values >= 1 << 16).astype(np.uint8)
+
+
+def _scatter(blob: np.ndarray, positions: np.ndarray, values: np.ndarray, widths: np.ndarray):
+    """把每个值按各自的宽度以小端序写入 blob 的对应位置。"""
+    for width in (1, 2, 4):
+        mask = widths == width
+        if mask.any():
+            data = values[mask].astype(f'<u{width}').view(np.uint8).reshape(-1, width)
+            blob[positions[mask, None] + np.arange(width)] = data
+
+
+def _gather(blob: np.ndarray, positions: np.ndarray, widths: np.ndarray) -> np.ndarray:
+    """_scatter 的逆操作。"""
+    values = np.zeros(len(positions), dtype=np.int64)
+    for width in (1, 2, 4):
+        mask = widths == width
+        if width == 1:
+            values[mask] = blob[positions[mask]]
+        elif mask.any():
+            data = blob[positions[mask, None] + np.arange(width)].astype(np.int64)
+            values[mask] = (data << (8 * np.arange(width))).sum(axis=1)
+    return values
+
+
+class Segment:
+    """
+    不可变的索引段。倒排列表按 BLOCK_SIZE 分块，块内文档编号做差分编码，
+    差分值和词频按块内最大值选用 1、2 或 4 字节宽度，全部拼接在一个字节串中。
+
+    词典中每个词对应 (首块下标, 块数, 文档频率, 最大词频, 最短文档长度)，
+    后两项用于估计该词在本段中 BM25 得分的上界。
+    """
+
+    def __init__(self, doc_lens: np.ndarray, terms: Dict[str, Tuple[int, int, int, int, int]],
+                 blob: bytes, block_last: np.ndarray, block_offset: np.ndarray,
+                 block_count: np.ndarray, block_format: np.ndarray):
+        self.doc_lens = doc_lens
+        self.terms = terms
+        self.blob = blob
+        self.block_last = block_last
+        self.block_offset = block_offset
+        self.block_count = block_count
+        self.block_format = block_format
+        self.name = None  # 保存到磁盘后的文件名
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    @classmethod
+    def build(cls, token_lists: Iterable[List[str]]) -> 'Segment':
+        """由每篇文档的词列表建立索引段。"""
+        vocabulary: Dict[str, int] = {}
+        term_ids = array('I')
+        doc_lens = array('I')
+        for tokens in token_lists:
+            doc_lens.append(len(tokens))
+            term_ids.extend([vocabulary.setdefault(token, len(vocabulary)) for token in tokens])
+        doc_lens = np.array(doc_lens, dtype=np.uint32)
+        n_docs = len(doc_lens)
+        # 按 (词, 文档) 排序并计数，得到按词分组、组内文档编号升序的倒排列表和词频
+        keys = np.frombuffer(term_ids, dtype=np.uint32).astype(np.int64) * max(n_docs, 1) \
+            + np.repeat(np.arange(n_docs, dtype=np.int64), doc_lens)
+        keys, tfs = np.unique(keys, return_counts=True)
+        term_of = keys // max(n_docs, 1)
+        starts = np.append(np.flatnonzero(np.diff(term_of, prepend=-1)), len(keys))
+        return cls.from_postings(doc_lens, list(vocabulary), starts, keys % max(n_docs, 1), tfs)
+
+    @classmethod
+    def from_postings(cls, doc_lens: np.ndarray, terms: List[str], starts: np.ndarray,
+                      docs: np.ndarray, tfs: np.ndarray) -> 'Segment':
+        """
+        由按词分组的完整倒排列表编码出索引段。
+
+        Args:
+            doc_lens: 段内每篇文档的词数。
+            terms: 词列表，每个词至少出现在一篇文档中。
+            starts: 长度为 len(terms) + 1，第 i 个词的倒排列表是 docs[starts[i]:starts[i + 1]]。
+            docs: 各词的文档编号，组内升序。
+            tfs: 与 docs 对应的词频。
+        """
+        docs = docs.astype(np.int64)
+        tfs = tfs.astype(np.int64)
+        n = len(docs)
+        df = np.diff(starts)
+        term_starts = starts[:-1]
+        term_of = np.repeat(np.arange(len(terms)), df)
+        blocks_per_term = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+        first_block = np.cumsum(blocks_per_term) - blocks_per_term
+        block_of = first_block[term_of] + (np.arange(n) - term_starts[term_of]) // BLOCK_SIZE
+        block_start = np.flatnonzero(np.diff(block_of, prepend=-1))
+        block_count = np.diff(np.append(block_start, n))
+
+        # 块内差分的基准是同一个词的上一个文档编号，每个词的第一个文档以 0 为基准
+        deltas = docs.copy()
+        deltas[1:] -= docs[:-1]
+        deltas[term_starts] = docs[term_starts]
+        doc_codes = _width_codes(np.maximum.reduceat(deltas, block_start))
+        tf_codes = _width_codes(np.maximum.reduceat(tfs, block_start))
+        doc_widths = 1 << doc_codes.astype(np.int64)
+        tf_widths = 1 << tf_codes.astype(np.int64)
+        block_bytes = block_count * (doc_widths + tf_widths)
+        block_offset = np.cumsum(block_bytes) - block_bytes
+
+        blob = np.zeros(int(block_bytes.sum()), dtype=np.uint8)
+        pos_in_block = np.arange(n) - block_start[block_of]
+        doc_pos = block_offset[block_of] + pos_in_block * doc_widths[block_of]
+        tf_pos = block_offset[block_of] + block_count[block_of] * doc_widths[block_of] \
+            + pos_in_block * tf_widths[block_of]
+        _scatter(blob, doc_pos, deltas, doc_widths[block_of])
+        _scatter(blob, tf_pos, tfs, tf_widths[block_of])
+
+        entries = zip(first_block.tolist(), blocks_per_term.tolist(), df.tolist(),
+                      np.maximum.reduceat(tfs, term_starts).tolist() if n else [],
+                      np.minimum.reduceat(doc_lens[docs], term_starts).tolist() if n else [])
+        return cls(doc_lens, dict(zip(terms, entries)), blob.tobytes(),
+                   docs[block_start + block_count - 1].astype(np.uint32),
+                   block_offset.astype(np.uint64), block_count.astype(np.uint16),
+                   (doc_codes | tf_codes << 2).astype(np.uint8))
+
+    def _decode_blocks(self, blocks: np.ndarray, bases: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        一次解码多个块，返回拼接后的 (文档编号, 词频)。
+
+        Args:
+            blocks: 块下标。
+            bases: 每个块差分编码的基准，即同一个词上一块的最后一个文档编号，首块为 0。
+        """
+        counts = self.block_count[blocks].astype(np.int64)
+        block_of = np.repeat(np.arange(len(blocks)), counts)
+        block_start = np.cumsum(counts) - counts
+        pos_in_block = np.arange(int(counts.sum())) - block_start[block_of]
+        formats = self.block_format[blocks]
+        doc_widths = (1 << (formats & 3).astype(np.int64))[block_of]
+        tf_widths = (1 << (formats >> 2).astype(np.int64))[block_of]
+        offsets = self.block_offset[blocks].astype(np.int64)[block_of]
+        blob = np.frombuffer(self.blob, dtype=np.uint8)
+        deltas = _gather(blob, offsets + pos_in_block * doc_widths, doc_widths)
+        tfs = _gather(blob, offsets + counts[block_of] * doc_widths + pos_in_block * tf_widths, tf_widths)
+        # 在每个块内部做前缀和，再加上块的基准还原文档编号
+        sums = np.cumsum(deltas)
+        if len(sums):
+            sums -= (sums[block_start] - deltas[block_start] - bases)[block_of]
+        return sums, tfs
+
+    def decode_all(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """解码全部倒排列表，返回与 from_postings 参数相同形式的 (terms, starts, docs, tfs)。"""
+        terms = sorted(self.terms, key=lambda term: self.terms[term][0])
+        df = np.array([self.terms[term][2] for term in terms], dtype=np.int64)
+        first_blocks = np.array([self.terms[term][0] for term in terms], dtype=np.int64)
+        bases = np.concatenate([[0], self.block_last[:-1]]).astype(np.int64)
+        bases[first_blocks] = 0
+        docs, tfs = self._decode_blocks(np.arange(len(self.block_count)), bases)
+        return terms, np.append(np.cumsum(df) - df, df.sum()), docs, tfs
+
+    def postings(self, term: str, blocks: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        解码一个词的倒排列表，返回 (文档编号, 词频)。
+
+        Args:
+            term: 词。
+            blocks: 可选，只解码这些块（相对该词首块的下标，升序）。
+        """
+        entry = self.terms.get(term)
+        if entry is None:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        first, n_blocks = entry[0], entry[1]
+        blocks = np.arange(n_blocks) if blocks is None else np.asarray(blocks, dtype=np.int64)
+        bases = np.where(blocks > 0, self.block_last[first + blocks - 1], 0).astype(np.int64)
+        return self._decode_blocks(first + blocks, bases)
+
+    def postings_for(self, term: str, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """只解码可能包含候选文档的块，返回候选文档中出现该词的 (文档编号, 词频)。"""
+        first, n_blocks = self.terms[term][0], self.terms[term][1]
+        last = self.block_last[first:first + n_blocks]
+        blocks = np.unique(np.searchsorted(last, candidates))
+        blocks = blocks[blocks < n_blocks]
+        docs, tfs = self.postings(term, blocks)
+        mask = np.isin(docs, candidates, assume_unique=True)
+        return docs[mask], tfs[mask]
+
+    def save(self, path: str):
+        entries = np.array([self.terms[t] for t in self.terms], dtype=np.int64).reshape(-1, 5)
+        np.savez(path, doc_lens=self.doc_lens, terms=np.array(list(self.terms), dtype=str), entries=entries,
+                 blob=np.frombuffer(self.blob, dtype=np.uint8), block_last=self.block_last,
+                 block_offset=self.block_offset, block_count=self.block_count, block_format=self.block_format)
+
+    @classmethod
+    def load(cls, path: str) -> 'Segment':
+        with np.load(path) as data:
+            terms = {term: tuple(int(v) for v in entry) for term, entry in zip(data['terms'].tolist(), data['entries'])}
+            segment = cls(data['doc_lens'], terms, data['blob'].tobytes(), data['block_last'],
+                          data['block_offset'], data['block_count'], data['block_format'])
+        segment.name = os.path.basename(path)
+        return segment
+
+
+def merge_segments(segments: Sequence[Segment]) -> Segment:
+    """把相邻的若干索引段合并为一段，文档编号按顺序顺延。"""
+    vocabulary: Dict[str, int] = {}
+    term_parts, doc_parts, tf_parts = [], [], []
+    base = 0
+    for segment in segments:
+        terms, starts, docs, tfs = segment.decode_all()
+        ids = np.array([vocabulary.setdefault(term, len(vocabulary)) for term in terms], dtype=np.int64)
+        term_parts.append(np.repeat(ids, np.diff(starts)))
+        doc_parts.append(docs + base)
+        tf_parts.append(tfs)
+        base += len(segment)
+    term_of = np.concatenate(term_parts)
+    # 稳定排序保持各段的先后顺序，因此同一个词的文档编号仍然升序
+    order = np.argsort(term_of, kind='stable')
+    term_of = term_of[order]
+    starts = np.append(np.flatnonzero(np.diff(term_of, prepend=-1)), len(term_of))
+    return Segment.from_postings(np.concatenate([segment.doc_lens for segment in segments]),
+                                 list(vocabulary), starts,
+                                 np.concatenate(doc_parts)[order], np.concatenate(tf_parts)[order])
+
+
+class BM25Index:
+    """
+    分段的 BM25 关键词索引。每次 add 生成一个新的不可变索引段，merge 把相邻的小段合并。
+    文档编号按加入顺序从 0 递增，与按相同顺序写入 VectorIndex 的记录编号一致，
+    便于与向量检索的结果融合。
+
+    检索使用 MaxScore 剪枝：按得分上界从高到低逐词累加，
+    一旦剩余词的上界之和低于当前第 k 名的得分，剩余词只对候选文档解码相关的块。
+
+    Args:
+        path (str): 可选，索引目录。目录中已有索引时直接打开。
+        k1 (float): BM25 词频饱和参数。
+        b (float): BM25 文档长度归一化参数。
+        tokenizer: 分词函数，建索引和查询时使用同一个。
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75,
+                 tokenizer: Callable[[str], List[str]] = tokenize):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.segments: List[Segment] = []
+        self.bases: List[int] = []
+        self.count = 0
+        self.total_len = 0
+        if path and os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            self.k1 = info['k1']
+            self.b = info['b']
+            for name in info['segments']:
+                self._append_segment(Segment.load(os.path.join(path, name)))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _append_segment(self, segment: Segment):
+        self.segments.append(segment)
+        self.bases.append(self.count)
+        self.count += len(segment)
+        self.total_len += int(segment.doc_lens.sum())
+
+    def add(self, texts: Iterable[str]) -> int:
+        """把一批文本建成新的索引段追加到索引中，返回追加的文档数。"""
+        segment = Segment.build(self.tokenizer(text) for text in texts)
+        if len(segment):
+            self._append_segment(segment)
+        return len(segment)
+
+    def add_chunks(self, chunks: Iterable) -> int:
+        """追加 MarkdownHeaderTextSplitter 产出的块，按 content 建索引。"""
+        return self.add(chunk.content for chunk in chunks)
+
+    def merge(self, max_segments: int = 1):
+        """反复合并文档数之和最小的一对相邻段，直到段数不超过 max_segments。"""
+        while len(self.segments) > max(1, max_segments):
+            sizes = [len(a) + len(b) for a, b in zip(self.segments, self.segments[1:])]
+            i = sizes.index(min(sizes))
+            self.segments[i:i + 2] = [merge_segments(self.segments[i:i + 2])]
+            del self.bases[i + 1]
+
+    def save(self):
+        """把尚未保存的段写入索引目录，再原子地替换清单并删除已被合并的旧段文件。"""
+        if not self.path:
+            raise ValueError("未指定索引目录，无法保存。")
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        old_names = set()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                old_names = set(json.load(f)['segments'])
+        for base, segment in zip(self.bases, self.segments):
+            if segment.name is None:
+                segment.name = f"segment-{base}-{len(segment)}.npz"
+                segment.save(os.path.join(self.path, segment.name))
+        names = [segment.name for segment in self.segments]
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'segments': names}, f)
+        os.replace(tmp_path, manifest_path)
+        for name in old_names - set(names):
+            os.remove(os.path.join(self.path, name))
+
+    def _idf(self, term: str) -> float:
+        df = sum(segment.terms[term][2] for segment in self.segments if term in segment.terms)
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        返回与查询最相关的至多 k 个 (文档编号, BM25 得分)，按得分从高到低排列。
+
+        Args:
+            allowed: 可选，升序的候选文档编号，只在其中检索。IDF 和平均长度仍按全部文档计算，
+                因此候选文档的得分与不加限制时相同。
+        """
+        terms = list(dict.fromkeys(self.tokenizer(query)))
+        if not terms or self.count == 0 or k <= 0:
+            return []
+        idf = {term: self._idf(term) for term in terms}
+        avgdl = self.total_len / self.count
+        if allowed is not None:
+            allowed = np.asarray(allowed, dtype=np.int64)
+        results: List[Tuple[float, int]] = []
+        threshold = 0.0
+        for base, segment in zip(self.bases, self.segments):
+            local = None
+            if allowed is not None:
+                lo, hi = np.searchsorted(allowed, [base, base + len(segment)])
+                if lo == hi:
+                    continue
+                local = allowed[lo:hi] - base
+            scores, ids = self._search_segment(segment, terms, idf, avgdl, k, threshold, local)
+            results.extend(zip(scores.tolist(), (ids + base).tolist()))
+            results.sort(key=lambda item: (-item[0], item[1]))
+            del results[k:]
+            if len(results) == k:
+                threshold = results[-1][0]
+        return [(doc, score) for score, doc in results]
+
+    def _weights(self, tfs: np.ndarray, doc_lens: np.ndarray, idf: float, avgdl: float) -> np.ndarray:
+        tfs = tfs.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_lens.astype(np.float32) / avgdl)
+        return idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _search_segment(self, segment: Segment, terms: List[str], idf: Dict[str, float], avgdl: float,
+                        k: int, threshold: float, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        present = [term for term in terms if term in segment.terms]
+        if not present:
+            return np.zeros(0, np.float32), np.zeros(0, np.int64)
+        # 每个词在本段的得分上界：最大词频配最短文档长度
+        bounds = {}
+        for term in present:
+            _, _, _, max_tf, min_dl = segment.terms[term]
+            bounds[term] = float(self._weights(np.array([max_tf]), np.array([min_dl]), idf[term], avgdl)[0])
+        present.sort(key=lambda term: -bounds[term])
+        remaining = sum(bounds.values())
+
+        allowed_mask = None
+        if allowed is not None and allowed.size * ALLOWED_MASK_RATIO >= len(segment):
+            allowed_mask = np.zeros(len(segment), dtype=bool)
+            allowed_mask[allowed] = True
+
+        scores = np.zeros(len(segment), dtype=np.float32)
+        for term in present:
+            if remaining < threshold:
+                # 只有已累计得分加上剩余上界仍能超过阈值的文档才可能进入前 k 名
+                candidates = np.flatnonzero(scores > threshold - remaining)
+                if candidates.size == 0:
+                    break
+                docs, tfs = segment.postings_for(term, candidates)
+            elif allowed_mask is not None:
+                # 候选较多时解码全部块再筛选，比逐块判断是否含有候选文档更快
+                docs, tfs = segment.postings(term)
+                keep = allowed_mask[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            elif allowed is not None:
+                # 候选较少时只解码可能包含候选文档的块，之后累计得分的文档都在候选之中
+                docs, tfs = segment.postings_for(term, allowed)
+            else:
+                docs, tfs = segment.postings(term)
+            scores[docs] += self._weights(tfs, segment.doc_lens[docs], idf[term], avgdl)
+            remaining -= bounds[term]
+            if remaining < threshold or scores.max() <= remaining:
+                continue
+            # 已累计的得分是最终得分的下界，其中第 k 大的值可以作为新的阈值
+            matched = scores[scores > 0]
+            if matched.size >= k:
+                threshold = max(threshold, float(np.partition(matched, matched.size - k)[matched.size - k]))
+
+        ids = np.flatnonzero(scores > 0)
+        if ids.size > k:
+            ids = ids[np.argpartition(-scores[ids], k - 1)[:k]]
+        return scores[ids], ids
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合（RRF）：文档的融合得分为其在各个排名列表中 weight / (k + 名次) 之和。
+    只依赖名次，不需要把 BM25 得分和余弦相似度换算到同一尺度。
+
+    Args:
+        rankings: 多个按相关性从高到低排列的文档编号列表。
+        k: 平滑常数，越大则排名靠后的结果权重下降得越慢。
+        weights: 可选，每个排名列表的权重。
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def hybrid_search(bm25: BM25Index, vector_index, embedder, query: str, k: int = 10,
+                  candidates: int = 50, nprobe: Optional[int] = None,
+                  allowed: Optional[np.ndarray] = None,
+                  query_vector: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """
+    分别做关键词检索和向量检索，各取 candidates 个结果后用 RRF 融合，返回前 k 个 (编号, 融合得分)。
+    要求两个索引按相同顺序加入了同一批块。
+
+    Args:
+        bm25: 关键词索引。
+        vector_index: rag/index.py 中的 VectorIndex。
+        embedder: 建立向量索引时使用的嵌入模型。
+        query: 查询文本。
+        nprobe: 传给向量检索的 IVF 探查列表数。
+        allowed: 可选，升序的候选块编号（例如 MetadataCatalog.chunk_ids 的结果），两路检索都只在其中进行。
+        query_vector: 可选，已经嵌入好的查询向量，给出时不再调用 embedder。
+    """
+    keyword_ids = [doc for doc, _ in bm25.search(query, candidates, allowed)]
+    if query_vector is None:
+        query_vector = embedder.embed([query])
+    _, vector_ids = vector_index.search(query_vector, candidates, nprobe, allowed)
+    vector_ids = [int(i) for i in vector_ids[0] if i >= 0]
+    return reciprocal_rank_fusion([keyword_ids, vector_ids])[:k]
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import sqlite3
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 这些字段中的名字记为文章的作者
+AUTHOR_FIELDS = ("writer", "author", "contributor")
+# 一个字段中的多个名字之间的分隔符
+NAME_SEPARATOR_PATTERN = re.compile(r"[、，,；;/]+")
+
+Names = Union[str, Sequence[str]]
+
+
+def split_names(value: Optional[str]) -> List[str]:
+    """把“张三、李四”这样的字段拆成去重后的名字列表。"""
+    if not value:
+        return []
+    names = (name.strip() for name in NAME_SEPARATOR_PATTERN.split(value))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class MetadataCatalog:
+    """
+    基于 SQLite 的文章元数据目录，记录每篇文章的作者、来源（发布部门）、发布日期，
+    以及它的块在 VectorIndex、BM25Index 中的编号区间。作者、来源和发布日期上建有索引。
+
+    检索时先用 chunk_ids 按作者、来源或日期筛出候选块，再把它作为 allowed 传给
+    VectorIndex.search、BM25Index.search 或 hybrid_search，只对候选块打分。
+
+    一篇文章的块必须连续编号，按文章顺序把块加入索引时自然满足，例如：
+
+        first = len(vector_index)
+        count = vector_index.add(splitter.iter_split(content, {'title': title}), embedder)
+        catalog.add_document(title, metadata, first, count)
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY,"
+            " title TEXT UNIQUE NOT NULL,"
+            " publish_date TEXT,"
+            " first_chunk INTEGER NOT NULL,"
+            " chunk_count INTEGER NOT NULL,"
+            " metadata TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS authors (document_id INTEGER NOT NULL, name TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS sources (document_id INTEGER NOT NULL, name TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(publish_date);"
+            "CREATE INDEX IF NOT EXISTS idx_authors_name ON authors(name, document_id);"
+            "CREATE INDEX IF NOT EXISTS idx_authors_document ON authors(document_id);"
+            "CREATE INDEX IF NOT EXISTS idx_sources_name ON sources(name, document_id);"
+            "CREATE INDEX IF NOT EXISTS idx_sources_document ON sources(document_id);"
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add_document(self, title: str, metadata: dict, first_chunk: int, chunk_count: int) -> int:
+        """
+        记录一篇文章，同名文章已存在时覆盖。返回文章在目录中的编号。
+        调用 commit 后才写入磁盘。
+
+        Args:
+            title: 文章标题。
+            metadata: metadata.extract_metadata 或 author.extract_trailing_metadata 得到的字段。
+            first_chunk: 文章第一个块的编号。
+            chunk_count: 文章的块数。
+        """
+        row = self._conn.execute("SELECT id FROM documents WHERE title = ?", (title,)).fetchone()
+        if row is not None:
+            self._delete(row[0])
+        cursor = self._conn.execute(
+            "INSERT INTO documents (title, publish_date, first_chunk, chunk_count, metadata) VALUES (?, ?, ?, ?, ?)",
+            (title, metadata.get('date'), first_chunk, chunk_count, json.dumps(metadata, ensure_ascii=False)),
+        )
+        doc_id = cursor.lastrowid
+        authors = dict.fromkeys(name for field in AUTHOR_FIELDS for name in split_names(metadata.get(field)))
+        self._conn.executemany("INSERT INTO authors (document_id, name) VALUES (?, ?)",
+                               [(doc_id, name) for name in authors])
+        self._conn.executemany("INSERT INTO sources (document_id, name) VALUES (?, ?)",
+                               [(doc_id, name) for name in split_names(metadata.get('source'))])
+        return doc_id
+
+    def _delete(self, doc_id: int):
+        self._conn.execute("DELETE FROM authors WHERE document_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM sources WHERE document_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def commit(self):
+        self._conn.commit()
+
+    @staticmethod
+    def _where(author: Optional[Names], source: Optional[Names],
+               date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for table, names in (("authors", author), ("sources", source)):
+            if names is None:
+                continue
+            names = [names] if isinstance(names, str) else list(names)
+            clauses.append(f"id IN (SELECT document_id FROM {table} WHERE name IN ({','.join('?' * len(names))}))")
+            params.extend(names)
+        if date_from is not None:
+            clauses.append("publish_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("publish_date <= ?")
+            params.append(date_to)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def find_documents(self, author: Optional[Names] = None, source: Optional[Names] = None,
+                       date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[dict]:
+        """
+        按条件查找文章，各条件之间为“且”。author、source 可以是一个名字或名字列表（满足其一即可），
+        日期为 YYYY-MM-DD 格式的闭区间，指定日期条件时没有发布日期的文章不会入选。
+
+        Returns:
+            每篇文章的 title、first_chunk、chunk_count 和 metadata。
+        """
+        where, params = self._where(author, source, date_from, date_to)
+        rows = self._conn.execute(
+            f"SELECT title, first_chunk, chunk_count, metadata FROM documents{where} ORDER BY first_chunk", params)
+        return [{'title': title, 'first_chunk': first, 'chunk_count': count, 'metadata': json.loads(metadata)}
+                for title, first, count, metadata in rows]
+
+    def chunk_ids(self, author: Optional[Names] = None, source: Optional[Names] = None,
+                  date_from: Optional[str] = None, date_to: Optional[str] = None) -> np.ndarray:
+        """
+        返回满足条件的文章的全部块编号（升序），可作为检索的 allowed 参数。条件同 find_documents。
+        """
+        where, params = self._where(author, source, date_from, date_to)
+        ranges = np.array(self._conn.execute(
+            f"SELECT first_chunk, chunk_count FROM documents{where} ORDER BY first_chunk", params).fetchall(),
+            dtype=np.int64).reshape(-1, 2)
+        return _expand_ranges(ranges[:, 0], ranges[:, 1])
+
+    def authors(self) -> List[Tuple[str, int]]:
+        """全部作者及其文章数，按文章数从多到少排列。"""
+        return self._conn.execute(
+            "SELECT name, COUNT(*) AS n FROM authors GROUP BY name ORDER BY n DESC, name").fetchall()
+
+    def sources(self) -> List[Tuple[str, int]]:
+        """全部来源（发布部门）及其文章数，按文章数从多到少排列。"""
+        return self._conn.execute(
+            "SELECT name, COUNT(*) AS n FROM sources GROUP BY name ORDER BY n DESC, name").fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """把若干个 [start, start + count) 区间展开成编号数组，不逐个区间循环。"""
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # 每个位置的编号 = 所在区间的起点 + 在区间内的序号
+    region_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    return region_starts + np.arange(total, dtype=np.int64)
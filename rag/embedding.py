@@ -0,0 +1,88 @@
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """把每一行缩放为单位长度，使内积等于余弦相似度。零向量保持不变。"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class Embedder(ABC):
+    """
+    嵌入模型接口。
+
+    实现类需要提供：
+        name: 模型标识，不同模型或不同参数的向量不能混用。
+        dim: 向量维度。
+        embed(texts): 返回形状为 (len(texts), dim) 的 float32 单位向量矩阵。
+    """
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """
+    基于特征哈希的确定性嵌入：把字符 n-gram 哈希到固定维度的带符号计数上。
+    不依赖任何模型和网络，结果在不同进程间保持一致，适合离线测试和基准测试。
+
+    Args:
+        dim (int): 向量维度。
+        ngram_range (Tuple[int, int]): 使用的字符 n-gram 长度范围（闭区间）。
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (1, 2)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"hashing-{dim}-{ngram_range[0]}-{ngram_range[1]}"
+        # n-gram 到 (维度下标, 符号) 的缓存，中文语料中的 n-gram 重复率很高
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, gram: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(gram)
+        if bucket is None:
+            h = zlib.crc32(gram.encode('utf-8'))
+            bucket = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+            self._buckets[gram] = bucket
+        return bucket
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        low, high = self.ngram_range
+        for row, text in enumerate(texts):
+            buckets = [self._bucket(text[i:i + n])
+                       for n in range(low, high + 1)
+                       for i in range(len(text) - n + 1)]
+            if not buckets:
+                continue
+            indices, signs = zip(*buckets)
+            np.add.at(vectors[row], np.array(indices), np.array(signs, dtype=np.float32))
+        return normalize_rows(vectors)
+
+
+class LangChainEmbedder(Embedder):
+    """
+    把任意 LangChain Embeddings 对象（如 OpenAIEmbeddings）适配为 Embedder。
+
+    Args:
+        embeddings: 提供 embed_documents 方法的对象。
+        name (str): 模型标识。
+        dim (int): 向量维度。
+    """
+
+    def __init__(self, embeddings, name: str, dim: int):
+        self.embeddings = embeddings
+        self.name = name
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedding import Embedder
+
+# 每条 SELECT ... IN (...) 语句查询的键数，不超过 SQLite 的参数个数上限
+QUERY_BATCH = 500
+# 缓存的向量数上限，默认约 1000 万个，1024 维 float16 约 20GB
+MAX_ENTRIES = 10_000_000
+
+
+def make_embedding_key(embedder_name: str, text: str) -> bytes:
+    """由嵌入模型标识和文本计算缓存键：SHA-256 的前 16 个字节。"""
+    return hashlib.sha256(f"{embedder_name}\0{text}".encode('utf-8')).digest()[:16]
+
+
+class EmbeddingCache:
+    """
+    基于 SQLite 的嵌入向量缓存，按 (嵌入模型标识, 文本) 的哈希存取。
+
+    重新分块（例如调整 chunk_size）或在语料中追加文章后重建索引时，
+    内容不变的块直接取出缓存的向量，只有从未见过的文本才交给嵌入模型。
+    向量以 float16 或 float32 的字节串保存，读取时按字节串长度识别精度，
+    同一个数据库中两种精度可以混存。向量数超过 max_entries 时淘汰最久未使用的。
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+        dtype (str): 写入向量的精度，"float16" 或 "float32"。
+            float16 占用一半空间，单位向量的余弦相似度误差在 1e-3 以内。
+        max_entries (int): 缓存的向量数上限，None 表示不限。
+    """
+
+    def __init__(self, path: str, dtype: str = "float16", max_entries: Optional[int] = MAX_ENTRIES):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"不支持的精度 '{dtype}'，只能是 float16 或 float32。")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        # 向量约 1KB 一条，放在 WITHOUT ROWID 表的主键 B 树中会浪费大量页空间，这里使用普通表
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _decode(blob: bytes, dim: int) -> np.ndarray:
+        dtype = np.float16 if len(blob) == 2 * dim else np.float32
+        return np.frombuffer(blob, dtype=dtype)
+
+    def get_many(self, embedder: Embedder, texts: List[str]) -> Dict[str, np.ndarray]:
+        """查找若干文本缓存的向量，返回 {文本: 向量}，不含未缓存的文本。"""
+        keys = {make_embedding_key(embedder.name, text): text for text in dict.fromkeys(texts)}
+        found: Dict[str, np.ndarray] = {}
+        found_keys = []
+        key_list = list(keys)
+        for start in range(0, len(key_list), QUERY_BATCH):
+            part = key_list[start:start + QUERY_BATCH]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part)
+            for key, blob in rows:
+                vector = self._decode(blob, embedder.dim)
+                if len(vector) == embedder.dim:
+                    found[keys[key]] = vector
+                    found_keys.append(key)
+        if found_keys:
+            now = time.time()
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                   ((now, key) for key in found_keys))
+            self._conn.commit()
+        return found
+
+    def put_many(self, embedder: Embedder, texts: List[str], vectors: np.ndarray):
+        """缓存若干文本的向量。"""
+        vectors = np.asarray(vectors).astype(self.dtype, copy=False)
+        now = time.time()
+        rows = [(make_embedding_key(embedder.name, text), vector.tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        before = self._conn.total_changes
+        self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+        self._count += self._conn.total_changes - before
+        self._evict()
+        self._conn.commit()
+
+    def embed(self, embedder: Embedder, texts: List[str]) -> np.ndarray:
+        """
+        返回与 embedder.embed(texts) 相同形状的矩阵：缓存中有的直接取出，
+        其余去重后一次交给嵌入模型，并写入缓存。
+        新嵌入的向量同样按缓存的精度取整，无论是否命中缓存，同一文本得到的向量都相同。
+        """
+        found = self.get_many(embedder, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            fresh = np.asarray(embedder.embed(missing)).astype(self.dtype, copy=False)
+            self.put_many(embedder, missing, fresh)
+            found.update(zip(missing, fresh))
+        if not texts:
+            return np.zeros((0, embedder.dim), dtype=np.float32)
+        return np.stack([found[text] for text in texts]).astype(np.float32, copy=False)
+
+    def _evict(self):
+        if self.max_entries is None or self._count <= self.max_entries:
+            return
+        excess = self._count - self.max_entries
+        # 按最近使用时间从旧到新删除，直到向量数回到上限以内
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,))
+        self._count -= excess
+
+    def report(self) -> str:
+        return f"嵌入缓存命中 {self.hits} 个，嵌入 {self.misses} 个，共缓存 {self._count} 个向量。"
+
+    def close(self):
+        self._conn.close()
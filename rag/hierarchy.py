@@ -0,0 +1,241 @@
+import json
+import os
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+TEXT_FILE = "sections.txt"
+NODES_FILE = "nodes.npz"
+METADATA_FILE = "nodes.json"
+
+# 保存到 NODES_FILE 中的整数数组，带 _offsets/_first 的数组末尾多一个哨兵
+_ARRAYS = ("document_first_section", "section_document", "section_first_leaf",
+           "section_text_offsets", "leaf_section", "leaf_start", "leaf_end")
+
+
+class HierarchyStore:
+    """
+    文档 → 标题小节 → 子块 三级层级的存储，用于 Small-to-Big 检索：
+    检索命中精确的子块后，直接取出其所属小节的完整正文，不需要重新读取或分割源 Markdown。
+
+    节点按加入顺序编号，层级关系保存在整数数组中：
+    子块的父小节、小节的父文档都是一次数组访问；
+    同一父节点的子节点编号连续，兄弟节点就是一个区间，查找均为 O(1)。
+    小节正文以 UTF-8 追加写入一个文本文件，子块以字符偏移引用所属小节的正文。
+
+    子块编号与按相同顺序写入 VectorIndex、BM25Index 的记录编号一致。
+
+    Args:
+        path (str): 存储目录。目录中已有数据时直接打开。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        nodes_path = os.path.join(path, NODES_FILE)
+        if os.path.exists(nodes_path):
+            with np.load(nodes_path) as data:
+                for name in _ARRAYS:
+                    setattr(self, name, array('q', data[name].astype(np.int64).tobytes()))
+                self.generation = int(data['generation']) if 'generation' in data.files else 0
+            with open(os.path.join(path, METADATA_FILE), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            self.documents: List[dict] = info['documents']
+            self.section_metadata: List[dict] = info['sections']
+            self._check_generation(info.get('generation', 0))
+        else:
+            self.generation = 0
+            self.document_first_section = array('q', [0])
+            self.section_document = array('q')
+            self.section_first_leaf = array('q', [0])
+            self.section_text_offsets = array('q', [0])
+            self.leaf_section = array('q')
+            self.leaf_start = array('q')
+            self.leaf_end = array('q')
+            self.documents = []
+            self.section_metadata = []
+
+    def _check_generation(self, metadata_generation: int):
+        """
+        核对两个文件是否来自同一次保存。save 先替换元数据、后替换层级数组，
+        在两次替换之间退出时元数据较新；节点只会追加，截去层级数组中没有的文档和小节即可。
+        """
+        if metadata_generation == self.generation:
+            return
+        if metadata_generation < self.generation or len(self.documents) < self.num_documents \
+                or len(self.section_metadata) < self.num_sections:
+            raise ValueError(f"'{self.path}' 中的 {NODES_FILE} 与 {METADATA_FILE} 不一致，无法恢复。")
+        self.documents = self.documents[:self.num_documents]
+        self.section_metadata = self.section_metadata[:self.num_sections]
+
+    def __len__(self) -> int:
+        """子块总数。"""
+        return len(self.leaf_section)
+
+    @property
+    def num_documents(self) -> int:
+        return len(self.document_first_section) - 1
+
+    @property
+    def num_sections(self) -> int:
+        return len(self.section_document)
+
+    def add_document(self, sections: Iterable[Tuple], metadata: Optional[dict] = None) -> List:
+        """
+        加入一篇文档，返回按编号顺序排列的子块，可直接交给 VectorIndex.add 或 BM25Index.add_chunks。
+
+        Args:
+            sections: MarkdownHeaderTextSplitter.iter_split_sections 产出的 (小节块, 子块列表)。
+            metadata: 文档级元数据，例如文件名。
+        """
+        doc_id = len(self.documents)
+        leaves = []
+        text_path = os.path.join(self.path, TEXT_FILE)
+        with open(text_path, 'r+b' if os.path.exists(text_path) else 'wb') as f:
+            # 上次未保存就退出时，文件末尾可能留有不属于任何小节的数据
+            f.seek(self.section_text_offsets[-1])
+            f.truncate()
+            for section, chunks in sections:
+                text = section.content
+                data = text.encode('utf-8')
+                f.write(data)
+                self.section_text_offsets.append(self.section_text_offsets[-1] + len(data))
+                self.section_document.append(doc_id)
+                self.section_metadata.append(section.metadata)
+                section_id = len(self.section_document) - 1
+                for chunk in chunks:
+                    start, end = self._locate(chunk, section, text)
+                    self.leaf_section.append(section_id)
+                    self.leaf_start.append(start)
+                    self.leaf_end.append(end)
+                    leaves.append(chunk)
+                self.section_first_leaf.append(len(self.leaf_section))
+        self.document_first_section.append(len(self.section_document))
+        self.documents.append(dict(metadata) if metadata else {})
+        return leaves
+
+    @staticmethod
+    def _locate(chunk, section, text: str) -> Tuple[int, int]:
+        """求子块正文在小节正文中的字符偏移。"""
+        if chunk.source is section.source:
+            # 分割器产出的子块与小节块引用同一份源文本，偏移相减即可
+            start = chunk.span[0] - section.span[0]
+        else:
+            start = text.find(chunk.content)
+            if start < 0:
+                raise ValueError("子块的正文不在所属小节中。")
+        return start, start + len(chunk.content)
+
+    def save(self):
+        """
+        写入层级数组和元数据。小节正文在加入时已经写入。
+
+        两个文件各自原子地替换，并记录同一个保存代数；在两次替换之间退出时，
+        下次打开会按层级数组截去元数据中多出的部分，见 _check_generation。
+        """
+        nodes_path = os.path.join(self.path, NODES_FILE)
+        metadata_path = os.path.join(self.path, METADATA_FILE)
+        generation = self.generation + 1
+        with open(nodes_path + '.tmp', 'wb') as f:
+            np.savez(f, generation=np.int64(generation),
+                     **{name: np.frombuffer(getattr(self, name), dtype=np.int64) for name in _ARRAYS})
+        with open(metadata_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'generation': generation, 'documents': self.documents, 'sections': self.section_metadata},
+                      f, ensure_ascii=False)
+        # 先替换元数据：节点只会追加，较新的元数据可以按层级数组截断，反过来则无法恢复
+        os.replace(metadata_path + '.tmp', metadata_path)
+        os.replace(nodes_path + '.tmp', nodes_path)
+        self.generation = generation
+
+    # --- 层级关系 ---
+
+    def parent(self, leaf_id: int) -> int:
+        """子块所属的小节编号。"""
+        return self.leaf_section[leaf_id]
+
+    def document_of(self, section_id: int) -> int:
+        """小节所属的文档编号。"""
+        return self.section_document[section_id]
+
+    def siblings(self, leaf_id: int) -> range:
+        """与子块同属一个小节的全部子块编号（含自身）。"""
+        return self.children(self.leaf_section[leaf_id])
+
+    def children(self, section_id: int) -> range:
+        """小节的子块编号。"""
+        return range(self.section_first_leaf[section_id], self.section_first_leaf[section_id + 1])
+
+    def sections_of(self, doc_id: int) -> range:
+        """文档的小节编号。"""
+        return range(self.document_first_section[doc_id], self.document_first_section[doc_id + 1])
+
+    def section_siblings(self, section_id: int) -> range:
+        """与小节同属一篇文档的全部小节编号（含自身）。"""
+        return self.sections_of(self.section_document[section_id])
+
+    # --- 正文 ---
+
+    def section_text(self, section_id: int) -> str:
+        start = self.section_text_offsets[section_id]
+        end = self.section_text_offsets[section_id + 1]
+        with open(os.path.join(self.path, TEXT_FILE), 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def leaf_text(self, leaf_id: int) -> str:
+        return self.section_text(self.leaf_section[leaf_id])[self.leaf_start[leaf_id]:self.leaf_end[leaf_id]]
+
+    def section_metadata_of(self, section_id: int) -> dict:
+        return self.section_metadata[section_id]
+
+    def expand(self, leaf_ids: Iterable[int], max_chars: Optional[int] = None) -> List[dict]:
+        """
+        Small-to-Big：把命中的子块扩展为所属小节的正文。
+        命中同一小节的多个子块合并为一条结果，结果按各小节首次命中的先后排列。
+
+        小节正文超过 max_chars 时，从命中的子块出发向两侧逐个加入相邻的兄弟子块，
+        直到再加入就会超出 max_chars，返回这一段连续正文。命中的子块之间的正文总会保留。
+
+        Args:
+            leaf_ids: 按相关性从高到低排列的子块编号。
+            max_chars: 可选，每条结果正文的最大字符数。
+
+        Returns:
+            每条结果包含 section（小节编号）、document（文档编号）、leaves（命中的子块编号）、
+            content（扩展后的正文）和 metadata（小节的元数据）。
+        """
+        groups = {}
+        for leaf_id in leaf_ids:
+            groups.setdefault(self.leaf_section[leaf_id], []).append(leaf_id)
+
+        results = []
+        for section_id, hits in groups.items():
+            text = self.section_text(section_id)
+            if max_chars is not None and len(text) > max_chars:
+                text = self._window(section_id, text, hits, max_chars)
+            results.append({
+                'section': section_id,
+                'document': self.section_document[section_id],
+                'leaves': hits,
+                'content': text,
+                'metadata': self.section_metadata[section_id],
+            })
+        return results
+
+    def _window(self, section_id: int, text: str, hits: List[int], max_chars: int) -> str:
+        children = self.children(section_id)
+        first, last = min(hits), max(hits)
+        start, end = self.leaf_start[first], self.leaf_end[last]
+        while True:
+            grown = False
+            if last + 1 < children.stop and self.leaf_end[last + 1] - start <= max_chars:
+                last += 1
+                end = self.leaf_end[last]
+                grown = True
+            if first - 1 >= children.start and end - self.leaf_start[first - 1] <= max_chars:
+                first -= 1
+                start = self.leaf_start[first]
+                grown = True
+            if not grown:
+                return text[start:end]
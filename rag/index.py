@@ -0,0 +1,330 @@
+import json
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from embedding import Embedder, normalize_rows
+from embedding_cache import EmbeddingCache
+
+INFO_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "records.idx"
+IVF_FILE = "ivf.npz"
+
+# 精确检索时每次参与矩阵乘法的向量行数，限制临时内存占用
+SEARCH_BLOCK_ROWS = 65536
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    从每一行的候选中取出得分最高的 k 个，按得分从高到低排列。
+
+    Args:
+        scores: 形状为 (q, n) 的得分矩阵。
+        ids: 与 scores 同形状的候选编号矩阵。
+    """
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class VectorIndex:
+    """
+    本地向量索引。向量以 float32 矩阵的形式保存在文件中并通过内存映射读取，
+    块的正文和元数据保存在旁路的 JSONL 表里，按偏移表随机读取。
+
+    默认使用矩阵乘法做精确的 top-k 检索；调用 build_ivf 之后，
+    可以通过 nprobe 参数改用倒排文件（IVF）做近似检索。
+
+    每次追加向量或重建 IVF 都会使 generation 加一，缓存检索结果的一方据此判断结果是否过期。
+
+    Args:
+        path (str): 索引目录。目录中已有索引时直接打开。
+        dim (int): 新建索引时的向量维度。
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        info_path = os.path.join(path, INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            self.dim = info['dim']
+            self.count = info['count']
+            self.embedder_name = info['embedder']
+            self.generation = info.get('generation', 0)
+        else:
+            if dim is None:
+                raise ValueError(f"索引目录 '{path}' 不存在索引，新建时必须指定 dim。")
+            self.dim = dim
+            self.count = 0
+            self.embedder_name = None
+            self.generation = 0
+            self.save()
+
+        self._offsets = self._recover()
+        self._vectors = None
+        self._ivf = None
+        ivf_path = os.path.join(path, IVF_FILE)
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as data:
+                self._ivf = {name: data[name] for name in data.files}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _recover(self) -> np.ndarray:
+        """
+        截掉数据文件中超出 count 的部分，返回前 count 条记录的偏移。
+
+        add_vectors 先追加三个数据文件，最后才写入新的 count；
+        中途退出时数据文件末尾会留下不属于索引的行，不截掉的话下次追加的向量和记录就会错位。
+        """
+        offsets_path = self._file(OFFSETS_FILE)
+        offsets = np.fromfile(offsets_path, dtype=np.uint64, count=self.count) if os.path.exists(offsets_path) \
+            else np.zeros(0, dtype=np.uint64)
+        if len(offsets) < self.count:
+            raise ValueError(f"索引目录 '{self.path}' 的偏移表只有 {len(offsets)} 条，少于 {self.count} 条记录。")
+        records_end = 0
+        if self.count:
+            with open(self._file(RECORDS_FILE), 'rb') as f:
+                f.seek(int(offsets[-1]))
+                records_end = int(offsets[-1]) + len(f.readline())
+        for name, size in ((VECTORS_FILE, self.count * self.dim * 4), (RECORDS_FILE, records_end),
+                           (OFFSETS_FILE, self.count * 8)):
+            file_path = self._file(name)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                with open(file_path, 'r+b') as f:
+                    f.truncate(size)
+        return offsets
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def save(self):
+        """原子地写入索引信息文件。"""
+        info_path = self._file(INFO_FILE)
+        tmp_path = info_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'count': self.count, 'embedder': self.embedder_name,
+                       'generation': self.generation}, f)
+        os.replace(tmp_path, info_path)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """全部向量组成的只读内存映射矩阵，形状为 (count, dim)。"""
+        if self._vectors is None or self._vectors.shape[0] != self.count:
+            if self.count == 0:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r',
+                                      shape=(self.count, self.dim))
+        return self._vectors
+
+    def add_vectors(self, vectors: np.ndarray, records: List[dict]):
+        """
+        追加向量及其对应的记录。向量会被归一化为单位长度。
+
+        Args:
+            vectors: 形状为 (n, dim) 的矩阵。
+            records: n 条可序列化为 JSON 的记录，通常包含 content 和 metadata。
+        """
+        vectors = normalize_rows(vectors)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度应为 {self.dim}，实际为 {vectors.shape}。")
+        if len(records) != vectors.shape[0]:
+            raise ValueError("向量数与记录数不一致。")
+
+        with open(self._file(VECTORS_FILE), 'ab') as f:
+            f.write(vectors.tobytes())
+
+        offsets = np.empty(len(records), dtype=np.uint64)
+        with open(self._file(RECORDS_FILE), 'ab') as f:
+            position = f.tell()
+            for i, record in enumerate(records):
+                offsets[i] = position
+                line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+                f.write(line)
+                position += len(line)
+        with open(self._file(OFFSETS_FILE), 'ab') as f:
+            f.write(offsets.tobytes())
+
+        self._offsets = np.concatenate([self._offsets, offsets])
+        self.count += len(records)
+        self.generation += 1
+        self.save()
+
+    def add(self, chunks: Iterable, embedder: Embedder, batch_size: int = 256,
+            cache: Optional[EmbeddingCache] = None) -> int:
+        """
+        分批嵌入并追加 MarkdownHeaderTextSplitter 产出的块，返回追加的块数。
+
+        Args:
+            chunks: 带有 content 和 metadata 属性的块。
+            embedder: 嵌入模型，同一个索引只能使用同一个模型。
+            batch_size: 每批嵌入的块数。
+            cache: 可选，嵌入缓存；重建索引时只有缓存中没有的块才交给嵌入模型。
+        """
+        if self.embedder_name is None:
+            self.embedder_name = embedder.name
+        elif self.embedder_name != embedder.name:
+            raise ValueError(f"索引使用的嵌入模型是 '{self.embedder_name}'，不能混用 '{embedder.name}'。")
+
+        added = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                added += self._add_batch(batch, embedder, cache)
+                batch = []
+        if batch:
+            added += self._add_batch(batch, embedder, cache)
+        return added
+
+    def _add_batch(self, batch: List, embedder: Embedder, cache: Optional[EmbeddingCache] = None) -> int:
+        texts = [chunk.content for chunk in batch]
+        vectors = cache.embed(embedder, texts) if cache is not None else embedder.embed(texts)
+        records = [{'content': chunk.content, 'metadata': chunk.metadata} for chunk in batch]
+        self.add_vectors(vectors, records)
+        return len(batch)
+
+    def record(self, i: int) -> dict:
+        """按编号读取一条记录。"""
+        with open(self._file(RECORDS_FILE), 'rb') as f:
+            f.seek(int(self._offsets[i]))
+            return json.loads(f.readline())
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索与查询向量余弦相似度最高的 k 个向量。
+
+        Args:
+            queries: 形状为 (dim,) 或 (q, dim) 的查询向量。
+            k: 返回的结果数。
+            nprobe: 使用 IVF 近似检索时探查的倒排列表数；为 None 或未建立 IVF 时做精确检索。
+            allowed: 可选，升序的候选编号（例如 MetadataCatalog.chunk_ids 的结果），
+                只对这些向量做精确检索，此时忽略 nprobe。
+
+        Returns:
+            (scores, ids) 两个形状为 (q, k) 的矩阵，按得分从高到低排列。
+            结果不足 k 个时，ids 用 -1 填充。
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        k = min(k, self.count if allowed is None else len(allowed))
+        if k == 0:
+            return np.zeros((queries.shape[0], 0), np.float32), np.zeros((queries.shape[0], 0), np.int64)
+        if allowed is not None:
+            return self._search_allowed(queries, k, np.asarray(allowed, dtype=np.int64))
+        if nprobe is not None and self._ivf is not None:
+            return self._search_ivf(queries, k, nprobe)
+        return self._search_exact(queries, k)
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = self.vectors
+        best_scores = np.full((queries.shape[0], 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((queries.shape[0], 0), dtype=np.int64)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores = queries @ block.T
+            ids = np.broadcast_to(np.arange(start, start + block.shape[0], dtype=np.int64), scores.shape)
+            best_scores, best_ids = _top_k(np.hstack([best_scores, scores]), np.hstack([best_ids, ids]), k)
+        return best_scores, best_ids
+
+    def _search_allowed(self, queries: np.ndarray, k: int, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = self.vectors
+        best_scores = np.full((queries.shape[0], 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((queries.shape[0], 0), dtype=np.int64)
+        for start in range(0, len(allowed), SEARCH_BLOCK_ROWS):
+            ids = allowed[start:start + SEARCH_BLOCK_ROWS]
+            scores = queries @ vectors[ids].T
+            best_scores, best_ids = _top_k(np.hstack([best_scores, scores]),
+                                           np.hstack([best_ids, np.broadcast_to(ids, scores.shape)]), k)
+        return best_scores, best_ids
+
+    def _search_ivf(self, queries: np.ndarray, k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = self.vectors
+        centroids = self._ivf['centroids']
+        list_offsets = self._ivf['list_offsets']
+        list_ids = self._ivf['list_ids']
+        indexed = int(self._ivf['indexed_count'])
+        nprobe = min(nprobe, centroids.shape[0])
+        # 建立 IVF 之后追加的向量不在倒排列表中，对它们做精确检索
+        tail = np.arange(indexed, self.count, dtype=np.int64)
+
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        all_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        all_ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        for qi, query in enumerate(queries):
+            candidates = np.concatenate(
+                [list_ids[list_offsets[p]:list_offsets[p + 1]] for p in probes[qi]] + [tail])
+            if candidates.size == 0:
+                continue
+            candidates.sort()  # 按顺序读取内存映射，减少随机访问
+            scores = vectors[candidates] @ query
+            top_scores, top_ids = _top_k(scores[None, :], candidates[None, :], k)
+            all_scores[qi, :top_scores.shape[1]] = top_scores[0]
+            all_ids[qi, :top_ids.shape[1]] = top_ids[0]
+        return all_scores, all_ids
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10,
+                  sample_size: int = 100000, seed: int = 0):
+        """
+        用球面 k-means 对向量聚类，建立 IVF 倒排列表并保存到索引目录。
+
+        Args:
+            n_lists: 倒排列表（聚类中心）数，默认约为 4 * sqrt(count)。
+            iterations: k-means 迭代次数。
+            sample_size: 训练聚类中心时使用的采样向量数。
+            seed: 随机种子。
+        """
+        if self.count == 0:
+            return
+        vectors = self.vectors
+        n_lists = n_lists or max(1, int(4 * np.sqrt(self.count)))
+        n_lists = min(n_lists, self.count)
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        sample = np.asarray(vectors[sample_ids])
+
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            # 空的聚类中心重新随机选取一个样本
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assign = np.concatenate([self._assign(np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS]), centroids)
+                                 for start in range(0, self.count, SEARCH_BLOCK_ROWS)])
+        list_ids = np.argsort(assign, kind='stable').astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        self._ivf = {
+            'centroids': centroids.astype(np.float32),
+            'list_offsets': list_offsets,
+            'list_ids': list_ids,
+            'indexed_count': np.int64(self.count),
+        }
+        np.savez(self._file(IVF_FILE), **self._ivf)
+        self.generation += 1
+        self.save()
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """把每个向量分配给内积最大的聚类中心，分块计算以限制内存。"""
+        block = max(1024, (1 << 25) // centroids.shape[0])
+        return np.concatenate([np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+                               for start in range(0, vectors.shape[0], block)])
+
+    def search_text(self, query: str, embedder: Embedder, k: int = 10, nprobe: Optional[int] = None,
+                    allowed: Optional[np.ndarray] = None) -> List[Tuple[float, dict]]:
+        """嵌入查询文本并检索，返回 (得分, 记录) 列表。"""
+        scores, ids = self.search(embedder.embed([query]), k, nprobe, allowed)
+        return [(float(score), self.record(int(i))) for score, i in zip(scores[0], ids[0]) if i >= 0]
@@ -0,0 +1,245 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+
+from embedding import Embedder
+
+MAX_ENTRIES = 1024          # 缓存的查询数上限，超出时淘汰最久未使用的
+TTL_SECONDS = 3600.0        # 缓存项的有效期
+SIMILARITY_THRESHOLD = 0.95  # 语义缓存命中所需的最低余弦相似度，随嵌入模型调整
+
+# 查询首尾的标点和空白，去掉后“公租房申请？”与“公租房申请”视为同一查询
+EDGE_PUNCTUATION = " \t\r\n　？?！!。.，,；;：:、"
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# 查询中的数字：阿拉伯数字（含小数），以及“第”之后或年、月、季度等量词之前的中文数字，
+# 不匹配“进一步”“统一”这类词中的汉字
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?"
+                            r"|第[零〇一二三四五六七八九十百千万两]+"
+                            r"|[零〇一二三四五六七八九十百千万亿两]+(?=[年月日季期届次号批项条款章节])")
+
+
+def query_numbers(key: str) -> tuple:
+    """规范化后查询中依次出现的数字，如年份、期数、金额。"""
+    return tuple(NUMBER_PATTERN.findall(key))
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询：全角转半角（NFKC）、英文转小写、合并连续空白、去掉首尾的标点。"""
+    query = unicodedata.normalize('NFKC', query).lower()
+    return WHITESPACE_PATTERN.sub(" ", query).strip(EDGE_PUNCTUATION)
+
+
+@dataclass
+class _Entry:
+    value: object
+    slot: int       # 查询向量在 _vectors 中的行号，没有嵌入模型时为 -1
+    expires: float
+    cost: float     # 计算该结果用去的秒数，命中时计入节省的时间
+
+
+class QueryCache:
+    """
+    两级查询缓存，线程安全：
+
+    1. 精确缓存：以规范化后的查询为键的 LRU；
+    2. 语义缓存：精确缓存未命中时嵌入查询，与已缓存查询的向量做一次矩阵乘法，
+       余弦相似度不低于 threshold、且其中的数字与查询完全相同的最相似查询视为命中。
+       只差年份或数字的两个查询（“2023年度工作报告”与“2024年度工作报告”）向量几乎相同，
+       却需要不同的材料，因此数字不同时不命中。
+
+    缓存项超过 ttl 秒后失效，总数超过 max_entries 时淘汰最久未使用的。
+    给出 generation 时，每次查询前调用它，返回值变化（例如索引被重建）则清空缓存。
+    命中时返回的是缓存中的同一个对象，调用方不应修改它。
+
+    Args:
+        embedder: 可选，嵌入模型；为 None 时只使用精确缓存。
+        max_entries: 缓存的查询数上限。
+        ttl: 缓存项的有效期（秒）。
+        threshold: 语义缓存命中所需的最低余弦相似度。
+        generation: 可选，返回数据版本的函数，如 lambda: vector_index.generation。
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, max_entries: int = MAX_ENTRIES,
+                 ttl: float = TTL_SECONDS, threshold: float = SIMILARITY_THRESHOLD,
+                 generation: Optional[Callable[[], Hashable]] = None, clock: Callable[[], float] = time.monotonic):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.generation = generation
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._generation = generation() if generation is not None else None
+        # 语义缓存：每个槽位一行查询向量；空闲或已过期的槽位 _expires 为 -inf 或早于当前时间
+        self._vectors = np.zeros((max_entries, embedder.dim), dtype=np.float32) if embedder is not None else None
+        self._expires = np.full(max_entries, -np.inf)
+        self._keys = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._stats = dict.fromkeys(("lookups", "exact_hits", "semantic_hits", "misses",
+                                     "evictions", "expirations", "invalidations"), 0)
+        self._saved_seconds = 0.0
+        self._lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._expires[:] = -np.inf
+        self._keys = [None] * self.max_entries
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_generation(self):
+        if self.generation is None:
+            return
+        current = self.generation()
+        if current != self._generation:
+            self._generation = current
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.slot >= 0:
+            self._expires[entry.slot] = -np.inf
+            self._keys[entry.slot] = None
+            self._free.append(entry.slot)
+
+    def _hit(self, key: str, kind: str, start: float):
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        self._stats[kind] += 1
+        elapsed = self.clock() - start
+        self._lookup_seconds += elapsed
+        self._saved_seconds += max(0.0, entry.cost - elapsed)
+        return entry.value
+
+    def _lookup_exact(self, key: str, now: float) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry.expires <= now:
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return False
+        return True
+
+    def _lookup_semantic(self, key: str, vector: np.ndarray, now: float) -> Optional[str]:
+        if not self._entries:
+            return None
+        scores = self._vectors @ vector
+        scores[self._expires <= now] = -np.inf
+        numbers = query_numbers(key)
+        # 按相似度从高到低检查达到阈值的候选，取第一个数字相同的
+        candidates = np.flatnonzero(scores >= self.threshold)
+        for slot in candidates[np.argsort(-scores[candidates], kind='stable')]:
+            match = self._keys[slot]
+            if query_numbers(match) == numbers:
+                return match
+        return None
+
+    def get(self, query: str):
+        """查找查询的缓存结果，未命中时返回 None。"""
+        return self.lookup(query)[0]
+
+    def lookup(self, query: str):
+        """
+        查找查询的缓存结果。
+
+        Returns:
+            (结果, 查询向量)。未命中时结果为 None；查询向量在做过语义查找时给出，
+            可以交给检索复用，避免再嵌入一次，否则为 None。
+        """
+        start = self.clock()
+        key = normalize_query(query)
+        with self._lock:
+            self._check_generation()
+            self._stats["lookups"] += 1
+            if self._lookup_exact(key, start):
+                return self._hit(key, "exact_hits", start), None
+        if self.embedder is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None, None
+        # 嵌入可能较慢，在锁外进行
+        vector = self.embedder.embed([key])[0]
+        with self._lock:
+            match = self._lookup_semantic(key, vector, self.clock())
+            if match is not None:
+                return self._hit(match, "semantic_hits", start), vector
+            self._stats["misses"] += 1
+            self._lookup_seconds += self.clock() - start
+        return None, vector
+
+    def put(self, query: str, value, vector: Optional[np.ndarray] = None, cost: float = 0.0):
+        """
+        缓存查询的结果。
+
+        Args:
+            query: 查询。
+            value: 结果，不能为 None。
+            vector: 可选，lookup 返回的查询向量；有嵌入模型而未给出时重新嵌入。
+            cost: 计算该结果用去的秒数，用于统计节省的时间。
+        """
+        key = normalize_query(query)
+        if self.embedder is not None and vector is None:
+            vector = self.embedder.embed([key])[0]
+        with self._lock:
+            self._check_generation()
+            self._insert(key, value, vector, cost)
+
+    def _insert(self, key: str, value, vector: Optional[np.ndarray], cost: float):
+        if key in self._entries:
+            self._remove(key)
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+        expires = self.clock() + self.ttl
+        slot = -1
+        if vector is not None:
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._expires[slot] = expires
+            self._keys[slot] = key
+        self._entries[key] = _Entry(value, slot, expires, cost)
+
+    def get_or_compute(self, query: str, compute: Callable[[str, Optional[np.ndarray]], object]):
+        """
+        命中时返回缓存的结果，否则调用 compute(query, 查询向量) 计算并缓存。
+        计算期间数据版本发生变化时，结果照常返回但不写入缓存。
+        """
+        value, vector = self.lookup(query)
+        if value is not None:
+            return value
+        generation = self._generation
+        start = self.clock()
+        value = compute(query, vector)
+        cost = self.clock() - start
+        with self._lock:
+            self._check_generation()
+            if value is not None and self._generation == generation:
+                self._insert(normalize_query(query), value, vector, cost)
+        return value
+
+    def stats(self) -> dict:
+        """命中率和节省时间等统计。saved_seconds 为命中项原本的计算耗时减去查找耗时之和。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["saved_seconds"] = self._saved_seconds
+            stats["lookup_seconds"] = self._lookup_seconds
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from bm25 import BM25Index, hybrid_search
+from embedding import Embedder, HashingEmbedder
+from index import VectorIndex
+from query_cache import MAX_ENTRIES, SIMILARITY_THRESHOLD, TTL_SECONDS, QueryCache
+
+# --- 系统指令 (Prompt) ---
+SYSTEM_PROMPT = """
+你是一位经验丰富的公文写作助手。请根据用户给出的主题，参考下面提供的单位已发布文章和政策文件，撰写一篇公文初稿。
+
+请严格遵守以下规则：
+1.  **依据材料**：事实、数据、政策条款只能来自参考材料，材料中没有的内容不要编造。
+2.  **格式统一**：使用 Markdown，`#` 为标题，`##`、`###` 为各级小标题，语言规范、简洁。
+3.  **纯净输出**：只输出初稿正文，不要包含任何额外的解释、评论或前言。
+
+# 单位已发布文章
+{articles}
+
+# 政策文件
+{policies}
+"""
+
+MODEL_NAME = "glm-4"
+TEMPERATURE = 0.3
+# 多个 API Key 用逗号分隔时只使用第一个
+API_KEY = os.getenv("ZHIPUAI_API_KEY", "").split(",")[0].strip() or None
+# 可指向本地的 OpenAI 兼容服务，用于离线测试
+API_BASE = os.getenv("ZHIPUAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
+
+# --- 各阶段的时间预算（秒） ---
+RETRIEVAL_TIMEOUT = 1.0      # 全部检索的时限，超时的检索源被跳过，不阻塞生成
+FIRST_TOKEN_TIMEOUT = 10.0   # 从等待生成名额（或直接请求模型）到收到第一个 token 的时限
+GENERATION_TIMEOUT = 120.0   # 从请求模型到生成结束的时限
+
+RETRIEVAL_K = 5              # 每个检索源取回的片段数
+MAX_CONTEXT_CHARS = 6000     # 放入提示词的参考材料总字数上限
+RETRIEVAL_WORKERS = 4        # 每个检索源的检索线程数；检索主要是 numpy 运算，会释放 GIL
+
+# 检索源：输入主题，返回至多 k 条带 content 和 metadata 的记录
+Retriever = Callable[[str], List[dict]]
+
+
+class StageTimeoutError(asyncio.TimeoutError):
+    """某个阶段超出了时间预算。stage 为阶段名。"""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"阶段 '{stage}' 超过 {timeout:.1f} 秒未完成。")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class IndexRetriever:
+    """
+    在 VectorIndex 上检索的检索源；同时给出 BM25Index 时做混合检索。
+    单位文章的块索引和本地政策文件库都可以用它包装。
+
+    Args:
+        vector_index: 向量索引。
+        embedder: 建立向量索引时使用的嵌入模型。
+        bm25: 可选，与向量索引按相同顺序加入同一批块的关键词索引。
+        k: 返回的记录数。
+        nprobe: 传给向量检索的 IVF 探查列表数。
+    """
+
+    def __init__(self, vector_index: VectorIndex, embedder: Embedder, bm25: Optional[BM25Index] = None,
+                 k: int = RETRIEVAL_K, nprobe: Optional[int] = None):
+        self.vector_index = vector_index
+        self.embedder = embedder
+        self.bm25 = bm25
+        self.k = k
+        self.nprobe = nprobe
+
+    @property
+    def generation(self):
+        """索引的版本，任一索引追加了块或重建后都会变化。"""
+        return self.vector_index.generation, len(self.bm25) if self.bm25 is not None else 0
+
+    def __call__(self, query: str, query_vector: Optional[np.ndarray] = None) -> List[dict]:
+        """检索主题。query_vector 为可选的已嵌入好的查询向量。"""
+        if self.bm25 is not None:
+            hits = hybrid_search(self.bm25, self.vector_index, self.embedder, query, self.k, nprobe=self.nprobe,
+                                 query_vector=query_vector)
+            return [dict(self.vector_index.record(i), score=score) for i, score in hits]
+        if query_vector is None:
+            query_vector = self.embedder.embed([query])
+        scores, ids = self.vector_index.search(query_vector, self.k, self.nprobe)
+        return [dict(self.vector_index.record(int(i)), score=float(score))
+                for score, i in zip(scores[0], ids[0]) if i >= 0]
+
+
+class CachedRetriever:
+    """
+    给 IndexRetriever 加上 QueryCache：相同或相近的主题直接返回缓存的检索结果，
+    语义缓存未命中时，查找时算出的查询向量交给检索复用。索引追加块或重建 IVF 后缓存自动清空。
+
+    Args:
+        retriever: 被缓存的检索源。
+        max_entries / ttl / threshold: 见 QueryCache。
+    """
+
+    def __init__(self, retriever: IndexRetriever, max_entries: int = MAX_ENTRIES,
+                 ttl: float = TTL_SECONDS, threshold: float = SIMILARITY_THRESHOLD):
+        self.retriever = retriever
+        self.cache = QueryCache(retriever.embedder, max_entries, ttl, threshold,
+                                generation=lambda: retriever.generation)
+
+    def __call__(self, query: str) -> List[dict]:
+        return self.cache.get_or_compute(query, self.retriever)
+
+
+def create_llm(api_key: Optional[str] = API_KEY, api_base: str = API_BASE,
+               model: str = MODEL_NAME) -> ChatOpenAI:
+    """创建流式输出的模型客户端。超时由 DraftService 按阶段控制，因此关闭客户端自带的重试。"""
+    return ChatOpenAI(
+        temperature=TEMPERATURE,
+        model=model,
+        openai_api_key=api_key,
+        openai_api_base=api_base,
+        streaming=True,
+        max_retries=0,
+    )
+
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("user", "主题：{topic}"),
+    ])
+
+
+def format_context(records: List[dict], budget: int) -> str:
+    """把检索到的记录编号拼接成参考材料，总字数不超过 budget。"""
+    parts = []
+    for i, record in enumerate(records, start=1):
+        title = record.get('metadata', {}).get('title', '')
+        text = f"[{i}] {title}\n{record['content']}".strip()
+        if len(text) > budget:
+            break
+        parts.append(text)
+        budget -= len(text)
+    return "\n\n".join(parts) if parts else "（无）"
+
+
+@dataclass
+class DraftReport:
+    """一次生成请求各阶段的耗时（秒，均从请求开始计时或为阶段自身耗时）。"""
+    topic: str
+    retrieval: Dict[str, float] = field(default_factory=dict)  # 各检索源的耗时
+    retrieval_timeouts: List[str] = field(default_factory=list)  # 超时被跳过的检索源
+    retrieved: Dict[str, int] = field(default_factory=dict)  # 各检索源返回的记录数
+    retrieval_total: Optional[float] = None  # 检索阶段的总耗时
+    queue: Optional[float] = None  # 等待生成名额的耗时，只在限制了并发生成数时记录
+    first_token: Optional[float] = None  # 从请求开始到第一个 token
+    generation: Optional[float] = None  # 从请求模型到生成结束
+    total: Optional[float] = None
+    tokens: int = 0
+    error: Optional[str] = None
+    cancelled: bool = False  # 调用方提前停止读取或请求被取消，不算作失败
+
+    def stages(self) -> Dict[str, float]:
+        """扁平化的阶段耗时，供 LatencyRecorder 汇总。"""
+        stages = {f"retrieval.{name}": seconds for name, seconds in self.retrieval.items()}
+        for name in ("retrieval_total", "queue", "first_token", "generation", "total"):
+            value = getattr(self, name)
+            if value is not None:
+                stages[name] = value
+        return stages
+
+
+class LatencyRecorder:
+    """汇总多次请求的各阶段耗时，报告 p50/p95。"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.retrieval_timeouts = 0
+
+    def record(self, report: DraftReport):
+        self.requests += 1
+        self.failures += report.error is not None
+        self.cancelled += report.cancelled
+        self.retrieval_timeouts += len(report.retrieval_timeouts)
+        for stage, seconds in report.stages().items():
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def percentiles(self, q: float) -> Dict[str, float]:
+        return {stage: float(np.percentile(values, q)) for stage, values in self.samples.items()}
+
+    def report(self) -> str:
+        lines = [f"共 {self.requests} 次请求，失败 {self.failures} 次，提前取消 {self.cancelled} 次，"
+                 f"检索超时 {self.retrieval_timeouts} 次。"]
+        p50, p95 = self.percentiles(50), self.percentiles(95)
+        for stage in sorted(self.samples):
+            lines.append(f"  {stage:<24} p50 {p50[stage] * 1e3:8.1f}ms  p95 {p95[stage] * 1e3:8.1f}ms")
+        return "\n".join(lines)
+
+
+class DraftStream:
+    """
+    一次生成请求的流式结果：用 async for 逐个取得 token，结束后（包括出错时）report 中有各阶段耗时。
+    """
+
+    def __init__(self, service: "DraftService", topic: str):
+        self.report = DraftReport(topic)
+        self._tokens = service._generate(topic, self.report)
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._tokens
+
+    async def text(self) -> str:
+        """读取全部 token 并拼接为全文。"""
+        return "".join([token async for token in self._tokens])
+
+
+class DraftService:
+    """
+    “输入主题 → 检索 → 生成初稿”的异步服务。
+
+    各检索源在线程池中并发检索，超过 retrieval_timeout 的检索源被跳过；
+    随后以流式方式请求模型，逐个产出 token。超过 first_token_timeout 仍未收到第一个 token
+    （限制了并发生成数时从开始等待生成名额算起）、或模型超过 generation_timeout 仍未生成完毕时
+    抛出 StageTimeoutError。
+    每次请求的各阶段耗时写入 DraftStream.report，并汇总到 latency。
+
+    Args:
+        retrievers: 检索源名称到检索函数的映射，约定 "articles" 为单位文章，"policies" 为政策文件。
+        llm: 支持 astream 的模型客户端，默认用 create_llm 创建。
+        retrieval_timeout / first_token_timeout / generation_timeout: 各阶段的时间预算（秒）。
+        max_context_chars: 放入提示词的参考材料总字数上限，由各检索源平分。
+        max_concurrent_generations: 可选，同时请求模型的上限，超出的请求排队等待，排队时间计入 first_token_timeout。
+        retrieval_workers: 每个检索源的检索线程数。
+    """
+
+    def __init__(self, retrievers: Dict[str, Retriever], llm=None,
+                 retrieval_timeout: float = RETRIEVAL_TIMEOUT,
+                 first_token_timeout: float = FIRST_TOKEN_TIMEOUT,
+                 generation_timeout: float = GENERATION_TIMEOUT,
+                 max_context_chars: int = MAX_CONTEXT_CHARS,
+                 max_concurrent_generations: Optional[int] = None,
+                 retrieval_workers: int = RETRIEVAL_WORKERS):
+        self.retrievers = retrievers
+        self.prompt = build_prompt()
+        self.llm = llm if llm is not None else create_llm()
+        self.retrieval_timeout = retrieval_timeout
+        self.first_token_timeout = first_token_timeout
+        self.generation_timeout = generation_timeout
+        self.max_context_chars = max_context_chars
+        self._generation_slots = asyncio.Semaphore(max_concurrent_generations) \
+            if max_concurrent_generations else None
+        # 每个检索源使用各自的线程池：超时的检索仍占着线程，不能让慢的检索源挤占其他检索源的线程
+        self._executors = {name: ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix=f"retrieval-{name}")
+                           for name in retrievers}
+        self.latency = LatencyRecorder()
+
+    def cache_stats(self) -> Dict[str, dict]:
+        """各个带缓存的检索源的命中率和节省时间。"""
+        return {name: retriever.cache.stats() for name, retriever in self.retrievers.items()
+                if isinstance(retriever, CachedRetriever)}
+
+    def draft(self, topic: str) -> DraftStream:
+        """开始为主题生成初稿，返回流式结果。"""
+        return DraftStream(self, topic)
+
+    async def retrieve(self, topic: str, report: DraftReport) -> Dict[str, List[dict]]:
+        """并发调用全部检索源，返回在时限内完成的结果；超时或出错的检索源结果为空。"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        async def run(name: str, retriever: Retriever) -> List[dict]:
+            records = await loop.run_in_executor(self._executors[name], retriever, topic)
+            report.retrieval[name] = time.perf_counter() - start
+            return records
+
+        tasks = {name: asyncio.ensure_future(run(name, retriever)) for name, retriever in self.retrievers.items()}
+        if tasks:
+            # asyncio.wait 不接受空集合，没有配置检索源时直接生成
+            await asyncio.wait(tasks.values(), timeout=self.retrieval_timeout)
+        results = {}
+        for name, task in tasks.items():
+            if not task.done():
+                # 线程中的检索无法中断，只是不再等待它的结果
+                task.cancel()
+                report.retrieval_timeouts.append(name)
+                results[name] = []
+            elif task.exception() is not None:
+                print(f"检索源 '{name}' 出错: {task.exception()}", file=sys.stderr)
+                results[name] = []
+            else:
+                results[name] = task.result()
+            report.retrieved[name] = len(results[name])
+        report.retrieval_total = time.perf_counter() - start
+        return results
+
+    def build_inputs(self, topic: str, results: Dict[str, List[dict]]) -> dict:
+        budget = self.max_context_chars // max(1, len(results))
+        return {
+            'topic': topic,
+            'articles': format_context(results.get('articles', []), budget),
+            'policies': format_context(results.get('policies', []), budget),
+        }
+
+    async def _generate(self, topic: str, report: DraftReport) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        try:
+            results = await self.retrieve(topic, report)
+            inputs = self.build_inputs(topic, results)
+            # 排队等待生成名额的时间计入首个 token 的时间预算
+            first_token_deadline = time.perf_counter() + self.first_token_timeout
+            if self._generation_slots is not None:
+                queue_start = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self._generation_slots.acquire(), timeout=self.first_token_timeout)
+                except asyncio.TimeoutError:
+                    raise StageTimeoutError("first_token", self.first_token_timeout) from None
+                finally:
+                    report.queue = time.perf_counter() - queue_start
+            tokens = self._stream_llm(inputs, report, start, first_token_deadline)
+            try:
+                async for token in tokens:
+                    yield token
+            finally:
+                # 调用方提前停止读取时也立即关闭模型的流并归还名额
+                await tokens.aclose()
+                if self._generation_slots is not None:
+                    self._generation_slots.release()
+        except (GeneratorExit, asyncio.CancelledError):
+            report.cancelled = True
+            raise
+        except BaseException as e:
+            report.error = type(e).__name__
+            raise
+        finally:
+            report.total = time.perf_counter() - start
+            self.latency.record(report)
+
+    async def _stream_llm(self, inputs: dict, report: DraftReport, start: float,
+                          first_token_deadline: float) -> AsyncIterator[str]:
+        llm_start = time.perf_counter()
+        deadline = llm_start + self.generation_timeout
+        # 先填好提示词再直接流式调用模型，不经过 prompt | llm 的 RunnableSequence，每个 token 的开销少约三分之一
+        stream = self.llm.astream(self.prompt.format_messages(**inputs)).__aiter__()
+        try:
+            while True:
+                if report.first_token is None:
+                    stage, timeout = "first_token", first_token_deadline - time.perf_counter()
+                else:
+                    stage, timeout = "generation", deadline - time.perf_counter()
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(0.0, timeout))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise StageTimeoutError(stage, self.first_token_timeout if stage == "first_token"
+                                            else self.generation_timeout) from None
+                if not chunk.content:
+                    continue
+                if report.first_token is None:
+                    report.first_token = time.perf_counter() - start
+                report.tokens += 1
+                yield chunk.content
+        finally:
+            report.generation = time.perf_counter() - llm_start
+            await stream.aclose()
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+
+async def _main(args):
+    retrievers = {}
+    embedder = HashingEmbedder(args.dim)
+    if args.index:
+        bm25 = BM25Index(args.bm25) if args.bm25 else None
+        retrievers['articles'] = IndexRetriever(VectorIndex(args.index), embedder, bm25, args.k, args.nprobe)
+    if args.policy_index:
+        retrievers['policies'] = IndexRetriever(VectorIndex(args.policy_index), embedder, k=args.k)
+    service = DraftService(retrievers)
+    stream = service.draft(args.topic)
+    try:
+        async for token in stream:
+            print(token, end="", flush=True)
+    finally:
+        print()
+        service.close()
+        report = stream.report
+        # 中途出错或被中断时部分阶段没有耗时
+        print(f"\n检索 {report.retrieval_total * 1e3 if report.retrieval_total is not None else float('nan'):.0f}ms "
+              f"{report.retrieved}，"
+              f"首个 token {report.first_token * 1e3 if report.first_token is not None else float('nan'):.0f}ms，"
+              f"总耗时 {report.total if report.total is not None else float('nan'):.1f}s，"
+              f"共 {report.tokens} 个 token。", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="输入主题，检索参考材料并流式生成公文初稿。")
+    parser.add_argument("topic", help="初稿主题")
+    parser.add_argument("--index", default="vector_index", help="单位文章的向量索引目录")
+    parser.add_argument("--bm25", default=None, help="可选，单位文章的 BM25 索引目录，指定时做混合检索")
+    parser.add_argument("--policy-index", default=None, help="可选，政策文件的向量索引目录")
+    parser.add_argument("--dim", type=int, default=256, help="HashingEmbedder 的维度")
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K, help="每个检索源取回的片段数")
+    parser.add_argument("--nprobe", type=int, default=None, help="IVF 探查列表数")
+    args = parser.parse_args()
+
+    if API_KEY is None:
+        print("错误：环境变量 ZHIPUAI_API_KEY 未设置。请先设置API Key。", file=sys.stderr)
+    else:
+        asyncio.run(_main(args))
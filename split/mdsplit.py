@@ -5,23 +5,94 @@
 # BSD 3-Clause License
 
 
-import yaml #  yaml 
-import re #  re 
-import copy #  copy 
-from typing import (Dict, List, Optional, Tuple, TypedDict, Callable, Union) #  Union
-from dataclasses import dataclass, field
+import yaml # 导入 yaml 库
+import re # 导入 re 库
+import bisect # 导入 bisect 库
+from array import array
+from typing import (Dict, List, Optional, Tuple, TypedDict, Callable, Union, Iterable, Iterator) # 添加 Union
+import sys
 
+from token_length import TokenCounter, Tokenizer
 
-# --- ݽṹͶ ---
 
-@dataclass
+# --- 数据结构和类型定义 ---
+
+# 标题路径：按层级排列的 (标题名称, 标题文本) 元组
+HeaderPath = Tuple[Tuple[str, str], ...]
+
 class Chunk:
-    """ڴ洢ıƬμԪݵࡣ"""
-    content: str = ''
-    metadata: dict = field(default_factory=dict)
+    """用于存储文本片段及相关元数据的类。
+
+    为了在大量块之间节省内存，块不保存自己的正文副本和元数据字典：
+    正文以 (source, start, end) 偏移引用源文本，访问 content 时才切片；
+    元数据由共享的基础元数据和驻留（intern）的标题路径元组组成，第一次访问 metadata 时才合并。
+    合并得到的字典缓存在块中，之后每次访问返回同一个字典，对它的修改会保留下来；
+    之后再修改 headers 或共享的 base_metadata 不会反映到已经合并的字典中。
+    """
+    __slots__ = ("_source", "_start", "_end", "headers", "base_metadata", "_metadata")
+
+    def __init__(self, content: str = '', metadata: Optional[dict] = None):
+        self._source = content
+        self._start = 0
+        self._end = len(content)
+        self.headers: HeaderPath = ()
+        self.base_metadata = metadata if metadata is not None else {}
+        self._metadata: Optional[dict] = None
+
+    @classmethod
+    def from_span(cls, source: str, start: int, end: int,
+                  headers: HeaderPath = (), base_metadata: Optional[dict] = None) -> "Chunk":
+        """创建引用 source[start:end] 的块，不复制正文。"""
+        chunk = cls.__new__(cls)
+        chunk._source = source
+        chunk._start = start
+        chunk._end = end
+        chunk.headers = headers
+        chunk.base_metadata = base_metadata if base_metadata is not None else {}
+        chunk._metadata = None
+        return chunk
+
+    @property
+    def content(self) -> str:
+        return self._source[self._start:self._end]
+
+    @content.setter
+    def content(self, value: str):
+        self._source = value
+        self._start = 0
+        self._end = len(value)
+
+    @property
+    def source(self) -> str:
+        """块正文所引用的源文本。"""
+        return self._source
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        """块正文在源文本中的 (start, end) 偏移。"""
+        return self._start, self._end
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            metadata = dict(self.base_metadata)
+            metadata.update(self.headers)
+            self._metadata = metadata
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: dict):
+        self.base_metadata = value
+        self.headers = ()
+        self._metadata = None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Chunk):
+            return NotImplemented
+        return self.content == other.content and self.metadata == other.metadata
 
     def __str__(self) -> str:
-        """д __str__ ʹ content  metadata"""
+        """重写 __str__ 方法，使其仅包含 content 和 metadata。"""
         if self.metadata:
             return f"content='{self.content}' metadata={self.metadata}"
         else:
@@ -31,37 +102,133 @@ class Chunk:
         return self.__str__()
 
     def to_markdown(self, return_all: bool = False) -> str:
-        """תΪ Markdown ʽ
+        """将块转换为 Markdown 格式。
 
         Args:
-            return_all: Ϊ Trueǰ YAML ʽԪݡ
+            return_all: 如果为 True，则在内容前包含 YAML 格式的元数据。
 
         Returns:
-            Markdown ʽַ
+            Markdown 格式的字符串。
         """
         md_string = ""
         if return_all and self.metadata:
-            # ʹ yaml.dump ԪݸʽΪ YAML ַ
-            # allow_unicode=True ȷַȷʾ
-            # sort_keys=False ԭʼ˳
+            # 使用 yaml.dump 将元数据格式化为 YAML 字符串
+            # allow_unicode=True 确保中文字符正确显示
+            # sort_keys=False 保持原始顺序
             metadata_yaml = yaml.dump(self.metadata, allow_unicode=True, sort_keys=False)
             md_string += f"---\n{metadata_yaml}---\n\n"
         md_string += self.content
         return md_string
 
 class LineType(TypedDict):
-    """ͣʹֵ䶨塣"""
-    metadata: Dict[str, str] # Ԫֵ
-    content: str # 
+    """行类型，使用类型字典定义。"""
+    metadata: HeaderPath # 驻留的标题路径
+    content: str # 行内容
+    start: Optional[int] # 内容在整个文档中的起始偏移，无法用偏移表示时为 None
+    end: int # 内容在整个文档中的结束偏移
+    kinds: array # 内容中每一行的类别，见 LineLexer
+    lengths: Optional[array] # 内容中每一行的长度贡献，未设置 chunk_size 时为 None
 
 class HeaderType(TypedDict):
-    """ͣʹֵ䶨塣"""
-    level: int # ⼶
-    name: str #  (, 'Header 1')
-    data: str # ı
+    """标题类型，使用类型字典定义。"""
+    level: int # 标题级别
+    name: str # 标题名称 (例如, 'Header 1')
+    data: str # 标题文本内容
+
+# --- 行的类别 ---
+LINE_TEXT = 0        # 代码块外的普通文本行
+LINE_BLANK = 1       # 代码块外的空行
+LINE_HEADER = 2      # 代码块外的标题行
+LINE_FENCE_OPEN = 3  # 代码块的起始围栏
+LINE_FENCE_CLOSE = 4 # 代码块的结束围栏
+LINE_CODE = 5        # 代码块内的非空行
+LINE_CODE_BLANK = 6  # 代码块内的空行
+
+class LineLexer:
+    """逐行分类 Markdown，并按需计算每行的长度贡献。
+
+    代码围栏和标题只在这里识别：按标题分节、按大小细分和计算非代码长度都使用它的结果，
+    每行只做一次 strip 和前缀判断。标题按行首连续 `#` 的个数查表，不再逐个尝试 headers_to_split_on。
+
+    长度贡献是该行计入 chunk_size 的长度：代码块外的行和结束围栏为 length_function(行) + 1（含换行符），
+    起始围栏和代码块内的行为 0。
+    """
+    __slots__ = ("_headers", "_header_runs", "_length_function", "_fence")
+
+    def __init__(self, headers_to_split_on: List[Tuple[str, str]],
+                 length_function: Optional[Callable[[str], int]] = None):
+        self._headers = headers_to_split_on
+        # 标题前缀都是若干个 `#` 时，按 `#` 的个数查出它在 headers_to_split_on 中的下标
+        self._header_runs: Optional[Dict[int, int]] = None
+        if all(sep and sep == "#" * len(sep) for sep, _ in headers_to_split_on):
+            self._header_runs = {}
+            for i, (sep, _) in enumerate(headers_to_split_on):
+                self._header_runs.setdefault(len(sep), i)
+        self._length_function = length_function
+        self._fence: Optional[str] = None # 当前所在代码块的围栏，不在代码块内时为 None
+
+    def _header_index(self, stripped: str) -> int:
+        """返回标题行匹配的 headers_to_split_on 下标，不是标题时返回 -1。"""
+        if self._header_runs is not None:
+            if stripped[0] != "#":
+                return -1
+            run = len(stripped) - len(stripped.lstrip("#"))
+            index = self._header_runs.get(run, -1)
+            if index >= 0 and run < len(stripped) and stripped[run] != " ":
+                return -1
+            return index
+        for i, (sep, _) in enumerate(self._headers):
+            if stripped.startswith(sep) and (len(stripped) == len(sep) or stripped[len(sep)] == " "):
+                return i
+        return -1
+
+    def lex(self, line: str) -> Tuple[int, int, int]:
+        """分类一行，返回 (类别, 标题下标, 长度贡献)。
+
+        不是标题时标题下标为 -1；未指定 length_function 时长度贡献为 0。
+        """
+        stripped = line.strip()
+        if self._fence is not None:
+            if stripped.startswith(self._fence):
+                self._fence = None
+                kind = LINE_FENCE_CLOSE
+            else:
+                return (LINE_CODE if stripped else LINE_CODE_BLANK), -1, 0
+        elif not stripped:
+            kind = LINE_BLANK
+        elif stripped[0] in "`~" and stripped.startswith(("```", "~~~")) and stripped.count(stripped[:3]) == 1:
+            self._fence = stripped[:3]
+            return LINE_FENCE_OPEN, -1, 0
+        else:
+            header = self._header_index(stripped)
+            if header >= 0:
+                length = self._length_function(line) + 1 if self._length_function is not None else 0
+                return LINE_HEADER, header, length
+            kind = LINE_TEXT
+        length = self._length_function(line) + 1 if self._length_function is not None else 0
+        return kind, -1, length
+
+    def lex_lines(self, lines: Iterable[str]) -> Tuple[array, array]:
+        """分类若干行，返回每行的类别和长度贡献两个紧凑数组。"""
+        kinds = array("B")
+        lengths = array("q")
+        for line in lines:
+            kind, _, length = self.lex(line)
+            kinds.append(kind)
+            lengths.append(length)
+        return kinds, lengths
+
+# 不计入 chunk_size 的行
+_UNMEASURED_KINDS = frozenset((LINE_FENCE_OPEN, LINE_CODE, LINE_CODE_BLANK))
+
+def non_code_length(kinds: array, lengths: array) -> int:
+    """由 LineLexer 的结果计算若干行以换行符连接后的非代码长度：最后一行的换行符不计入。"""
+    if not kinds:
+        return 0
+    return sum(lengths) - (1 if lengths[-1] > 0 else 0)
 
 class MarkdownHeaderTextSplitter:
-    """ָıָ Markdown ļѡظ chunk_size һϸ֡"""
+    """基于指定的标题分割 Markdown 文件，并可选地根据 chunk_size 进一步细分。"""
 
     def __init__(
         self,
@@ -74,23 +241,24 @@ class MarkdownHeaderTextSplitter:
             ("######", "h6"),
         ],
         strip_headers: bool = False,
-        chunk_size: Optional[int] = None, #  chunk_size 
-        length_function: Callable[[str], int] = len, #  length_function 
-        separators: Optional[List[str]] = None, #  separators 
-        is_separator_regex: bool = False, #  is_separator_regex 
+        chunk_size: Optional[int] = None, # 添加 chunk_size 参数
+        length_function: Callable[[str], int] = len, # 添加 length_function 参数
+        separators: Optional[List[str]] = None, # 添加 separators 参数
+        is_separator_regex: bool = False, # 添加 is_separator_regex 参数
     ):
-        """һµ MarkdownHeaderTextSplitter
+        """创建一个新的 MarkdownHeaderTextSplitter。
 
         Args:
-            headers_to_split_on: ڷָı⼶Ԫб
-            strip_headers: ǷӿƳС
-            chunk_size: ǴݳȡãһָĿ顣
-            length_function: ڼıȵĺ
-            separators: ڷָķָбȼӸߵ͡
-            is_separator_regex: Ƿ񽫷ָΪʽ
+            headers_to_split_on: 用于分割的标题级别和名称元组列表。
+            strip_headers: 是否从块内容中移除标题行。
+            chunk_size: 块的最大非代码内容长度。如果设置，将进一步分割超出的块。
+            length_function: 用于计算文本长度的函数。
+            separators: 用于分割的分隔符列表，优先级从高到低。
+                超出 chunk_size 的单行会按这些分隔符递归切分。
+            is_separator_regex: 是否将分隔符视为正则表达式。默认分隔符总是按正则表达式处理。
         """
         if chunk_size is not None and chunk_size <= 0:
-            raise ValueError("chunk_size  None")
+            raise ValueError("chunk_size 必须是正整数或 None。")
 
         self.headers_to_split_on = sorted(
             headers_to_split_on, key=lambda split: len(split[0]), reverse=True
@@ -98,331 +266,508 @@ class MarkdownHeaderTextSplitter:
         self.strip_headers = strip_headers
         self._chunk_size = chunk_size
         self._length_function = length_function
-        # ĬϷָȶ䣬λ
+        # 设置默认分隔符，优先段落，其次换行
         self._separators = separators or [
-            "\n\n",  # 
-            "\n",    # 
-            "||",  # ľĩ
-            "\.\s|\!\s|\?\s", # Ӣľĩӿո
-            "|;\s",  # ֺ
-            "|,\s"   # 
+            "\n\n",  # 段落
+            "\n",    # 行
+            "。|！|？",  # 中文句末标点
+            r"\.\s|\!\s|\?\s", # 英文句末标点加空格
+            r"；|;\s",  # 分号
+            r"，|,\s"   # 逗号
         ]
         self._is_separator_regex = is_separator_regex
-        # ԤʽҪ
-        self._compiled_separators = None
-        if self._is_separator_regex:
-            self._compiled_separators = [re.compile(s) for s in self._separators]
+        # 把所有分隔符预编译成一个组合正则，每个分隔符一个命名分组 s0, s1, ...，
+        # 分组顺序即优先级。扫描一遍文本即可得到所有切分点及其级别。
+        patterns = [
+            sep if (is_separator_regex or separators is None) else re.escape(sep)
+            for sep in self._separators
+        ]
+        self._separator_scanner = re.compile(
+            "|".join(f"(?P<s{level}>{pattern})" for level, pattern in enumerate(patterns))
+        )
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer: Tokenizer, chunk_size: int, max_entries: Optional[int] = None,
+                       **kwargs) -> "MarkdownHeaderTextSplitter":
+        """创建按 token 数计算块大小的分割器。
+
+        Args:
+            tokenizer: 与嵌入模型一致的分词器，如 VocabTokenizer 或 TiktokenTokenizer。
+            chunk_size: 块的最大非代码 token 数，一般取嵌入模型的最大输入长度。
+            max_entries: 可选，行长度缓存的文本数上限。
+            **kwargs: 传给构造函数的其他参数。
+
+        每行分词一次并缓存，块的长度为各行 token 数之和，每个换行符计为一个 token。
+        """
+        counter = TokenCounter(tokenizer) if max_entries is None else TokenCounter(tokenizer, max_entries)
+        return cls(chunk_size=chunk_size, length_function=counter, **kwargs)
+
+    def _new_lexer(self) -> LineLexer:
+        """创建行词法分析器；设置了 chunk_size 时同时计算每行的长度贡献。"""
+        measure = self._chunk_size is not None
+        return LineLexer(self.headers_to_split_on, self._length_function if measure else None)
+
+    def _measure_lines(self, lines: List[str], kinds: array) -> array:
+        """按 LineLexer 的规则一次计算若干行的长度贡献，非代码行交给 length_function.count_batch 批量计数。"""
+        lengths = array("q", bytes(8 * len(kinds)))
+        measured = [i for i, kind in enumerate(kinds) if kind not in _UNMEASURED_KINDS]
+        counts = self._length_function.count_batch([lines[i] for i in measured])
+        for i, count in zip(measured, counts):
+            lengths[i] = count + 1
+        return lengths
 
     def _calculate_length_excluding_code(self, text: str) -> int:
-        """ıȣݡ"""
-        total_length = 0
-        last_end = 0
-        # ʽ ```...```  ~~~...~~~ 
-        # ʹ÷̰ƥ .*?
-        for match in re.finditer(r"(?:```|~~~).*?\n(?:.*?)(?:```|~~~)", text, re.DOTALL | re.MULTILINE):
-            start, end = match.span()
-            # Ӵ˴֮ǰı
-            total_length += self._length_function(text[last_end:start])
-            last_end = end
-        # һ֮ı
-        total_length += self._length_function(text[last_end:])
-        return total_length
-
-    def _find_best_split_point(self, lines: List[str]) -> int:
-        """бвѷָ㣨
-
-        ѰҶָзǵз
-        Ӻǰңطָ *֮* һ
-        Ҳʵķָ㣨ֻһУ -1
+        """计算文本长度，不包括代码块内容。与按大小细分时一样逐行计算，见 LineLexer。"""
+        lexer = LineLexer(self.headers_to_split_on, self._length_function)
+        return non_code_length(*lexer.lex_lines(text.split("\n")))
+
+    def _split_text_by_separators(self, text: str, limit: int) -> List[str]:
+        """按分隔符优先级递归切分超长文本，使每个片段的长度不超过 limit。
+
+        分隔符保留在其前一个片段的末尾，所有片段按顺序拼接后与原文完全相同。
+        组合正则只扫描一次文本，各级递归都复用这次扫描得到的切分点。
         """
-        if len(lines) <= 1:
-            return -1
-
-        # ȲҶָ "\n\n"
-        # Ӧһ
-        for i in range(len(lines) - 2, 0, -1): # ӵڶǰҵڶ
-            if not lines[i].strip() and lines[i+1].strip(): # ǰǿУһв
-                 # ǰһҲǿУȷǶķָ
-                 if i > 0 and lines[i-1].strip():
-                     return i + 1 # ڿָ֮
-
-        # ûҵָһзָ
-        # ڵڶָ֮
-        if len(lines) > 1:
-             return len(lines) - 1 # ڵڶָ֮һиһ飩
-
-        return -1 # >1ܻҵзΪ
-
-    def _split_chunk_by_size(self, chunk: Chunk) -> List[Chunk]:
-        """ chunk_size ĿָɸСĿ飬ʹ÷ָ"""
-        if self._chunk_size is None: # δ chunk_size򲻷ָ
+        positions = []
+        levels = []
+        for match in self._separator_scanner.finditer(text):
+            if match.end() > match.start():
+                positions.append(match.end())
+                levels.append(int(match.lastgroup[1:]))
+        pieces: List[str] = []
+        self._split_span(text, 0, len(text), positions, levels, limit, pieces)
+        return pieces
+
+    def _split_span(self, text: str, start: int, end: int, positions: List[int],
+                    levels: List[int], limit: int, pieces: List[str]):
+        """把 text[start:end] 切分后追加到 pieces 中。"""
+        if self._length_function(text[start:end]) <= limit:
+            pieces.append(text[start:end])
+            return
+
+        lo = bisect.bisect_right(positions, start)
+        hi = bisect.bisect_left(positions, end)
+        if lo >= hi:
+            # 没有任何分隔符，只能按字符硬切
+            pos = start
+            while pos < end:
+                cut = min(pos + limit, end)
+                # 按 token 计数时 limit 个字符可能超过 limit 个 token，二分找出不超出的最长前缀
+                if self._length_function(text[pos:cut]) > limit:
+                    lo, hi = pos + 1, cut - 1
+                    while lo < hi:
+                        mid = (lo + hi + 1) // 2
+                        if self._length_function(text[pos:mid]) <= limit:
+                            lo = mid
+                        else:
+                            hi = mid - 1
+                    cut = lo
+                pieces.append(text[pos:cut])
+                pos = cut
+            return
+
+        # 使用区间内出现的最高优先级分隔符，把区间切成若干单元
+        level = min(levels[lo:hi])
+        cuts = [positions[i] for i in range(lo, hi) if levels[i] == level]
+        cuts.append(end)
+
+        # 贪心合并相邻单元，仍然超长的单元用更低优先级的分隔符继续切分
+        merged_start = start
+        merged_len = 0
+        unit_start = start
+        for cut in cuts:
+            unit_len = self._length_function(text[unit_start:cut])
+            if unit_len > limit:
+                if unit_start > merged_start:
+                    pieces.append(text[merged_start:unit_start])
+                self._split_span(text, unit_start, cut, positions, levels, limit, pieces)
+                merged_start = cut
+                merged_len = 0
+            elif merged_len + unit_len > limit:
+                pieces.append(text[merged_start:unit_start])
+                merged_start = unit_start
+                merged_len = unit_len
+            else:
+                merged_len += unit_len
+            unit_start = cut
+        if end > merged_start:
+            pieces.append(text[merged_start:end])
+
+    def _split_chunk_by_size(self, chunk: Chunk, kinds: Optional[array] = None,
+                             lengths: Optional[array] = None) -> List[Chunk]:
+        """将超出 chunk_size 的块分割成更小的块，优先在段落边界分割。
+
+        块按行扫描，每行是一个片段；本身就超出 chunk_size 的普通文本行
+        会先按分隔符优先级切成多个片段，片段之间不补换行符。标题行不切分。
+        在段落边界分割后，留下的片段加上当前片段仍超出 chunk_size 时，留下的片段单独成块，
+        因此只要没有单个片段超出，每个子块的非代码长度都不超过 chunk_size。
+        窗口长度的计法与旧版相同：分割后重新开始的窗口不计最后一行的行尾换行符，
+        所以没有超长行、旧版也不产生超长块时，分块结果与旧版逐块一致。
+        当前子块始终是片段序列中的一个连续窗口 [window_start, seg_idx)，
+        因此用片段长度的前缀和得到窗口长度，并在扫描时记录最近的段落边界，
+        每次分割都不需要重新拼接和扫描已累积的内容，整个块的开销为 O(行数)。
+        子块以偏移引用原块的源文本，不复制正文。
+
+        kinds 和 lengths 为 LineLexer 对块内各行的分类和长度贡献，分节时已经算出；
+        未给出时在这里对块的内容重新分析。
+        """
+        if self._chunk_size is None: # 如果未设置 chunk_size，则不分割
              return [chunk]
 
         sub_chunks = []
-        current_lines = []
+        text = chunk.content
+        source, base_offset = chunk.source, chunk.span[0]
+        lines = text.split('\n')
+        if kinds is None or lengths is None:
+            kinds, lengths = self._new_lexer().lex_lines(lines)
+        # seg_offsets[i] 为第 i 个片段在块内的起始偏移（行尾片段包含换行符）
+        seg_offsets = [0]
+        ends_line: List[bool] = []
+        # prefix_len[i] 为前 i 个片段的长度贡献之和
+        prefix_len = [0]
+        window_start = 0
+        # 最近一个段落分隔空行的片段下标：该行为空，且前后两个片段都不为空
+        last_paragraph_break = -1
         current_non_code_len = 0
-        in_code = False
-        code_fence = None
-        lines = chunk.content.split('\n')
-
-        for line_idx, line in enumerate(lines):
-            stripped_line = line.strip()
-            is_entering_code = False
-            is_exiting_code = False
-
-            # --- ߽ ---
-            if not in_code:
-                if stripped_line.startswith("```") and stripped_line.count("```") == 1:
-                    is_entering_code = True; code_fence = "```"
-                elif stripped_line.startswith("~~~") and stripped_line.count("~~~") == 1:
-                    is_entering_code = True; code_fence = "~~~"
-            elif in_code and code_fence is not None and stripped_line.startswith(code_fence):
-                is_exiting_code = True
-            # --- ߽ ---
-
-            # --- гȹ ---
-            line_len_contribution = 0
-            if not in_code and not is_entering_code:
-                line_len_contribution = self._length_function(line) + 1 # +1 for newline
-            elif is_exiting_code:
-                line_len_contribution = self._length_function(line) + 1
-            # --- гȹ׽ ---
-
-            # --- ǷҪָ ---
-            split_needed = (
-                line_len_contribution > 0 and
-                current_non_code_len + line_len_contribution > self._chunk_size and
-                current_lines # ݲָܷ
-            )
-
-            if split_needed:
-                # ҵѷָ
-                split_line_idx = self._find_best_split_point(current_lines)
-
-                if split_line_idx != -1 and split_line_idx > 0: # ȷڵһоͷָ
-                    lines_to_chunk = current_lines[:split_line_idx]
-                    remaining_lines = current_lines[split_line_idx:]
-
-                    # һӿ
-                    content = "\n".join(lines_to_chunk)
-                    sub_chunks.append(Chunk(content=content, metadata=chunk.metadata.copy()))
-
-                    # ʼµӿ飬ʣк͵ǰ
-                    current_lines = remaining_lines + [line]
-                    # ¼ current_lines ķǴ볤
-                    current_non_code_len = self._calculate_length_excluding_code("\n".join(current_lines))
-
-                else: # Ҳõķָ current_lines ִ̫̣Ӳָ
-                    content = "\n".join(current_lines)
-                    sub_chunks.append(Chunk(content=content, metadata=chunk.metadata.copy()))
-                    current_lines = [line]
-                    current_non_code_len = line_len_contribution if not is_entering_code else 0
-
-            else: # Ҫָӵǰӿ
-                current_lines.append(line)
-                if line_len_contribution > 0:
-                    current_non_code_len += line_len_contribution
-            # --- ǷҪָ ---
-
-
-            # --- ´״̬ ---
-            if is_entering_code: in_code = True
-            elif is_exiting_code: in_code = False; code_fence = None
-            # --- ´״̬ ---
-
-        # һӿ
-        if current_lines:
-            content = "\n".join(current_lines)
-            # һǷ񳬳ֻһԪص
-            final_non_code_len = self._calculate_length_excluding_code(content)
-            if final_non_code_len > self._chunk_size and len(sub_chunks) > 0:
-                 # һ鳬ҲΨһĿ飬Ҫ⴦
-                 # 򵥵ʹ
-                 pass # logger.warning(f"Final chunk exceeds chunk_size: {final_non_code_len} > {self._chunk_size}")
-            sub_chunks.append(Chunk(content=content, metadata=chunk.metadata.copy()))
+        # 窗口长度是否未计入最后一个片段的行尾换行符（分割后重新开始的窗口）
+        newline_uncounted = False
+        # 窗口已满时紧跟其后的第一个代码行的片段下标，见下文
+        full_before_code = -1
+        prev_blank = False
+        prev_prev_blank = False
+        # 切分超长行时给行尾换行符留出一个长度
+        piece_limit = max(1, self._chunk_size - 1)
+
+        def window_span(start: int, end: int) -> Tuple[int, int]:
+            # 窗口内容不含最后一个片段的行尾换行符
+            return seg_offsets[start], seg_offsets[end] - (1 if ends_line[end - 1] else 0)
+
+        def make_sub_chunk(start: int, end: int) -> Chunk:
+            span_start, span_end = window_span(start, end)
+            return Chunk.from_span(source, base_offset + span_start, base_offset + span_end,
+                                   chunk.headers, chunk.base_metadata)
+
+        for line, kind, line_len_contribution in zip(lines, kinds, lengths):
+            # --- 超长的普通文本行按分隔符切成多个片段；标题行不切，整行作为一个片段 ---
+            if line_len_contribution > self._chunk_size and kind == LINE_TEXT:
+                pieces = self._split_text_by_separators(line, piece_limit)
+                line_pieces = [(piece, self._length_function(piece), not piece.strip()) for piece in pieces[:-1]]
+                line_pieces.append((pieces[-1], self._length_function(pieces[-1]) + 1, not pieces[-1].strip()))
+            else:
+                line_pieces = [(line, line_len_contribution, kind == LINE_BLANK or kind == LINE_CODE_BLANK)]
+
+            for piece_idx, (piece, contribution, is_blank) in enumerate(line_pieces):
+                is_line_end = piece_idx == len(line_pieces) - 1
+                seg_idx = len(ends_line)
+                seg_offsets.append(seg_offsets[-1] + len(piece) + (1 if is_line_end else 0))
+                ends_line.append(is_line_end)
+                prefix_len.append(prefix_len[-1] + contribution)
+
+                # --- 检查是否需要分割 ---
+                # 行中间的片段不含换行符，需要补上前一行未计入的行尾换行符
+                cost = contribution + (1 if newline_uncounted and not is_line_end else 0)
+                split_needed = (
+                    contribution > 0 and
+                    current_non_code_len + cost > self._chunk_size and
+                    seg_idx > window_start # 必须已有内容才能分割
+                )
+
+                if split_needed:
+                    if seg_idx - window_start > 1:
+                        # 优先在窗口内最近的段落边界（空行之后）分割，
+                        # 否则在窗口最后一个片段之前分割，把它留给下一个子块
+                        if last_paragraph_break > window_start:
+                            split_at = last_paragraph_break + 1
+                        else:
+                            split_at = seg_idx - 1
+                        if window_start < full_before_code < split_at:
+                            # 不能把代码行之前的换行符留在这个子块中
+                            split_at = full_before_code
+                        full_before_code = -1
+
+                        sub_chunks.append(make_sub_chunk(window_start, split_at))
+
+                        # 开始新的子块，包含剩余片段和当前片段。与旧版重新计算拼接后的内容一样，
+                        # 不计最后一个片段的行尾换行符
+                        window_start = split_at
+                        current_non_code_len = prefix_len[seg_idx + 1] - prefix_len[window_start]
+                        newline_uncounted = is_line_end
+                        if newline_uncounted:
+                            current_non_code_len -= 1
+                        if current_non_code_len > self._chunk_size:
+                            # 留下的片段加上当前片段仍然超出，留下的片段单独成块
+                            sub_chunks.append(make_sub_chunk(window_start, seg_idx))
+                            window_start = seg_idx
+                            current_non_code_len = contribution - (1 if newline_uncounted else 0)
+
+                    else: # 当前子块只有一个片段，执行硬分割
+                        sub_chunks.append(make_sub_chunk(window_start, seg_idx))
+                        window_start = seg_idx
+                        # 这个片段是上面单独成块后留下的，旧版此时仍把它和当前片段一起重新计算长度
+                        newline_uncounted = newline_uncounted and is_line_end
+                        current_non_code_len = contribution - (1 if newline_uncounted else 0)
+
+                elif contribution > 0: # 不需要分割，当前片段留在窗口中
+                    current_non_code_len += cost
+                    newline_uncounted = newline_uncounted and is_line_end
+                elif (newline_uncounted and seg_idx > window_start and full_before_code < window_start
+                      and current_non_code_len >= self._chunk_size):
+                    # 不计长度的代码行跟在未计入的行尾换行符之后，这个换行符会留在子块中。
+                    # 结束围栏计入长度时会补上它，但窗口已满，子块若在结束围栏之前结束就会超出一个长度
+                    full_before_code = seg_idx
+                # --- 检查是否需要分割结束 ---
+
+                # --- 记录段落边界 ---
+                if seg_idx >= 2 and prev_blank and not is_blank and not prev_prev_blank:
+                    last_paragraph_break = seg_idx - 1
+                prev_prev_blank, prev_blank = prev_blank, is_blank
+
+        # 添加最后一个子块
+        if window_start < full_before_code:
+            # 代码块没有结束围栏，同样在代码行之前分割
+            sub_chunks.append(make_sub_chunk(window_start, full_before_code))
+            window_start = full_before_code
+        if window_start < len(ends_line):
+            sub_chunks.append(make_sub_chunk(window_start, len(ends_line)))
 
         return sub_chunks if sub_chunks else [chunk]
 
 
-    def _aggregate_lines_to_chunks(self, lines: List[LineType],
-                                   base_meta: dict) -> List[Chunk]:
-        """йͬԪݵкϲɿ顣"""
-        aggregated_chunks: List[LineType] = []
-
-        for line in lines:
-            if aggregated_chunks and aggregated_chunks[-1]["metadata"] == line["metadata"]:
-                # ׷ݣз
-                aggregated_chunks[-1]["content"] += "\n" + line["content"]
-            else:
-                # µľۺϿ飬ʹ copy ֹ޸Ӱ
-                aggregated_chunks.append(copy.deepcopy(line))
+    @staticmethod
+    def _iter_lines(file_or_lines: Union[str, Iterable[str]]) -> Iterator[str]:
+        """逐行产出不带换行符的行，与 text.split("\\n") 的结果一致。
 
-        final_chunks = []
-        for chunk_data in aggregated_chunks:
-            final_metadata = base_meta.copy()
-            final_metadata.update(chunk_data['metadata'])
-            # Ƴ strip()Ϊ _split_chunk_by_size Ҫԭʼз
-            final_chunks.append(
-                Chunk(content=chunk_data["content"], # Ƴ .strip()
-                      metadata=final_metadata)
-            )
-        return final_chunks
+        可以传入整个字符串，也可以传入文件对象等按行迭代的对象。
+        """
+        if isinstance(file_or_lines, str):
+            yield from file_or_lines.split("\n")
+            return
+        # 以换行符结尾（或为空）的输入，split 会在末尾多出一个空行
+        ends_with_newline = True
+        for line in file_or_lines:
+            ends_with_newline = line.endswith("\n")
+            yield line[:-1] if ends_with_newline else line
+        if ends_with_newline:
+            yield ""
+
+    @staticmethod
+    def _intern_headers(header_stack: List[HeaderType],
+                        header_paths: Dict[HeaderPath, HeaderPath]) -> HeaderPath:
+        """返回与标题栈对应的共享标题路径元组，同一文档中相同路径的块共用同一个对象。
+
+        标题文本用 sys.intern 驻留，不同文档中的相同标题也共享同一个字符串。
+        """
+        path = tuple(
+            header_paths.setdefault(pair, pair)
+            for pair in ((sys.intern(h["name"]), sys.intern(h["data"])) for h in header_stack)
+        )
+        return header_paths.setdefault(path, path)
 
+    def _iter_sections(self, lines: Iterable[str]) -> Iterator[LineType]:
+        """按标题切分行流，每遇到一个新标题就产出上一个小节。
 
-    def split_text(self, text: str, metadata: Optional[dict] = None) -> List[Chunk]:
-        """ڱָ Markdown ı chunk_size һϸ֡"""
-        base_metadata = metadata or {}
-        lines = text.split("\n")
-        lines_with_metadata: List[LineType] = []
+        同时记录小节内容在整个文档（各行以换行符连接）中的偏移，
+        以及 LineLexer 给出的每行类别和长度贡献，按大小细分时不再重新分析。
+        """
         current_content: List[str] = []
-        current_metadata: Dict[str, str] = {}
+        current_metadata: HeaderPath = ()
         header_stack: List[HeaderType] = []
+        header_paths: Dict[HeaderPath, HeaderPath] = {}
+        # 当前行在文档中的起始偏移，以及当前小节的起止偏移
+        offset = 0
+        section_start = 0
+        section_end = 0
+
+        measure = self._chunk_size is not None
+        # length_function 支持批量计数（如 TokenCounter）时，小节结束后一次计算整个小节的行长度
+        count_batch = getattr(self._length_function, "count_batch", None) if measure else None
+        lexer = LineLexer(self.headers_to_split_on) if count_batch is not None else self._new_lexer()
+        current_kinds = array("B")
+        current_lengths = array("q") if measure else None
 
-        in_code_block = False
-        opening_fence = ""
-
-        for line_num, line in enumerate(lines):
-            stripped_line = line.strip()
-
-            # --- 鴦߼ʼ ---
-            # ǷǴ鿪ʼ
-            is_code_fence = False
-            if not in_code_block:
-                 if stripped_line.startswith("```") and stripped_line.count("```") == 1:
-                     in_code_block = True
-                     opening_fence = "```"
-                     is_code_fence = True
-                 elif stripped_line.startswith("~~~") and stripped_line.count("~~~") == 1:
-                     in_code_block = True
-                     opening_fence = "~~~"
-                     is_code_fence = True
-            # ǷƥĽ
-            elif in_code_block and opening_fence is not None and stripped_line.startswith(opening_fence):
-                 in_code_block = False
-                 opening_fence = ""
-                 is_code_fence = True
-            # --- 鴦߼ ---
-
-
-            # ڴڣ߽Уֱӵǰ
-            if in_code_block or is_code_fence:
-                current_content.append(line)
-                continue # һУ
-
-            # --- ⴦߼ʼ (ڴִ) ---
-            found_header = False
-            for sep, name in self.headers_to_split_on:
-                if stripped_line.startswith(sep) and (
-                    len(stripped_line) == len(sep) or stripped_line[len(sep)] == " "
-                ):
-                    found_header = True
-                    header_level = sep.count("#")
-                    header_data = stripped_line[len(sep):].strip()
-
-                    # ҵ±⣬ҵǰݣ֮ǰݾۺ
-                    if current_content:
-                        lines_with_metadata.append({
-                            "content": "\n".join(current_content),
-                            "metadata": current_metadata.copy(),
-                        })
-                        current_content = [] # 
-
-                    # ±ջ
-                    while header_stack and header_stack[-1]["level"] >= header_level:
-                        header_stack.pop()
-                    new_header: HeaderType = {"level": header_level, "name": name, "data": header_data}
-                    header_stack.append(new_header)
-                    current_metadata = {h["name"]: h["data"] for h in header_stack}
-
-                    # ⣬򽫱ӵݵĿʼ
-                    if not self.strip_headers:
-                        current_content.append(line)
-
-                    break # ҵƥ߼ֹͣ
-            # --- ⴦߼ ---
-
-            # ǱҲڴ
-            if not found_header:
-                 # ֻевΪջǰʱӣĵͷĿУ
-                 # ߱άָʽ
-                 if line.strip() or current_content:
+        for line in lines:
+            line_start = offset
+            offset += len(line) + 1
+            kind, header, length = lexer.lex(line)
+
+            # --- 标题处理逻辑开始 (代码块内的行不会被分类为标题) ---
+            if kind == LINE_HEADER:
+                sep, name = self.headers_to_split_on[header]
+                header_level = sep.count("#")
+                header_data = line.strip()[len(sep):].strip()
+
+                # 如果找到新标题，且当前有内容，则将之前的内容聚合
+                if current_content:
+                    yield {
+                        "content": "\n".join(current_content),
+                        "metadata": current_metadata,
+                        "start": section_start,
+                        "end": section_end,
+                        "kinds": current_kinds,
+                        "lengths": current_lengths if count_batch is None else
+                                   self._measure_lines(current_content, current_kinds),
+                    }
+                    current_content = [] # 重置内容
+                    current_kinds = array("B")
+                    current_lengths = array("q") if measure else None
+
+                # 更新标题栈
+                while header_stack and header_stack[-1]["level"] >= header_level:
+                    header_stack.pop()
+                new_header: HeaderType = {"level": header_level, "name": name, "data": header_data}
+                header_stack.append(new_header)
+                current_metadata = self._intern_headers(header_stack, header_paths)
+
+                # 如果不剥离标题，则将标题行添加到新内容的开始
+                if not self.strip_headers:
+                    section_start = line_start
                     current_content.append(line)
+                    current_kinds.append(kind)
+                    if measure:
+                        current_lengths.append(length)
+                    section_end = line_start + len(line)
+                continue
+            # --- 标题处理逻辑结束 ---
+
+            # 只有当行不为空或当前已有内容时才添加（避免添加小节开头的空行）
+            if kind != LINE_BLANK or current_content:
+                if not current_content:
+                    section_start = line_start
+                current_content.append(line)
+                current_kinds.append(kind)
+                if measure:
+                    current_lengths.append(length)
+                section_end = line_start + len(line)
 
-        # ĵĩβʣ
+        # 处理文档末尾剩余的内容
         if current_content:
-            lines_with_metadata.append({
+            yield {
                 "content": "\n".join(current_content),
-                "metadata": current_metadata.copy(),
-            })
+                "metadata": current_metadata,
+                "start": section_start,
+                "end": section_end,
+                "kinds": current_kinds,
+                "lengths": current_lengths if count_batch is None else
+                           self._measure_lines(current_content, current_kinds),
+            }
+
+    def _finalize_section(self, section: LineType, base_metadata: dict,
+                          document: Optional[str] = None) -> Tuple[Chunk, List[Chunk]]:
+        """为小节附加元数据，并在设置了 chunk_size 时进一步细分。
+
+        返回 (覆盖整个小节的块, 小节的子块列表)，小节未超出 chunk_size 时子块列表只含小节块本身。
+        传入整个文档时，块直接引用文档中的偏移；否则引用小节自身的文本。
+        """
+        # 这里不 strip()，因为后续的 _split_chunk_by_size 需要原始换行符
+        if document is not None and section["start"] is not None:
+            chunk = Chunk.from_span(document, section["start"], section["end"],
+                                    section["metadata"], base_metadata)
+        else:
+            content = section["content"]
+            chunk = Chunk.from_span(content, 0, len(content), section["metadata"], base_metadata)
 
-        # һڱۺϿ
-        aggregated_chunks = self._aggregate_lines_to_chunks(lines_with_metadata, base_meta=base_metadata)
+        # 检查块的非代码内容长度，超出大小时进行细分
+        kinds, lengths = section["kinds"], section["lengths"]
+        if self._chunk_size is not None and non_code_length(kinds, lengths) > self._chunk_size:
+            return chunk, self._split_chunk_by_size(chunk, kinds, lengths)
+        return chunk, [chunk]
 
-        # ڶ chunk_sizeһϸֿ
-        if self._chunk_size is None:
-            return aggregated_chunks # û chunk_sizeֱӷؾۺϿ
-        else:
-            final_chunks = []
-            for chunk in aggregated_chunks:
-                # ķǴݳ
-                non_code_len = self._calculate_length_excluding_code(chunk.content)
-
-                if non_code_len > self._chunk_size:
-                    # Сϸ
-                    split_sub_chunks = self._split_chunk_by_size(chunk)
-                    final_chunks.extend(split_sub_chunks)
+    def iter_split_sections(self, file_or_lines: Union[str, Iterable[str]],
+                            metadata: Optional[dict] = None) -> Iterator[Tuple[Chunk, List[Chunk]]]:
+        """流式分割 Markdown，按标题小节分组产出 (小节块, 小节的子块列表)。
+
+        子块以偏移引用小节块的源文本，可以据此建立 文档 → 小节 → 子块 的层级。
+
+        Args:
+            file_or_lines: 文件对象、行的可迭代对象或整个文本字符串。
+            metadata: 附加到每个块上的基础元数据。
+        """
+        # 同一文档的所有块共享一份基础元数据
+        base_metadata = dict(metadata) if metadata else {}
+        document = file_or_lines if isinstance(file_or_lines, str) else None
+        pending: Optional[LineType] = None
+        for section in self._iter_sections(self._iter_lines(file_or_lines)):
+            # 元数据相同的相邻小节合并为一个块
+            if pending is not None and pending["metadata"] == section["metadata"]:
+                pending["content"] += "\n" + section["content"]
+                pending["kinds"] += section["kinds"]
+                if pending["lengths"] is not None:
+                    pending["lengths"] += section["lengths"]
+                # 两个小节之间有被剥离的标题行时，合并后的内容不再是文档中连续的一段
+                if pending["start"] is not None and pending["end"] + 1 == section["start"]:
+                    pending["end"] = section["end"]
                 else:
-                    # δСֱ
-                    final_chunks.append(chunk)
-            return final_chunks
+                    pending["start"] = None
+                continue
+            if pending is not None:
+                yield self._finalize_section(pending, base_metadata, document)
+            pending = section
+        if pending is not None:
+            yield self._finalize_section(pending, base_metadata, document)
+
+    def iter_split(self, file_or_lines: Union[str, Iterable[str]],
+                   metadata: Optional[dict] = None) -> Iterator[Chunk]:
+        """流式分割 Markdown：逐行读取输入，每个标题小节结束时立即产出其中的块。
+
+        内存占用只与最大的小节有关，与整个文档的大小无关。
+
+        Args:
+            file_or_lines: 文件对象、行的可迭代对象或整个文本字符串。
+            metadata: 附加到每个块上的基础元数据。
+        """
+        for _, chunks in self.iter_split_sections(file_or_lines, metadata):
+            yield from chunks
+
+    def split_text(self, text: str, metadata: Optional[dict] = None) -> List[Chunk]:
+        """基于标题分割 Markdown 文本，并根据 chunk_size 进一步细分。"""
+        return list(self.iter_split(text, metadata))
 
 
-# --- Ҫִ / Կ ---
+# --- 主要执行 / 测试块 ---
 if __name__ == '__main__':
-    # Դ
+    # 测试代码块
     try:
-        #  article.md ļڽűͬĿ¼
+        # 假设 article.md 文件存在于脚本同目录下
         with open("article.md", "r", encoding="utf-8") as f:
             text = f.read()
 
-        #  1: ڱָ ( chunk_size)
-        # Ч: ɵĿ٣ÿӦһͼı䡣
-        #       ĴСܷǳȣЩܷǳ
-        #       ʼհıڡ
+        # 策略 1: 仅基于标题分割 (不设置 chunk_size)
+        # 效果: 生成的块数量较少，每个块对应一个最低级别的标题段落。
+        #       块的大小可能非常不均匀，有些块可能非常大。
+        #       代码块始终包含在它们所属的标题段落内。
         print("--- Splitting without chunk_size limit (Header-based only) ---")
         splitter_no_limit = MarkdownHeaderTextSplitter()
         chunks_no_limit = splitter_no_limit.split_text(text)
         print(f"Total chunks: {len(chunks_no_limit)}")
-        # ȡעԲ鿴ϸ
+        # 取消注释以查看详细输出
         # for chunk in chunks_no_limit:
         #     print(chunk.to_markdown(return_all=True))
         #     print("=" * 40)
 
         print("\n" + "===" * 20 + "\n")
 
-        #  2: ڱָȻ chunk_size ͷָһϸ
-        # Ч: ȰָȻڳ chunk_size Ŀ飬
-        #       ᳢ڸȻı߽磨 `\n\n` / `\n`Լ㣩зָ
-        #       ĿʹķǴݳȽӽ chunk_size
-        #       鱣ݲ chunk_size 㡣
-        #       ͨܲСȡʺϺ RAGĿ顣
+        # 策略 2: 基于标题分割，然后根据 chunk_size 和分隔符进一步细分
+        # 效果: 首先按标题分割，然后对于超出 chunk_size 的块，
+        #       会尝试在更自然的边界（如段落 `\n\n` 或句子/行 `\n`，以及其他标点）进行分割。
+        #       目标是使块的非代码内容长度接近但不超过 chunk_size。
+        #       代码块保持完整，并且其内容不计入 chunk_size 计算。
+        #       这通常能产生大小更均匀、更适合后续处理（如 RAG）的块。
         print("--- Splitting with chunk_size = 150 (Header-based + Size/Separator-based refinement) ---")
-        # ʹĬϷָ: ["\n\n", "\n", "", "", "", ". ", "! ", "? ", "", "; ", "", ", "]
-        #  is_separator_regex=True Դı
-        splitter_with_limit = MarkdownHeaderTextSplitter(chunk_size=150, is_separator_regex=True) # ע is_separator_regex=True ʹĬķָ
+        # 使用默认分隔符: ["\n\n", "\n", "。", "！", "？", ". ", "! ", "? ", "；", "; ", "，", ", "]
+        # 并启用 is_separator_regex=True 以处理中文标点等
+        splitter_with_limit = MarkdownHeaderTextSplitter(chunk_size=150, is_separator_regex=True) # 注意添加 is_separator_regex=True 以使用默认中文分隔符
         chunks_with_limit = splitter_with_limit.split_text(text)
         print(f"Total chunks: {len(chunks_with_limit)}")
         for i, chunk in enumerate(chunks_with_limit):
             print(f"--- Chunk {i+1} ---")
             non_code_len = splitter_with_limit._calculate_length_excluding_code(chunk.content)
             print(f"Content Length (Total): {len(chunk.content)}")
-            print(f"Content Length (Non-Code): {non_code_len}") # Ǵ볤Ƿӽ chunk_size
+            print(f"Content Length (Non-Code): {non_code_len}") # 检查非代码长度是否接近 chunk_size
             print(f"Metadata: {chunk.metadata}")
             # print("\n--- Markdown (Content Only) ---")
             # print(chunk.to_markdown())
             print("\n--- Markdown (With Metadata) ---")
             print(chunk.to_markdown(return_all=True))
-            print("====" * 20) # ̷ָԱ鿴
+            print("====" * 20) # 缩短分隔符以便查看更多块
 
     except FileNotFoundError:
         print("Error: article.md not found. Please create the file for testing.")
\ No newline at end of file
@@ -0,0 +1,203 @@
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from mdsplit import (LINE_BLANK, LINE_CODE, LINE_CODE_BLANK, LINE_FENCE_CLOSE, LINE_FENCE_OPEN, LINE_HEADER,
+                     Chunk, LineLexer, MarkdownHeaderTextSplitter)
+
+# 句末分隔符，与 MarkdownHeaderTextSplitter 默认分隔符中的中英文句末标点相同；行尾总是句子边界
+SENTENCE_PATTERN = re.compile(r"。|！|？|\.\s|\!\s|\?\s")
+BREAKPOINT_PERCENTILE = 90.0  # 相邻句子的余弦距离高于小节内该百分位数处切分
+MIN_SENTENCES = 4             # 句子数少于该值的小节不再细分
+BATCH_SIZE = 1024             # 每次交给嵌入模型的句子数
+
+Section = Tuple[Chunk, List[Chunk]]
+
+
+class SemanticSplitter:
+    """
+    语义分块：先按标题切分小节，再在小节内相邻句子的话题转变处切分。
+
+    小节按句末标点和行尾切成句子，代码块整体作为一个句子，标题行并入其后的句子。
+    多篇文档的句子攒够 batch_size 个后一次嵌入，所有相邻句子的余弦相似度由一次逐行内积得到；
+    每个小节内相邻句子的余弦距离高于该小节的 breakpoint_percentile 百分位数处切分。
+    产出的块与 MarkdownHeaderTextSplitter 一样以偏移引用文档原文，可以直接交给 HierarchyStore。
+
+    Args:
+        embedder: 嵌入模型，需要提供 embed(texts)，返回单位向量矩阵（见 rag/embedding.py）。
+        headers_to_split_on: 用于分割的标题级别和名称元组列表，默认同 MarkdownHeaderTextSplitter。
+        breakpoint_percentile: 切分点的百分位数，越小切得越碎。
+        min_sentences: 句子数少于该值的小节不再细分。
+        chunk_size: 可选，块的最大长度；语义切分后仍超出的块按句子贪心合并切分。
+        length_function: 计算 chunk_size 所用长度的函数。
+        batch_size: 每次交给嵌入模型的句子数。
+        strip_headers: 是否从块内容中移除标题行。
+    """
+
+    def __init__(self, embedder, headers_to_split_on: Optional[List[Tuple[str, str]]] = None,
+                 breakpoint_percentile: float = BREAKPOINT_PERCENTILE, min_sentences: int = MIN_SENTENCES,
+                 chunk_size: Optional[int] = None, length_function: Callable[[str], int] = len,
+                 batch_size: int = BATCH_SIZE, strip_headers: bool = False):
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError("chunk_size 必须是正整数或 None。")
+        self.embedder = embedder
+        self.breakpoint_percentile = breakpoint_percentile
+        self.min_sentences = max(2, min_sentences)
+        self.chunk_size = chunk_size
+        self.length_function = length_function
+        self.batch_size = batch_size
+        kwargs = {} if headers_to_split_on is None else {"headers_to_split_on": headers_to_split_on}
+        # 只用来按标题切分小节，不设置 chunk_size
+        self._sections = MarkdownHeaderTextSplitter(strip_headers=strip_headers, **kwargs)
+
+    def _sentence_bounds(self, text: str) -> List[int]:
+        """返回句子边界的偏移 [0, b1, ..., len(text)]，第 i 个句子为 text[bounds[i]:bounds[i + 1]]。"""
+        bounds = [0]
+        lexer = LineLexer(self._sections.headers_to_split_on)
+        offset = 0
+        end_of_text = len(text)
+        # 上一个边界之后是否已有未结束的句子（标题行或代码块）
+        open_unit = False
+        for line in text.split("\n"):
+            kind, _, _ = lexer.lex(line)
+            line_end = min(offset + len(line) + 1, end_of_text)
+            if kind == LINE_BLANK:
+                # 空行并入前一个句子
+                if not open_unit and len(bounds) > 1:
+                    bounds[-1] = line_end
+            elif kind in (LINE_HEADER, LINE_FENCE_OPEN, LINE_CODE, LINE_CODE_BLANK):
+                open_unit = True
+            elif kind == LINE_FENCE_CLOSE:
+                bounds.append(line_end)
+                open_unit = False
+            else:
+                for match in SENTENCE_PATTERN.finditer(line):
+                    if match.end() < len(line):
+                        bounds.append(offset + match.end())
+                bounds.append(line_end)
+                open_unit = False
+            offset = line_end
+        if bounds[-1] != end_of_text:
+            # 文本以标题行或未闭合的代码块结尾
+            bounds.append(end_of_text)
+        return bounds
+
+    def _thresholds(self, distances: np.ndarray, pair_sections: np.ndarray, pair_counts: np.ndarray) -> np.ndarray:
+        """
+        一次算出每个小节相邻句子余弦距离的 breakpoint_percentile 百分位数。
+
+        按 (小节, 距离) 排序后，每个小节的距离在排序结果中是连续的一段，
+        百分位数按与 np.percentile 默认方法相同的线性插值从中取出。
+        """
+        ordered = distances[np.lexsort((distances, pair_sections))]
+        starts = np.concatenate(([0], np.cumsum(pair_counts)[:-1]))
+        rank = (pair_counts - 1) * (self.breakpoint_percentile / 100.0)
+        lower = np.floor(rank).astype(np.int64)
+        upper = np.minimum(lower + 1, pair_counts - 1)
+        below, above = ordered[starts + lower], ordered[starts + upper]
+        return below + (above - below) * (rank - lower)
+
+    def _pack(self, source: str, units: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """语义切分后仍超出 chunk_size 的块，按句子贪心合并成不超过 chunk_size 的块。"""
+        packed = []
+        start, length = units[0][0], 0
+        for unit_start, unit_end in units:
+            unit_len = self.length_function(source[unit_start:unit_end])
+            if length and length + unit_len > self.chunk_size:
+                packed.append((start, unit_start))
+                start, length = unit_start, 0
+            length += unit_len
+        packed.append((start, units[-1][1]))
+        return packed
+
+    def _make_chunks(self, section: Chunk, bounds: List[int], cuts: Iterable[int]) -> List[Chunk]:
+        source, base = section.source, section.span[0]
+        spans = []
+        first = 0
+        for cut in list(cuts) + [len(bounds) - 2]:
+            units = [(base + bounds[i], base + bounds[i + 1]) for i in range(first, cut + 1)]
+            if self.chunk_size is not None and \
+                    self.length_function(source[units[0][0]:units[-1][1]]) > self.chunk_size:
+                spans.extend(self._pack(source, units))
+            else:
+                spans.append((units[0][0], units[-1][1]))
+            first = cut + 1
+        chunks = []
+        for start, end in spans:
+            # 去掉首尾的空白和换行，块的偏移仍指向原文
+            text = source[start:end]
+            start += len(text) - len(text.lstrip())
+            end -= len(text) - len(text.rstrip())
+            if end > start:
+                chunks.append(Chunk.from_span(source, start, end, section.headers, section.base_metadata))
+        return chunks or [section]
+
+    def _split_batch(self, documents: List[List[Section]], bounds: List[List[List[int]]]) -> List[List[Section]]:
+        """嵌入一批文档的所有句子，在每个小节内按相邻句子的余弦距离切分。"""
+        texts = []
+        counts = []
+        for sections, section_bounds in zip(documents, bounds):
+            for (section, _), b in zip(sections, section_bounds):
+                content = section.content
+                if len(b) - 1 >= self.min_sentences:
+                    texts.extend(content[b[i]:b[i + 1]].strip() for i in range(len(b) - 1))
+                    counts.append(len(b) - 1)
+        if texts:
+            vectors = np.concatenate([self.embedder.embed(texts[i:i + self.batch_size])
+                                      for i in range(0, len(texts), self.batch_size)])
+            # 一次算出所有相邻句子的余弦距离，只保留同一小节内的相邻对
+            section_ids = np.repeat(np.arange(len(counts)), counts)
+            same_section = section_ids[:-1] == section_ids[1:]
+            distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])[same_section]
+            pair_sections = section_ids[:-1][same_section]
+            pair_counts = np.asarray(counts) - 1
+            thresholds = self._thresholds(distances, pair_sections, pair_counts)
+            is_cut = distances > thresholds[pair_sections]
+            pair_starts = np.concatenate(([0], np.cumsum(pair_counts)))
+        results = []
+        k = 0
+        for sections, section_bounds in zip(documents, bounds):
+            split_sections = []
+            for (section, _), b in zip(sections, section_bounds):
+                if len(b) - 1 < self.min_sentences:
+                    split_sections.append((section, [section]))
+                    continue
+                cuts = np.flatnonzero(is_cut[pair_starts[k]:pair_starts[k + 1]])
+                k += 1
+                split_sections.append((section, self._make_chunks(section, b, cuts)))
+            results.append(split_sections)
+        return results
+
+    def iter_split_documents(self, documents: Iterable[Tuple[str, Optional[dict]]]) -> Iterator[List[Section]]:
+        """
+        分割多篇文档，按输入顺序为每篇文档产出 [(小节块, 小节的子块列表), ...]。
+
+        多篇文档的句子合并成 batch_size 个左右的批次一起嵌入，适合整个语料的批量分块。
+
+        Args:
+            documents: (文本, 元数据) 的可迭代对象。
+        """
+        pending: List[List[Section]] = []
+        pending_bounds: List[List[List[int]]] = []
+        pending_sentences = 0
+        for text, metadata in documents:
+            sections = list(self._sections.iter_split_sections(text, metadata))
+            section_bounds = [self._sentence_bounds(section.content) for section, _ in sections]
+            pending.append(sections)
+            pending_bounds.append(section_bounds)
+            pending_sentences += sum(len(b) - 1 for b in section_bounds)
+            if pending_sentences >= self.batch_size:
+                yield from self._split_batch(pending, pending_bounds)
+                pending, pending_bounds, pending_sentences = [], [], 0
+        if pending:
+            yield from self._split_batch(pending, pending_bounds)
+
+    def iter_split_sections(self, text: str, metadata: Optional[dict] = None) -> Iterator[Section]:
+        """分割一篇文档，产出 (小节块, 小节的子块列表)，与 MarkdownHeaderTextSplitter.iter_split_sections 相同。"""
+        for sections in self.iter_split_documents([(text, metadata)]):
+            yield from sections
+
+    def split_text(self, text: str, metadata: Optional[dict] = None) -> List[Chunk]:
+        """分割一篇文档，返回所有子块。"""
+        return [chunk for _, chunks in self.iter_split_sections(text, metadata) for chunk in chunks]
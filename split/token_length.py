@@ -0,0 +1,169 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # 只有使用 TiktokenTokenizer 时才需要
+    tiktoken = None
+
+# TokenCounter 默认缓存的文本数上限
+MAX_ENTRIES = 1 << 16
+
+
+def _require_tiktoken():
+    if tiktoken is None:
+        raise RuntimeError("使用 tiktoken 分词需要安装 tiktoken：pip install tiktoken")
+
+
+class Tokenizer(ABC):
+    """
+    分词器接口，用于按 token 数计算块的大小。
+
+    实现类需要提供：
+        name: 分词器标识。
+        encode(text): 返回文本的 token id 列表。
+    可以覆盖 count_batch(texts)，一次计算多个文本的 token 数，
+    默认逐个调用 encode。
+    """
+    name: str
+
+    @abstractmethod
+    def encode(self, text: str) -> List[int]:
+        ...
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [len(self.encode(text)) for text in texts]
+
+
+class VocabTokenizer(Tokenizer):
+    """
+    基于离线词表的分词器，不依赖网络和第三方库，适合测试和基准测试。
+
+    按词表做从左到右的最长匹配，与 WordPiece 的推理过程相同；
+    词表外的字符按 UTF-8 字节数计为若干个 token，与字节级 BPE 的回退方式一致。
+
+    Args:
+        vocab: 词表中的所有 token，下标即 token id。
+    """
+
+    def __init__(self, vocab: Iterable[str], name: Optional[str] = None):
+        self.vocab: Dict[str, int] = {}
+        for token in vocab:
+            if token:
+                self.vocab.setdefault(token, len(self.vocab))
+        self.name = name or f"vocab-{len(self.vocab)}"
+        self._max_len = max(map(len, self.vocab), default=1)
+        # 字节回退的 token id 排在词表之后
+        self._byte_base = len(self.vocab)
+
+    @classmethod
+    def from_file(cls, path: str) -> "VocabTokenizer":
+        """读取每行一个 token 的词表文件（如 BERT 的 vocab.txt），行内的制表符及其后内容忽略。"""
+        with open(path, "r", encoding="utf-8") as f:
+            tokens = [line.rstrip("\n").split("\t", 1)[0] for line in f]
+        return cls(tokens, name=os.path.basename(path))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(token + "\n" for token in self.vocab)
+
+    def encode(self, text: str) -> List[int]:
+        ids = []
+        vocab = self.vocab
+        pos, end = 0, len(text)
+        while pos < end:
+            for size in range(min(self._max_len, end - pos), 0, -1):
+                token_id = vocab.get(text[pos:pos + size])
+                if token_id is not None:
+                    ids.append(token_id)
+                    pos += size
+                    break
+            else:
+                ids.extend(self._byte_base + b for b in text[pos].encode("utf-8"))
+                pos += 1
+        return ids
+
+
+class TiktokenTokenizer(Tokenizer):
+    """
+    使用 tiktoken 的 BPE 编码，批量计数时交给 tiktoken 的多线程批量编码。
+
+    Args:
+        encoding: 编码名称，如 "cl100k_base"。
+        threads: 批量编码使用的线程数。
+    """
+
+    def __init__(self, encoding: str = "cl100k_base", threads: int = 8):
+        _require_tiktoken()
+        self.encoding = tiktoken.get_encoding(encoding)
+        self.name = encoding
+        self.threads = threads
+
+    def encode(self, text: str) -> List[int]:
+        return self.encoding.encode_ordinary(text)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [len(ids) for ids in self.encoding.encode_ordinary_batch(texts, num_threads=self.threads)]
+
+
+class TokenCounter:
+    """
+    带缓存的 token 长度函数，可以直接作为 MarkdownHeaderTextSplitter 的 length_function。
+
+    分块时同一行会被多次计算长度，不同文章之间也有大量相同的行（空行、落款、固定栏目），
+    这里按文本缓存 token 数，每个不同的文本只分词一次。
+    count_batch 把缓存未命中的文本去重后一次交给分词器，
+    分块器在每个小节结束时用它计算整个小节的行长度。
+
+    缓存超过 max_entries 个文本时淘汰最早加入的。
+
+    Args:
+        tokenizer: 分词器。
+        max_entries: 缓存的文本数上限。
+    """
+
+    def __init__(self, tokenizer: Tokenizer, max_entries: int = MAX_ENTRIES):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._counts: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _store(self, text: str, count: int):
+        counts = self._counts
+        if len(counts) >= self.max_entries:
+            del counts[next(iter(counts))]
+        counts[text] = count
+
+    def __call__(self, text: str) -> int:
+        count = self._counts.get(text)
+        if count is not None:
+            self.hits += 1
+            return count
+        self.misses += 1
+        count = self.tokenizer.count_batch([text])[0]
+        self._store(text, count)
+        return count
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """返回每个文本的 token 数，未缓存的文本去重后一次分词。"""
+        # 先取出已缓存的计数，写入本批结果时可能淘汰其中的文本
+        cached = [self._counts.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, count in zip(texts, cached) if count is None))
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if not missing:
+            return cached
+        fresh = dict(zip(missing, self.tokenizer.count_batch(missing)))
+        for text, count in fresh.items():
+            self._store(text, count)
+        return [fresh[text] if count is None else count for text, count in zip(texts, cached)]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._counts), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 各目录下的模块以同级导入的方式互相引用，与脚本运行时一致
+for directory in ("rag", "split", "preprocess", "benchmarks"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+# preprocess/format.py 在导入时创建大模型客户端，测试中不会真的请求
+os.environ.setdefault("ZHIPUAI_API_KEY", "test-key")
@@ -0,0 +1,19 @@
+import numpy as np
+
+from catalog import MetadataCatalog, split_names
+
+
+def test_split_names_keeps_spaces_inside_names():
+    assert split_names("John Smith, 张三 、李四；John Smith") == ["John Smith", "张三", "李四"]
+
+
+def test_source_with_space_round_trips_through_chunk_ids(tmp_path):
+    catalog = MetadataCatalog(str(tmp_path / "catalog.db"))
+    catalog.add_document("甲", {'source': "长宁区 房管局", 'author': "John Smith"}, 0, 3)
+    catalog.add_document("乙", {'source': "长宁区"}, 3, 2)
+    catalog.commit()
+
+    np.testing.assert_array_equal(catalog.chunk_ids(source="长宁区 房管局"), [0, 1, 2])
+    np.testing.assert_array_equal(catalog.chunk_ids(author="John Smith"), [0, 1, 2])
+    assert [doc['title'] for doc in catalog.find_documents(source="长宁区")] == ["乙"]
+    catalog.close()
@@ -0,0 +1,39 @@
+import json
+import os
+
+from bench_clean import make_corpus
+from clean import process_all_files_in_directory
+
+
+def read_outputs(directory):
+    manifest = json.load(open(os.path.join(directory, ".manifest.json"), encoding="utf-8"))['files']
+    hashes = {name: (entry['input_hash'], entry['output_hash']) for name, entry in manifest.items()}
+    outputs = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".md"):
+            with open(os.path.join(directory, name), "rb") as f:
+                outputs[name] = f.read()
+    return hashes, outputs
+
+
+def test_workers_write_outputs_and_hashes_like_serial_run(tmp_path):
+    input_dir = str(tmp_path / "data")
+    make_corpus(input_dir, 40)
+    with open(os.path.join(input_dir, "crlf.md"), "w", encoding="utf-8", newline="") as f:
+        f.write("标题\r\n===\r\n\r\n" + "正文一段。\r\n" * 40)
+    with open(os.path.join(input_dir, "short.md"), "w", encoding="utf-8") as f:
+        f.write("过短")
+
+    process_all_files_in_directory(input_dir, str(tmp_path / "serial"))
+    process_all_files_in_directory(input_dir, str(tmp_path / "parallel"), workers=2, chunk_size=4)
+    serial = read_outputs(str(tmp_path / "serial"))
+    assert serial == read_outputs(str(tmp_path / "parallel"))
+    hashes, outputs = serial
+    assert "short.md" not in outputs and hashes["short.md"][1] is None
+    assert b"\r" not in outputs["crlf.md"]
+
+    # 变得过短的文章在增量运行中删除上一次的输出
+    with open(os.path.join(input_dir, "000000.md"), "w", encoding="utf-8") as f:
+        f.write("过短")
+    process_all_files_in_directory(input_dir, str(tmp_path / "parallel"), workers=2, chunk_size=4)
+    assert not os.path.exists(tmp_path / "parallel" / "000000.md")
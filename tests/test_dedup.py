@@ -0,0 +1,34 @@
+import random
+
+from bench_dedup import make_sentence
+from dedup import build_report, find_duplicates
+
+
+def replace_every(sentences, start, rng):
+    sentences = list(sentences)
+    for k in range(start, len(sentences), 10):
+        sentences[k] = make_sentence(rng)
+    return sentences
+
+
+def test_cluster_members_must_match_the_canonical_document():
+    # a≈b、b≈c，但 a 与 c 相差很远；并查集会把三篇连成一个簇
+    rng = random.Random(0)
+    a = [make_sentence(rng) for _ in range(40)]
+    b = replace_every(a, 0, rng)
+    c = replace_every(b, 5, rng)
+    texts = ["\n".join(a), "\n".join(b), "\n".join(c), "不相关的文章。" * 20]
+    names = ["a.md", "b.md", "c.md", "other.md"]
+
+    clusters, similarities = find_duplicates(texts, threshold=0.7)
+    assert clusters == [[1, 2]]
+    report = build_report(names, texts, clusters, similarities, 0.7)
+    assert report['clusters'] == [{'canonical': 'c.md',
+                                   'duplicates': [{'file_name': 'b.md', 'similarity': similarities[(1, 2)]}]}]
+    assert similarities[(1, 2)] >= 0.7
+
+
+def test_texts_without_shingles_are_not_duplicates():
+    texts = ["", "  \n ", "\n\n", "正文" * 30, "正文" * 30]
+    clusters, _ = find_duplicates(texts)
+    assert clusters == [[3, 4]]
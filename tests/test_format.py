@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+
+import openai
+import pytest
+
+import format as formatter
+from bench_format import start_fake_server
+from manifest import Manifest
+
+
+@pytest.fixture
+def server():
+    server = start_fake_server(latency=0.0, error_rate=0.0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def fake_api(monkeypatch, tmp_path):
+    """让 create_llm 指向模拟接口，响应缓存写到临时目录，并记录退避等待的秒数。"""
+    def use(server):
+        monkeypatch.setattr(formatter, "API_BASE", f"http://127.0.0.1:{server.server_address[1]}/v1")
+        return formatter.build_chain(formatter.create_llm("test-key"))
+
+    monkeypatch.setattr(formatter, "CACHE_PATH", str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(formatter, "BASE_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0.0)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(seconds, *args):
+        delays.append(seconds)
+        await sleep(0, *args)
+
+    monkeypatch.setattr(asyncio, "sleep", record_sleep)
+    use.delays = delays
+    return use
+
+
+def test_retries_rate_limit_and_server_errors_with_backoff(fake_api):
+    server = start_fake_server(latency=0.0, error_rate=0.0, fail_first=3)
+    try:
+        chain = fake_api(server)
+        bucket = formatter.TokenBucket(1000.0)
+        result = asyncio.run(formatter.ainvoke_with_retry(chain, bucket, "正文", max_retries=3))
+    finally:
+        server.shutdown()
+    assert result == "正文"
+    assert server.RequestHandlerClass.requests == 4
+    assert fake_api.delays == [0.01, 0.02, 0.04]
+
+
+def test_gives_up_after_max_retries(fake_api):
+    server = start_fake_server(latency=0.0, error_rate=1.0)
+    try:
+        chain = fake_api(server)
+        with pytest.raises((openai.RateLimitError, openai.InternalServerError)):
+            asyncio.run(formatter.ainvoke_with_retry(chain, formatter.TokenBucket(1000.0), "正文", max_retries=2))
+    finally:
+        server.shutdown()
+    assert server.RequestHandlerClass.requests == 3
+    assert fake_api.delays == [0.01, 0.02]
+
+
+def test_token_bucket_limits_request_rate():
+    async def acquire_all(bucket, n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    bucket = formatter.TokenBucket(rate=50.0, capacity=1.0)
+    start = time.monotonic()
+    asyncio.run(acquire_all(bucket, 6))
+    # 第一个令牌来自满桶，其余 5 个按每秒 50 个补充
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_skips_files_that_are_already_processed(fake_api, server, tmp_path):
+    fake_api(server)
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for i in range(3):
+        (input_dir / f"{i}.md").write_text(f"# 文章 {i}\n\n正文内容。\n", encoding="utf-8")
+    # 引入清单之前生成的输出视为已处理
+    (output_dir / "0.md").write_text("旧的输出", encoding="utf-8")
+
+    run = lambda: asyncio.run(formatter.aprocess_directory(str(input_dir), str(output_dir), api_keys=["test-key"]))
+    run()
+    assert server.RequestHandlerClass.requests == 2
+    assert (output_dir / "0.md").read_text(encoding="utf-8") == "旧的输出"
+    assert (output_dir / "1.md").read_text(encoding="utf-8") == "# 文章 1\n\n正文内容。\n"
+
+    run()
+    assert server.RequestHandlerClass.requests == 2
+
+    (input_dir / "2.md").write_text("# 文章 2\n\n修改后的正文。\n", encoding="utf-8")
+    run()
+    assert server.RequestHandlerClass.requests == 3
+    assert Manifest(str(output_dir), "format", formatter.STAGE_VERSION).is_fresh("2.md", str(input_dir / "2.md"))
+
+
+def test_requires_an_api_key(monkeypatch, tmp_path):
+    monkeypatch.setattr(formatter, "API_KEYS", [])
+    monkeypatch.setattr(formatter, "CACHE_PATH", str(tmp_path / "llm_cache.sqlite"))
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "0.md").write_text("正文", encoding="utf-8")
+    with pytest.raises(ValueError):
+        asyncio.run(formatter.aprocess_directory(str(tmp_path / "in"), str(tmp_path / "out"), api_keys=[]))
+
+
+def test_saves_manifest_when_interrupted(fake_api, monkeypatch, tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    for i in range(3):
+        (input_dir / f"{i}.md").write_text(f"# 文章 {i}\n", encoding="utf-8")
+
+    async def clean(input_path, *args):
+        if input_path.endswith("2.md"):
+            raise KeyboardInterrupt
+        with open(input_path, encoding="utf-8") as f:
+            return f.read()
+
+    monkeypatch.setattr(formatter, "aclean_markdown_file", clean)
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(formatter.aprocess_directory(str(input_dir), str(output_dir), api_keys=["test-key"]))
+
+    manifest = Manifest(str(output_dir), "format", formatter.STAGE_VERSION)
+    assert manifest.is_fresh("0.md", str(input_dir / "0.md"))
+    assert manifest.is_fresh("1.md", str(input_dir / "1.md"))
+    assert not manifest.is_fresh("2.md", str(input_dir / "2.md"))
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import hierarchy
+from hierarchy import HierarchyStore
+from mdsplit import MarkdownHeaderTextSplitter
+
+SPLITTER = MarkdownHeaderTextSplitter(chunk_size=20)
+
+
+def add(store, text, name):
+    return store.add_document(SPLITTER.iter_split_sections(text), {'file_name': name})
+
+
+def test_reopen_after_crash_between_file_replacements(tmp_path, monkeypatch):
+    store = HierarchyStore(str(tmp_path))
+    add(store, "# 第一篇\n\n第一段正文。\n\n第二段正文。", "a.md")
+    store.save()
+
+    # 模拟已替换 nodes.json、尚未替换 nodes.npz 时进程退出
+    add(store, "# 第二篇\n\n未保存完的正文。", "b.md")
+    replace = os.replace
+
+    def crash_on_nodes(src, dst):
+        if dst.endswith(hierarchy.NODES_FILE):
+            raise KeyboardInterrupt
+        replace(src, dst)
+
+    monkeypatch.setattr(hierarchy.os, "replace", crash_on_nodes)
+    with pytest.raises(KeyboardInterrupt):
+        store.save()
+    monkeypatch.undo()
+
+    store = HierarchyStore(str(tmp_path))
+    assert store.documents == [{'file_name': 'a.md'}]
+    assert len(store.section_metadata) == store.num_sections
+    leaves = add(store, "# 第三篇\n\n第三篇的正文。", "c.md")
+    store.save()
+
+    store = HierarchyStore(str(tmp_path))
+    assert [d['file_name'] for d in store.documents] == ['a.md', 'c.md']
+    section = store.sections_of(1)[0]
+    assert store.section_text(section) == "# 第三篇\n\n第三篇的正文。"
+    assert store.section_metadata_of(section) == {'h1': '第三篇'}
+    assert store.leaf_text(len(store) - 1) == leaves[-1].content
+
+
+def test_older_metadata_is_rejected(tmp_path):
+    store = HierarchyStore(str(tmp_path))
+    add(store, "# 第一篇\n\n正文。", "a.md")
+    store.save()
+    metadata_path = os.path.join(str(tmp_path), hierarchy.METADATA_FILE)
+    with open(metadata_path, encoding='utf-8') as f:
+        older = f.read()
+    add(store, "# 第二篇\n\n正文。", "b.md")
+    store.save()
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        f.write(older)
+    with pytest.raises(ValueError):
+        HierarchyStore(str(tmp_path))
@@ -0,0 +1,21 @@
+import numpy as np
+
+from index import VectorIndex
+
+
+def test_reopen_discards_rows_written_after_last_save(tmp_path, monkeypatch):
+    index = VectorIndex(str(tmp_path), dim=4)
+    index.add_vectors(np.eye(4)[:2], [{'content': 'a'}, {'content': 'b'}])
+
+    # 模拟追加数据文件之后、写入 index.json 之前进程退出
+    monkeypatch.setattr(VectorIndex, "save", lambda self: None)
+    index.add_vectors(np.eye(4)[2:3], [{'content': 'orphan'}])
+    monkeypatch.undo()
+
+    index = VectorIndex(str(tmp_path))
+    assert len(index) == 2
+    index.add_vectors(np.eye(4)[3:4], [{'content': 'd'}])
+
+    index = VectorIndex(str(tmp_path))
+    assert [index.record(i)['content'] for i in range(len(index))] == ['a', 'b', 'd']
+    np.testing.assert_array_equal(index.vectors[2], np.eye(4)[3])
@@ -0,0 +1,110 @@
+import itertools
+import random
+
+import pytest
+
+from bench_split import LegacySplitter
+from mdsplit import LINE_CODE, LINE_CODE_BLANK, LINE_FENCE_CLOSE, LINE_FENCE_OPEN, LineLexer, MarkdownHeaderTextSplitter
+
+WORDS = ["x", "abc", "文字", "公租房", "申请", "。", "；", "，", ", ", ". ", "! ", "  ", "？", "审核流程"]
+
+
+def make_document(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 30)):
+        roll = rng.random()
+        if roll < 0.1:
+            lines.append("#" * rng.randint(1, 3) + " " + rng.choice(["标", "标题", "x"]))
+        elif roll < 0.2:
+            lines.append("")
+        elif roll < 0.25:
+            lines.extend(["```", "".join(rng.choices(WORDS, k=rng.randint(0, 20))), "```"])
+        else:
+            lines.append("".join(rng.choices(WORDS, k=rng.randint(1, 25))))
+    return "\n".join(lines)
+
+
+def non_code_lengths(splitter, document, spans):
+    """
+    按整篇文档的分行结果计算各块的非代码长度。块可能从代码块中间开始，
+    单独分析块的内容会把其中的代码行误认为普通文本。
+    """
+    lines = document.split("\n")
+    kinds, _ = LineLexer(splitter.headers_to_split_on).lex_lines(lines)
+    counted = []
+    for line, kind in zip(lines, kinds):
+        # 代码行连同其换行符都不计入长度，与 LineLexer 的长度贡献一致
+        code = kind in (LINE_FENCE_OPEN, LINE_CODE, LINE_CODE_BLANK)
+        counted.extend([not code] * (len(line) + 1))
+    return [sum(counted[start:end]) for start, end in spans]
+
+
+def legacy_spans(document, chunks):
+    """旧版的块不记录在文档中的位置，按顺序在文档中查找。"""
+    spans, position = [], 0
+    for chunk in chunks:
+        start = document.index(chunk.content, position)
+        position = start + len(chunk.content)
+        spans.append((start, position))
+    return spans
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunks_never_exceed_chunk_size(seed):
+    # 标题行连同换行符都不超过最小的 chunk_size，其余行都可以按分隔符或逐字切开，所以每个块都不应超出
+    rng = random.Random(seed)
+    for _ in range(50):
+        document = make_document(rng)
+        chunk_size = rng.randint(7, 40)
+        splitter = MarkdownHeaderTextSplitter(chunk_size=chunk_size)
+        chunks = splitter.split_text(document)
+        for chunk, length in zip(chunks, non_code_lengths(splitter, document, [c.span for c in chunks])):
+            assert length <= chunk_size, (document, chunk)
+        # 只切分、不改写：按顺序拼接各块的范围能还原出所有非空白内容
+        assert "".join("".join(c.content.split()) for c in chunks) == "".join(document.split())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_legacy_splitter_without_over_long_lines(seed):
+    # 没有超出 chunk_size 的行时，只要旧版的每个块都不超出 chunk_size，两者应逐块一致。
+    # 旧版分割后单独分析留下的行，窗口从代码块中间开始时会把代码行当作普通文本计数，
+    # 这类输入上旧版的结果本身不对，不作比较
+    rng = random.Random(seed)
+    compared = 0
+    while compared < 50:
+        document = make_document(rng)
+        lines = document.split("\n")
+        longest = max(len(line) for line in lines) + 1
+        chunk_size = rng.randint(longest, longest + 30)
+        splitter = MarkdownHeaderTextSplitter(chunk_size=chunk_size)
+        legacy = LegacySplitter(chunk_size=chunk_size).split_text(document)
+        spans = legacy_spans(document, legacy)
+        kinds, _ = LineLexer(splitter.headers_to_split_on).lex_lines(lines)
+        line_starts = itertools.accumulate((len(line) + 1 for line in lines), initial=0)
+        code_starts = {start for start, kind in zip(line_starts, kinds) if kind in (LINE_FENCE_CLOSE, LINE_CODE, LINE_CODE_BLANK)}
+        if (any(length > chunk_size for length in non_code_lengths(splitter, document, spans))
+                or any(start in code_starts for start, _ in spans)):
+            continue
+        compared += 1
+        chunks = splitter.split_text(document)
+        assert [(c.content, c.metadata) for c in chunks] == [(c.content, c.metadata) for c in legacy], document
+
+
+def test_carried_piece_is_emitted_alone_when_window_overflows():
+    splitter = MarkdownHeaderTextSplitter(chunk_size=10)
+    chunks = splitter.split_text("x, abc.  。；文字abc. ，")
+    assert [c.content for c in chunks] == ["x, abc. ", " 。", "；文字abc. ，"]
+
+
+def test_header_lines_are_not_split():
+    chunks = MarkdownHeaderTextSplitter(chunk_size=3).split_text("## 标题\n正文")
+    assert [c.content for c in chunks] == ["## 标题", "正文"]
+
+
+def test_metadata_changes_are_kept():
+    chunks = MarkdownHeaderTextSplitter().split_text("# 标题\n正文", {'source': 'a.md'})
+    chunk = chunks[0]
+    chunk.metadata['score'] = 1
+    assert chunk.metadata == {'source': 'a.md', 'h1': '标题', 'score': 1}
+    # 共享的基础元数据不受影响
+    assert chunk.base_metadata == {'source': 'a.md'}
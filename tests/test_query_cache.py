@@ -0,0 +1,30 @@
+from embedding import HashingEmbedder
+from query_cache import QueryCache, query_numbers
+
+REPORT_2023 = "关于2023年度全市安全生产工作情况的报告和下一步工作安排"
+REPORT_2024 = "关于2024年度全市安全生产工作情况的报告和下一步工作安排"
+
+
+def test_semantic_lookup_rejects_queries_differing_only_in_year():
+    embedder = HashingEmbedder(256)
+    vectors = embedder.embed([REPORT_2023, REPORT_2024])
+    cache = QueryCache(embedder, threshold=0.95)
+    # 两个查询的向量足以越过阈值，必须靠数字检查挡住
+    assert float(vectors[0] @ vectors[1]) >= cache.threshold
+
+    cache.put(REPORT_2023, "2023 的检索结果")
+    assert cache.get(REPORT_2024) is None
+    assert cache.stats()["semantic_hits"] == 0
+
+
+def test_semantic_lookup_still_hits_rewordings_with_same_numbers():
+    cache = QueryCache(HashingEmbedder(256), threshold=0.9)
+    cache.put(REPORT_2023, "2023 的检索结果")
+    assert cache.get(REPORT_2023 + "的情况") == "2023 的检索结果"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_query_numbers():
+    assert query_numbers("2024年第三季度进一步统一工作") == ("2024", "第三")
+    assert query_numbers("二〇二三年工作报告") == ("二〇二三",)
+    assert query_numbers("进一步做好统一部署") == ()
@@ -0,0 +1,49 @@
+import sqlite3
+
+from response_cache import ResponseCache
+
+
+def stored_bytes(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+def test_running_total_matches_stored_sizes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_bytes=100)
+    cache.put("a", "x" * 30)
+    cache.put("b", "字" * 10)
+    assert cache.total_bytes() == stored_bytes(cache) == 60
+    cache.put("a", "x" * 10)
+    assert cache.total_bytes() == stored_bytes(cache) == 40
+    cache.close()
+
+    cache = ResponseCache(path, max_bytes=100)
+    assert cache.total_bytes() == 40
+    cache.get("a")
+    # 超出上限时淘汰最久未使用的 b
+    cache.put("c", "y" * 70)
+    assert cache.get("b") is None
+    assert cache.total_bytes() == stored_bytes(cache) == 80
+    cache.close()
+
+
+def test_hits_are_written_on_put_or_close(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_bytes=None)
+    cache.put("a", "x")
+    cache.put("b", "y")
+    reader = sqlite3.connect(path)
+    last_used = lambda key: reader.execute("SELECT last_used FROM responses WHERE key = ?", (key,)).fetchone()[0]
+    before = last_used("a")
+
+    assert cache.get("a") == "x"
+    # 命中不写数据库，也不留下未提交的事务
+    assert last_used("a") == before and not cache._conn.in_transaction
+    cache.put("c", "z")
+    assert last_used("a") > before
+
+    before = last_used("b")
+    cache.get("b")
+    cache.close()
+    assert last_used("b") > before
+    reader.close()
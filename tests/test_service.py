@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from bench_service import start_fake_server
+from service import DraftService, StageTimeoutError, create_llm
+
+
+@pytest.fixture
+def make_service():
+    """启动模拟的流式接口并创建指向它的 DraftService，测试结束后关闭两者。"""
+    started = []
+
+    def make(first_token_latency=0.0, token_interval=0.0, tokens=5, retrievers=None, **kwargs):
+        process, port = start_fake_server(first_token_latency, token_interval, tokens)
+        llm = create_llm("test-key", api_base=f"http://127.0.0.1:{port}/v1")
+        service = DraftService(retrievers or {}, llm=llm, **kwargs)
+        started.append((process, service))
+        return service
+
+    yield make
+    for process, service in started:
+        service.close()
+        process.terminate()
+        process.join()
+
+
+async def consume(stream):
+    tokens = []
+    async for token in stream:
+        tokens.append(token)
+    return tokens
+
+
+def test_streams_all_tokens(make_service):
+    service = make_service(tokens=5)
+    stream = service.draft("公租房申请")
+    assert asyncio.run(consume(stream)) == [f"第{i}段" for i in range(5)]
+    assert stream.report.tokens == 5 and stream.report.error is None
+
+
+def test_first_token_timeout(make_service):
+    service = make_service(first_token_latency=2.0, first_token_timeout=0.3)
+    stream = service.draft("公租房申请")
+    start = time.perf_counter()
+    with pytest.raises(StageTimeoutError) as error:
+        asyncio.run(consume(stream))
+    assert error.value.stage == "first_token"
+    assert time.perf_counter() - start < 1.5
+    assert stream.report.error == "StageTimeoutError" and stream.report.tokens == 0
+
+
+def test_generation_timeout(make_service):
+    service = make_service(token_interval=0.1, tokens=50, generation_timeout=0.5)
+    stream = service.draft("公租房申请")
+    with pytest.raises(StageTimeoutError) as error:
+        asyncio.run(consume(stream))
+    assert error.value.stage == "generation"
+    assert 0 < stream.report.tokens < 50
+
+
+def test_timed_out_retriever_is_dropped(make_service):
+    def articles(topic):
+        return [{'content': "长宁区公租房申请受理情况。", 'metadata': {'title': "文章1"}}]
+
+    def policies(topic):
+        time.sleep(1.0)
+        return [{'content': "不应出现的政策文件。", 'metadata': {}}]
+
+    service = make_service(retrievers={'articles': articles, 'policies': policies}, retrieval_timeout=0.2)
+    stream = service.draft("公租房申请")
+    start = time.perf_counter()
+    assert len(asyncio.run(consume(stream))) == 5
+    # 生成没有等待慢的检索源
+    assert stream.report.retrieval_total < 0.6
+    assert time.perf_counter() - start < 0.9
+    assert stream.report.retrieval_timeouts == ['policies']
+    assert stream.report.retrieved == {'articles': 1, 'policies': 0}
+
+
+def test_queue_wait_counts_toward_first_token_timeout(make_service):
+    service = make_service(token_interval=0.2, tokens=10, max_concurrent_generations=1, first_token_timeout=0.5)
+
+    async def run():
+        first, second = service.draft("公租房申请"), service.draft("旧住房改造")
+        results = await asyncio.gather(consume(first), consume(second), return_exceptions=True)
+        return first, second, results
+
+    start = time.perf_counter()
+    first, second, results = asyncio.run(run())
+    # 第一个请求占着唯一的名额约 2 秒，第二个请求排队超过首个 token 的时限
+    assert len(results[0]) == 10
+    assert isinstance(results[1], StageTimeoutError) and results[1].stage == "first_token"
+    assert 0.4 < second.report.queue < 1.0
+    assert second.report.first_token is None
+    assert time.perf_counter() - start < 3.0
+
+
+def test_stopping_early_is_not_a_failure(make_service):
+    service = make_service(token_interval=0.05, tokens=20)
+
+    async def read_two(stream):
+        tokens = stream.__aiter__()
+        async for _ in tokens:
+            if stream.report.tokens == 2:
+                break
+        await tokens.aclose()
+
+    stream = service.draft("公租房申请")
+    asyncio.run(read_two(stream))
+    assert stream.report.error is None and stream.report.cancelled
+    assert stream.report.generation is not None
+    assert service.latency.failures == 0 and service.latency.cancelled == 1